@@ -39,6 +39,7 @@ from kolibri.core.logger.models import ContentSummaryLog
 from kolibri.core.logger.models import ExamAttemptLog
 from kolibri.core.logger.models import ExamLog
 from kolibri.core.logger.models import MasteryLog
+from kolibri.core.logger.models import ResumableContent
 from kolibri.core.logger.models import UserSessionLog
 from kolibri.core.tasks.management.commands.base import AsyncCommand
 
@@ -208,6 +209,7 @@ class Command(AsyncCommand):
                 ExamLog.objects.filter(dataset_id_filter),
                 MasteryLog.objects.filter(dataset_id_filter),
                 UserSessionLog.objects.filter(dataset_id_filter),
+                ResumableContent.objects.filter(user__dataset_id=dataset_id),
             ],
         )
 
@@ -16,6 +16,7 @@ from kolibri.core.device.models import DeviceSettings
 from kolibri.core.logger.models import AttemptLog
 from kolibri.core.logger.models import ContentSessionLog
 from kolibri.core.logger.models import ContentSummaryLog
+from kolibri.core.logger.models import ResumableContent
 from kolibri.core.tasks.management.commands.base import AsyncCommand
 from kolibri.utils.cli import server
 
@@ -25,6 +26,7 @@ MODELS_TO_DELETE = [
     AttemptLog,
     ContentSessionLog,
     ContentSummaryLog,
+    ResumableContent,
     FacilityUser,
     FacilityDataset,
     Certificate,
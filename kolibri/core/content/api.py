@@ -1,6 +1,10 @@
+import hashlib
+import json
 import logging
 import re
+import zlib
 from functools import reduce
+from functools import wraps
 from random import sample
 
 import requests
@@ -12,9 +16,14 @@ from django.db.models import Q
 from django.db.models import Sum
 from django.db.models.aggregates import Count
 from django.http import Http404
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.http.request import HttpRequest
 from django.utils.cache import patch_response_headers
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
+from django.utils.text import compress_string
 from django.utils.translation import ugettext as _
 from django.views.decorators.http import etag
 from django_filters.rest_framework import BooleanFilter
@@ -32,6 +41,7 @@ from rest_framework.decorators import detail_route
 from rest_framework.decorators import list_route
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 from kolibri.core.api import ValuesViewset
 from kolibri.core.auth.constants import user_kinds
@@ -56,12 +66,17 @@ from kolibri.core.content.utils.paths import get_channel_lookup_url
 from kolibri.core.content.utils.paths import get_content_file_name
 from kolibri.core.content.utils.paths import get_info_url
 from kolibri.core.content.utils.paths import get_local_content_storage_file_url
+from kolibri.core.content.utils.search import filter_by_search
+from kolibri.core.content.utils.search import get_search_words
+from kolibri.core.content.utils.search import search_index_available
 from kolibri.core.content.utils.stopwords import stopwords_set
 from kolibri.core.decorators import query_params_required
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.lessons.models import Lesson
-from kolibri.core.logger.models import ContentSessionLog
+from kolibri.core.logger.models import ContentPopularity
 from kolibri.core.logger.models import ContentSummaryLog
+from kolibri.core.logger.models import ResumableContent
+from kolibri.core.query import distinct_array_aggregate
 from kolibri.core.query import SQSum
 
 
@@ -99,6 +114,82 @@ def cache_forever(some_func):
     return session_exempt(wrapper_func)
 
 
+accepts_gzip_re = re.compile(r"\bgzip\b")
+
+# Cache rendered content responses for a day, they are also invalidated
+# by any change to the content cache key, as it is included in the cache key.
+CONTENT_RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# The maximum size, in bytes, of a compressed response to cache. The Django cache
+# only bounds the number of entries it holds, not their size, so larger responses
+# are not cached to bound the memory used by the cache.
+CONTENT_RESPONSE_CACHE_MAX_SIZE = 256 * 1024
+
+
+def _content_response_cache_key(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    return "content_response_{}".format(
+        hashlib.md5(
+            "{}:{}?{}".format(
+                ContentCacheKey.get_cache_key(),
+                request.build_absolute_uri(request.path),
+                query,
+            ).encode("utf-8")
+        ).hexdigest()
+    )
+
+
+def cache_content_response(view_method):
+    """
+    Decorator for read only content viewset methods to cache their gzip compressed
+    JSON responses on the server, keyed by the request URL, the normalized query
+    string and the current content cache key, so that cached responses are never
+    returned after content metadata has changed. Only use this for responses
+    that depend on nothing but the local content database.
+    """
+
+    @wraps(view_method)
+    def wrapper_func(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return view_method(self, request, *args, **kwargs)
+        cache_key = _content_response_cache_key(request)
+        cached = cache.get(cache_key)
+        if cached is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                content = compress_string(
+                    request.accepted_renderer.render(
+                        response.data,
+                        request.accepted_media_type,
+                        self.get_renderer_context(),
+                    )
+                )
+                if len(content) <= CONTENT_RESPONSE_CACHE_MAX_SIZE:
+                    content_type = request.accepted_media_type
+                    if request.accepted_renderer.charset:
+                        content_type = "{}; charset={}".format(
+                            content_type, request.accepted_renderer.charset
+                        )
+                    cache.set(
+                        cache_key,
+                        (content, content_type),
+                        CONTENT_RESPONSE_CACHE_TIMEOUT,
+                    )
+            return response
+        content, content_type = cached
+        if accepts_gzip_re.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            response = HttpResponse(content, content_type=content_type)
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(
+                zlib.decompress(content, 16 + zlib.MAX_WBITS), content_type=content_type
+            )
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    return wrapper_func
+
+
 class ChannelMetadataFilter(FilterSet):
     available = BooleanFilter(method="filter_available", label="Available")
     has_exercise = BooleanFilter(method="filter_has_exercise", label="Has exercises")
@@ -311,6 +402,7 @@ class ContentNodeViewset(ValuesViewset):
         "lft",
         "rght",
         "tree_id",
+        "ancestors",
     )
 
     field_map = {"lang": map_lang}
@@ -362,9 +454,13 @@ class ContentNodeViewset(ValuesViewset):
                 f["extension"] = f.pop("local_file__extension")
                 files[f["contentnode"]].append(f)
 
-            ancestors = queryset.get_ancestors().values(
-                "id", "title", "lft", "rght", "tree_id"
-            )
+            # Ancestors are precomputed during annotation, only fall back to querying
+            # for them if some nodes have not been annotated yet.
+            ancestors = []
+            if any(item["ancestors"] is None for item in items):
+                ancestors = queryset.get_ancestors().values(
+                    "id", "title", "lft", "rght", "tree_id"
+                )
 
             for item in items:
                 item["assessmentmetadata"] = assessmentmetadata.get(item["id"])
@@ -375,20 +471,28 @@ class ContentNodeViewset(ValuesViewset):
                 lft = item.pop("lft")
                 rght = item.pop("rght")
                 tree_id = item.pop("tree_id")
-                item["ancestors"] = list(
-                    filter(
-                        lambda x: x["lft"] < lft
-                        and x["rght"] > rght
-                        and x["tree_id"] == tree_id,
-                        ancestors,
-                    )
-                )
+                if item["ancestors"] is None:
+                    item["ancestors"] = [
+                        ancestor
+                        for ancestor in ancestors
+                        if ancestor["lft"] < lft
+                        and ancestor["rght"] > rght
+                        and ancestor["tree_id"] == tree_id
+                    ]
                 output.append(item)
         return output
 
     def get_queryset(self):
         return models.ContentNode.objects.filter(available=True)
 
+    @cache_content_response
+    def list(self, request, *args, **kwargs):
+        return super(ContentNodeViewset, self).list(request, *args, **kwargs)
+
+    @cache_content_response
+    def retrieve(self, request, pk, *args, **kwargs):
+        return super(ContentNodeViewset, self).retrieve(request, pk, *args, **kwargs)
+
     @list_route(methods=["get"])
     def descendants(self, request):
         """
@@ -397,27 +501,55 @@ class ContentNodeViewset(ValuesViewset):
         of the ids that are passed into the request.
         In the case where a node has more than one ancestor in the set of content nodes requested, duplicates of
         that content node are returned, each annotated with one of the ancestor_ids for a node.
+        All descendants are fetched in a single query over the MPTT ranges of the requested nodes. The results
+        are paginated when a page_size is passed, and the JSON output can be streamed by passing stream=true
+        to avoid holding the descendants of very large topics in memory.
+        Pagination is applied to the distinct descendant nodes before they are duplicated for each of their
+        requested ancestors, so the count and page_size are in nodes, and a page can contain more items than
+        page_size when the requested ids are nested within each other.
         """
         ids = self.request.query_params.get("ids", None)
         if not ids:
             return Response([])
         ids = ids.split(",")
         kind = self.request.query_params.get("descendant_kind", None)
-        nodes = models.ContentNode.objects.filter_by_uuids(ids).filter(available=True)
-        data = []
-        for node in nodes:
-
-            def copy_node(new_node):
-                new_node["ancestor_id"] = node.id
-                return new_node
-
-            node_data = node.get_descendants().filter(available=True)
-            if kind:
-                node_data = node_data.filter(kind=kind)
-            data += map(
-                copy_node, node_data.values("id", "title", "kind", "content_id")
+        ancestors = list(
+            models.ContentNode.objects.filter_by_uuids(ids)
+            .filter(available=True)
+            .values("id", "tree_id", "lft", "rght")
+        )
+        if not ancestors:
+            return Response([])
+        queryset = models.ContentNode.objects.filter(
+            union(
+                [
+                    Q(
+                        tree_id=ancestor["tree_id"],
+                        lft__gt=ancestor["lft"],
+                        rght__lt=ancestor["rght"],
+                    )
+                    for ancestor in ancestors
+                ]
+            ),
+            available=True,
+        )
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        queryset = queryset.values(
+            "id", "title", "kind", "content_id", "tree_id", "lft", "rght"
+        ).order_by("tree_id", "lft")
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                list(annotate_ancestor_ids(page, ancestors))
             )
-        return Response(data)
+        if self.request.query_params.get("stream", "").lower() in ("true", "1"):
+            return StreamingHttpResponse(
+                stream_json_list(annotate_ancestor_ids(queryset.iterator(), ancestors)),
+                content_type="application/json",
+            )
+        return Response(list(annotate_ancestor_ids(queryset, ancestors)))
 
     @list_route(methods=["get"])
     def descendants_assessments(self, request):
@@ -631,7 +763,11 @@ class ContentNodeViewset(ValuesViewset):
 
         queryset = self.prefetch_queryset(self.get_queryset())
 
-        if ContentSessionLog.objects.count() < 50:
+        total_views = (
+            ContentPopularity.objects.aggregate(total=Sum("count"))["total"] or 0
+        )
+
+        if total_views < 50:
             # return 25 random content nodes if not enough session logs
             pks = queryset.values_list("pk", flat=True).exclude(
                 kind=content_kinds.TOPIC
@@ -650,19 +786,16 @@ class ContentNodeViewset(ValuesViewset):
             content_nodes = models.ContentNode.objects.filter(available=True)
             if not coach_content:
                 content_nodes = content_nodes.exclude(coach_content=True)
-            content_counts_sorted = (
-                ContentSessionLog.objects.filter(
-                    content_id__in=content_nodes.values_list(
-                        "content_id", flat=True
-                    ).distinct()
+            most_popular_content_ids = (
+                ContentPopularity.objects.filter(
+                    content_id__in=content_nodes.values_list("content_id", flat=True)
                 )
+                .order_by("-count")
                 .values_list("content_id", flat=True)
-                .annotate(Count("content_id"))
-                .order_by("-content_id__count")
             )
 
             most_popular = queryset.filter_by_content_ids(
-                list(content_counts_sorted[:20]), validate=False
+                list(most_popular_content_ids[:20]), validate=False
             )
             queryset = most_popular.dedupe_by_content_id(use_distinct=False)
 
@@ -693,28 +826,30 @@ class ContentNodeViewset(ValuesViewset):
         if not user.is_facility_user or user.id != user_id:
             queryset = queryset.none()
         else:
-            # get the most recently viewed, but not finished, content nodes
-            # search for content nodes that currently exist in the database
-            content_ids = (
-                ContentSummaryLog.objects.filter(
-                    content_id__in=models.ContentNode.objects.values_list(
-                        "content_id", flat=True
-                    ).distinct()
-                )
-                .filter(user=user)
-                .exclude(progress=1)
-                .order_by("end_timestamp")
+            # get the most recently viewed, but not finished, content from the
+            # bounded per user index, rather than scanning all the user's logs
+            candidate_ids = list(
+                ResumableContent.objects.filter(user=user)
+                .order_by("-last_engaged")
                 .values_list("content_id", flat=True)
-                .distinct()
             )
+            # search for content nodes that currently exist in the database
+            available_ids = set(
+                models.ContentNode.objects.filter(
+                    content_id__in=candidate_ids
+                ).values_list("content_id", flat=True)
+            )
+            content_ids = [
+                content_id
+                for content_id in candidate_ids
+                if content_id in available_ids
+            ][:10]
 
             # If no logs, don't bother doing the other queries
             if not content_ids:
                 queryset = queryset.none()
             else:
-                resume = queryset.filter_by_content_ids(
-                    list(content_ids[:10]), validate=False
-                )
+                resume = queryset.filter_by_content_ids(content_ids, validate=False)
                 queryset = resume.dedupe_by_content_id(use_distinct=False)
 
         return Response(self.serialize(queryset))
@@ -733,18 +868,114 @@ def union(queries):
     return None
 
 
+def annotate_ancestor_ids(nodes, ancestors):
+    """
+    Annotate each node with the id of each of the ancestors whose MPTT range contains it,
+    yielding a separate copy of the node for every such ancestor.
+    """
+    for node in nodes:
+        tree_id = node.pop("tree_id")
+        lft = node.pop("lft")
+        rght = node.pop("rght")
+        for ancestor in ancestors:
+            if (
+                ancestor["tree_id"] == tree_id
+                and ancestor["lft"] < lft
+                and ancestor["rght"] > rght
+            ):
+                yield dict(node, ancestor_id=ancestor["id"])
+
+
+# Number of items serialized together into each chunk of a streamed response
+STREAM_CHUNK_SIZE = 500
+
+
+def stream_json_list(items):
+    """
+    Serialize an iterable of items as a JSON list, in chunks of STREAM_CHUNK_SIZE items.
+    """
+    yield "["
+    separator = ""
+    chunk = []
+    for item in items:
+        chunk.append(json.dumps(item, cls=JSONEncoder))
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield separator + ",".join(chunk)
+            separator = ","
+            chunk = []
+    if chunk:
+        yield separator + ",".join(chunk)
+    yield "]"
+
+
 @query_params_required(search=str, max_results=int, max_results__default=30)
 class ContentNodeSearchViewset(ContentNodeViewset):
     def search(self, value, max_results, filter=True):
         """
-        Implement various filtering strategies in order to get a wide range of search results.
+        Search for content nodes using the full text search index if it is available,
+        otherwise fall back to unindexed searching.
         When filter is used, this object must have a request attribute having
         a 'query_params' QueryDict containing the filters to be applied
         """
         if filter:
             queryset = self.filter_queryset(self.get_queryset())
+            filters = sorted(
+                (param, param_value)
+                for param, param_value in self.request.query_params.items()
+                if param in self.filter_class.base_filters
+            )
         else:
             queryset = self.get_queryset()
+            filters = []
+        if search_index_available():
+            return self.indexed_search(queryset, value, max_results, filters)
+        return self.unindexed_search(queryset, value, max_results, filters)
+
+    def indexed_search(self, queryset, value, max_results, filters=()):
+        """
+        Use the search index to find ranked matches for any of the critical words in value.
+        """
+        words = get_search_words(value)
+
+        matches = filter_by_search(queryset, words).values_list("id", "content_id")
+
+        results = []
+        content_ids = set()
+        BUFFER_SIZE = max_results * 2  # grab some extras, but not too many
+        offset = 0
+
+        # page through the ranked matches until we have enough unique content ids
+        while len(results) < max_results:
+            batch = list(matches[offset : offset + BUFFER_SIZE])
+            for node_id, content_id in batch:
+                # filter the dupes
+                if content_id in content_ids:
+                    continue
+                content_ids.add(content_id)
+                results.append(node_id)
+                # bail out as soon as we reach the quota
+                if len(results) >= max_results:
+                    break
+            if len(batch) < BUFFER_SIZE:
+                break
+            offset += BUFFER_SIZE
+
+        results = queryset.filter_by_uuids(results, validate=False)
+
+        channel_ids, content_kinds, total_results = self.get_search_facets(
+            "indexed",
+            words,
+            filters,
+            filter_by_search(self.get_queryset(), words),
+            filter_by_search(queryset, words),
+        )
+
+        return (results, channel_ids, content_kinds, total_results)
+
+    def unindexed_search(self, queryset, value, max_results, filters=()):
+        """
+        Implement various filtering strategies in order to get a wide range of search results.
+        """
         # all words with punctuation removed
         all_words = [w for w in re.split('[?.,!";: ]', value) if w]
         # words in all_words that are not stopwords
@@ -804,31 +1035,60 @@ class ContentNodeSearchViewset(ContentNodeViewset):
         # If no queries, just use an empty Q.
         all_queries_filter = union(all_queries) or Q()
 
-        total_results = (
-            queryset.filter(all_queries_filter)
-            .values_list("content_id", flat=True)
-            .distinct()
-            .count()
+        channel_ids, content_kinds, total_results = self.get_search_facets(
+            "unindexed",
+            all_words,
+            filters,
+            self.get_queryset().filter(all_queries_filter),
+            queryset.filter(all_queries_filter),
         )
 
-        # Use unfiltered queryset to collect channel_ids and kinds metadata.
-        unfiltered_queryset = self.get_queryset()
-
-        channel_ids = (
-            unfiltered_queryset.filter(all_queries_filter)
-            .values_list("channel_id", flat=True)
-            .order_by("channel_id")
-            .distinct()
-        )
+        return (results, channel_ids, content_kinds, total_results)
 
-        content_kinds = (
-            unfiltered_queryset.filter(all_queries_filter)
-            .values_list("kind", flat=True)
-            .order_by("kind")
-            .distinct()
+    def get_search_facets(
+        self, search_type, words, filters, unfiltered_matches, filtered_matches
+    ):
+        """
+        Calculate the channel_ids and content_kinds of all matches, ignoring any filters,
+        and the total number of matching content_ids with filters applied.
+        These are computed in a single aggregate query over the matches, with an additional
+        count when filters have been applied, and cached until the content cache key changes,
+        so that repeated requests for the same search reuse them.
+        """
+        cache_key = "search_facets_{}".format(
+            hashlib.md5(
+                json.dumps(
+                    [
+                        ContentCacheKey.get_cache_key(),
+                        search_type,
+                        sorted(words),
+                        list(filters),
+                    ]
+                ).encode("utf-8")
+            ).hexdigest()
         )
-
-        return (results, channel_ids, content_kinds, total_results)
+        facets = cache.get(cache_key)
+        if facets is None:
+            aggregates = unfiltered_matches.order_by().aggregate(
+                total_results=Count("content_id", distinct=True),
+                channel_ids=distinct_array_aggregate(models.ContentNode, "channel_id"),
+                content_kinds=distinct_array_aggregate(models.ContentNode, "kind"),
+            )
+            total_results = aggregates["total_results"]
+            if filters:
+                total_results = (
+                    filtered_matches.order_by()
+                    .values_list("content_id", flat=True)
+                    .distinct()
+                    .count()
+                )
+            facets = (
+                sorted(aggregates["channel_ids"]),
+                sorted(aggregates["content_kinds"]),
+                total_results,
+            )
+            cache.set(cache_key, facets, 60 * 60)
+        return facets
 
     def list(self, request, **kwargs):
         value = self.kwargs["search"]
@@ -906,7 +1166,7 @@ class ContentNodeGranularViewset(mixins.RetrieveModelMixin, viewsets.GenericView
         child_serializer = self.get_serializer(children, many=True)
         parent_data["children"] = child_serializer.data
 
-        parent_data["ancestors"] = list(instance.get_ancestors().values("id", "title"))
+        parent_data["ancestors"] = instance.get_ancestors_values()
 
         return Response(parent_data)
 
@@ -81,6 +81,7 @@ class ContentContentnode(Base):
     on_device_resources = Column(Integer)
     options = Column(Text)
     parent_id = Column(ForeignKey("content_contentnode.id"), index=True)
+    ancestors = Column(Text)
 
     lang = relationship("ContentLanguage")
     parent = relationship("ContentContentnode", remote_side=[id])
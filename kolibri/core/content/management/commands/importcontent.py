@@ -1,7 +1,8 @@
+import concurrent.futures
 import logging
 import os
+import time
 
-import concurrent.futures
 import requests
 from django.core.management.base import CommandError
 from le_utils.constants import content_kinds
@@ -14,6 +15,7 @@ from kolibri.core.content.models import ContentNode
 from kolibri.core.content.utils.file_availability import LocationError
 from kolibri.core.content.utils.import_export_content import compare_checksums
 from kolibri.core.content.utils.import_export_content import get_import_export_data
+from kolibri.core.content.utils.import_export_content import ImportCheckpoint
 from kolibri.core.content.utils.paths import get_channel_lookup_url
 from kolibri.core.content.utils.upgrade import get_import_data_for_update
 from kolibri.core.tasks.management.commands.base import AsyncCommand
@@ -30,6 +32,19 @@ logger = logging.getLogger(__name__)
 FILE_TRANSFERRED = 0
 FILE_SKIPPED = 1
 
+# The number of files to transfer at once, which is adapted to the source between 1 and
+# transfer.MAX_CONCURRENT_TRANSFERS
+INITIAL_CONCURRENT_TRANSFERS = 5
+
+# The number of byte range segments to download each large file in concurrently
+DOWNLOAD_SEGMENTS = 4
+
+# The maximum total size in bytes of the files being transferred at once, unless a single file is larger
+MAX_IN_FLIGHT_SIZE = 500 * 1024 * 1024
+
+# The minimum time in seconds between saves of the import progress to the job's checkpoint
+CHECKPOINT_INTERVAL = 10
+
 
 def lookup_channel_listing_status(channel_id, baseurl=None):
     """
@@ -252,6 +267,16 @@ class Command(AsyncCommand):
             job.extra_metadata["total_resources"] = total_resource_count
             job.save_meta()
 
+        # The progress of this import, and of any previous run of it that was interrupted
+        checkpoint = self._get_checkpoint(job)
+        # Process the files in order of checksum, so that the checkpoint stays small
+        files_to_download = sorted(files_to_download, key=lambda f: f.id)
+        checkpoint.set_checksums(f.id for f in files_to_download)
+        resumable = bool(job and job.resumable)
+        # The destination paths of the files being downloaded, keyed by checksum,
+        # for the downloads that have been created and haven't finished
+        download_dests = {}
+
         number_of_skipped_files = 0
         transferred_file_size = 0
         file_checksums_to_annotate = []
@@ -278,78 +303,75 @@ class Command(AsyncCommand):
         with self.start_progress(
             total=total_bytes_to_transfer + dummy_bytes_for_annotation
         ) as overall_progress_update:
-            if method == DOWNLOAD_METHOD:
-                session = requests.Session()
-
-            file_transfers = []
-            for f in files_to_download:
-
-                if self.is_cancelled():
-                    break
-
-                filename = f.get_filename()
-                try:
-                    dest = paths.get_content_storage_file_path(filename)
-                except InvalidStorageFilenameError:
-                    # If the destination file name is malformed, just stop now.
-                    overall_progress_update(f.file_size)
-                    continue
+            session = (
+                transfer.get_download_session() if method == DOWNLOAD_METHOD else None
+            )
 
-                # if the file already exists, add its size to our overall progress, and skip
-                if os.path.isfile(dest) and os.path.getsize(dest) == f.file_size:
-                    overall_progress_update(f.file_size)
-                    file_checksums_to_annotate.append(f.id)
-                    transferred_file_size += f.file_size
-                    continue
+            file_transfers = self._file_transfers(
+                method,
+                files_to_download,
+                checkpoint,
+                overall_progress_update,
+                download_dests,
+                path=path,
+                baseurl=baseurl,
+                session=session,
+                keep_partial=resumable,
+            )
+            concurrency = transfer.TransferConcurrency(
+                INITIAL_CONCURRENT_TRANSFERS, transfer.MAX_CONCURRENT_TRANSFERS
+            )
 
-                # determine where we're downloading/copying from, and create appropriate transfer object
-                if method == DOWNLOAD_METHOD:
-                    url = paths.get_content_storage_remote_url(
-                        filename, baseurl=baseurl
-                    )
-                    filetransfer = transfer.FileDownload(
-                        url, dest, session=session, cancel_check=self.is_cancelled
-                    )
-                    file_transfers.append((f, filetransfer))
-                elif method == COPY_METHOD:
-                    try:
-                        srcpath = paths.get_content_storage_file_path(
-                            filename, datafolder=path
-                        )
-                    except InvalidStorageFilenameError:
-                        # If the source file name is malformed, just stop now.
-                        overall_progress_update(f.file_size)
-                        continue
-                    filetransfer = transfer.FileCopy(
-                        srcpath, dest, cancel_check=self.is_cancelled
-                    )
-                    file_transfers.append((f, filetransfer))
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                batch_size = 100
-                # ThreadPoolExecutor allows us to download files concurrently,
-                # greatly reducing download time in most cases. However, loading
-                # all the downloads into the pool requires considerable memory,
-                # so we divide the downloads into batches to keep memory usage down.
-                # In batches of 100, total RAM usage doesn't exceed 250MB in testing.
-                while len(file_transfers) > 0:
-                    future_file_transfers = {}
-                    for i in range(batch_size):
-                        if len(file_transfers) > 0:
-                            f, filetransfer = file_transfers.pop()
+            # The transfers that have been started, and the number of bytes they transfer in total
+            in_flight = {}
+            in_flight_size = 0
+            next_transfer = next(file_transfers, None)
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=transfer.MAX_CONCURRENT_TRANSFERS
+            ) as executor:
+                # Rather than creating a transfer for every file up front, transfers are created
+                # as they can be started, and each is started as soon as another finishes, so that
+                # one large file doesn't hold up the rest. The number and total size of the
+                # transfers in flight are limited, so that memory use doesn't grow with the channel.
+                stopped = False
+                while not stopped:
+                    while next_transfer is not None:
+                        f, filetransfer = next_transfer
+                        if filetransfer is None:
+                            # The file is already present, so add its size to our overall progress
+                            overall_progress_update(f.file_size)
+                            file_checksums_to_annotate.append(f.id)
+                            transferred_file_size += f.file_size
+                            checkpoint.finish(f.id)
+                        elif len(in_flight) >= concurrency.limit or (
+                            in_flight
+                            and in_flight_size + (f.file_size or 0) > MAX_IN_FLIGHT_SIZE
+                        ):
+                            break
+                        else:
+                            checkpoint.start_transfer(f.id)
                             future = executor.submit(
                                 self._start_file_transfer, f, filetransfer
                             )
-                            future_file_transfers[future] = (f, filetransfer)
+                            in_flight[future] = next_transfer
+                            in_flight_size += f.file_size or 0
+                        next_transfer = next(file_transfers, None)
 
-                    for future in concurrent.futures.as_completed(
-                        future_file_transfers
-                    ):
-                        f, filetransfer = future_file_transfers[future]
+                    if not in_flight:
+                        break
+
+                    done, _ = concurrent.futures.wait(
+                        in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        f, filetransfer = in_flight.pop(future)
+                        in_flight_size -= f.file_size or 0
                         try:
                             status, data_transferred = future.result()
                             overall_progress_update(data_transferred)
                             if self.is_cancelled():
+                                stopped = True
                                 break
 
                             if status == FILE_SKIPPED:
@@ -357,7 +379,12 @@ class Command(AsyncCommand):
                             else:
                                 file_checksums_to_annotate.append(f.id)
                                 transferred_file_size += f.file_size
+                            concurrency.record_success(data_transferred)
+                            checkpoint.finish(f.id, imported=status != FILE_SKIPPED)
+                            download_dests.pop(f.id, None)
+                            self._save_checkpoint(job, checkpoint)
                         except transfer.TransferCanceled:
+                            stopped = True
                             break
                         except Exception as e:
                             logger.error(
@@ -370,11 +397,28 @@ class Command(AsyncCommand):
                                 # Continue file import when the current file is not found from the source and is skipped.
                                 overall_progress_update(f.file_size)
                                 number_of_skipped_files += 1
+                                checkpoint.finish(f.id, imported=False)
+                                download_dests.pop(f.id, None)
                                 continue
                             else:
+                                concurrency.record_error()
                                 self.exception = e
+                                stopped = True
                                 break
 
+            if session is not None:
+                logger.debug(
+                    "Download session connections: {}".format(
+                        session.connection_stats()
+                    )
+                )
+
+            if self.is_interrupted():
+                # Save the progress to resume from when the job is restarted
+                self._save_checkpoint(job, checkpoint, force=True)
+            else:
+                self._remove_partial_transfers(checkpoint, download_dests)
+
             with db_task_write_lock:
                 annotation.set_content_visibility(
                     channel_id,
@@ -414,6 +458,108 @@ class Command(AsyncCommand):
             if self.is_cancelled():
                 self.cancel()
 
+    def _file_transfers(  # noqa: max-complexity=11
+        self,
+        method,
+        files_to_download,
+        checkpoint,
+        overall_progress_update,
+        download_dests,
+        path=None,
+        baseurl=None,
+        session=None,
+        keep_partial=False,
+    ):
+        """
+        Generate a transfer for each file that needs to be transferred, in turn, as each can be started.
+        For files that are already present, None is generated in place of a transfer.
+        The destination of each download is added to download_dests.
+        """
+        for f in files_to_download:
+
+            if self.is_cancelled():
+                return
+
+            if checkpoint.was_imported(f.id):
+                yield f, None
+                continue
+
+            filename = f.get_filename()
+            try:
+                dest = paths.get_content_storage_file_path(filename)
+            except InvalidStorageFilenameError:
+                # If the destination file name is malformed, just stop now.
+                overall_progress_update(f.file_size)
+                continue
+
+            # if the file already exists, skip it
+            if os.path.isfile(dest) and os.path.getsize(dest) == f.file_size:
+                yield f, None
+                continue
+
+            # determine where we're downloading/copying from, and create appropriate transfer object
+            if method == DOWNLOAD_METHOD:
+                url = paths.get_content_storage_remote_url(filename, baseurl=baseurl)
+                filetransfer = transfer.FileDownload(
+                    url,
+                    dest,
+                    session=session,
+                    cancel_check=self.is_cancelled,
+                    resume_partial=checkpoint.was_transferring(f.id),
+                    keep_partial=keep_partial,
+                    segments=DOWNLOAD_SEGMENTS,
+                )
+                download_dests[f.id] = dest
+                yield f, filetransfer
+            elif method == COPY_METHOD:
+                try:
+                    srcpath = paths.get_content_storage_file_path(
+                        filename, datafolder=path
+                    )
+                except InvalidStorageFilenameError:
+                    # If the source file name is malformed, just stop now.
+                    overall_progress_update(f.file_size)
+                    continue
+                filetransfer = transfer.FileCopy(
+                    srcpath,
+                    dest,
+                    cancel_check=self.is_cancelled,
+                    compute_checksum=True,
+                )
+                yield f, filetransfer
+
+    def _get_checkpoint(self, job):
+        self._last_checkpoint_time = time.time()
+        if job and job.resumable:
+            return ImportCheckpoint(job.checkpoint.get("importcontent"))
+        return ImportCheckpoint()
+
+    def _save_checkpoint(self, job, checkpoint, force=False):
+        """
+        Save the import progress to the job's checkpoint, at most once every CHECKPOINT_INTERVAL
+        seconds unless force is True, so that if the job is interrupted and resumed, the files that
+        were imported are skipped without being checked again.
+        """
+        if not job or not job.resumable:
+            return
+        if not force and time.time() - self._last_checkpoint_time < CHECKPOINT_INTERVAL:
+            return
+        self._last_checkpoint_time = time.time()
+        job.checkpoint["importcontent"] = checkpoint.to_dict()
+        job.save_checkpoint()
+
+    def _remove_partial_transfers(self, checkpoint, download_dests):
+        """
+        Remove the temporary files of any unfinished downloads that were kept to be resumed,
+        for when the import has stopped without being interrupted, and so won't be resumed.
+        """
+        for checksum in checkpoint.transferring:
+            if checksum in download_dests:
+                try:
+                    os.remove(download_dests[checksum] + ".transfer")
+                except OSError:
+                    pass
+
     def _start_file_transfer(self, f, filetransfer):
         """
         Start to transfer the file from network/disk to the destination.
@@ -438,7 +584,9 @@ class Command(AsyncCommand):
             # id indicated in the database, it means that the destination file
             # is corrupted, either from origin or during import. Skip importing
             # this file.
-            checksum_correctness = compare_checksums(filetransfer.dest, f.id)
+            checksum_correctness = compare_checksums(
+                filetransfer.dest, f.id, checksum=filetransfer.checksum
+            )
             if not checksum_correctness:
                 e = "File {} is corrupted.".format(filetransfer.source)
                 logger.error("An error occurred during content import: {}".format(e))
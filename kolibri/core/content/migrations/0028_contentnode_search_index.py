@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from kolibri.core.content.utils.search import create_search_index
+from kolibri.core.content.utils.search import drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("content", "0027_channelmetadata_tagline")]
+
+    operations = [migrations.RunPython(create_index, drop_index)]
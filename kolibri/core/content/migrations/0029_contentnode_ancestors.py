@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+import kolibri.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("content", "0028_contentnode_search_index")]
+
+    operations = [
+        migrations.AddField(
+            model_name="contentnode",
+            name="ancestors",
+            field=kolibri.core.fields.JSONField(blank=True, default=None, null=True),
+        )
+    ]
@@ -39,9 +39,12 @@ from mptt.managers import TreeManager
 from mptt.querysets import TreeQuerySet
 
 from .utils import paths
+from .utils.hashi_cache import delete_rendered_content
+from .utils.search import delete_channel_search_index
 from kolibri.core.content import base_models
 from kolibri.core.content.errors import InvalidStorageFilenameError
 from kolibri.core.device.models import ContentCacheKey
+from kolibri.core.fields import JSONField
 from kolibri.core.mixins import FilterByUUIDQuerysetMixin
 
 PRESET_LOOKUP = dict(format_presets.choices)
@@ -163,6 +166,9 @@ class ContentNode(base_models.ContentNode):
     # Total number of available resources on the device under this topic - if this is not a topic
     # then it is 1 or 0 depending on availability
     on_device_resources = models.IntegerField(default=0, null=True, blank=True)
+    # The ids, titles and MPTT fields of the ancestors of this node, ordered from the root down,
+    # precomputed during annotation so that they do not have to be queried for
+    ancestors = JSONField(default=None, null=True, blank=True)
 
     objects = ContentNodeManager()
 
@@ -176,6 +182,18 @@ class ContentNode(base_models.ContentNode):
     def __str__(self):
         return self.title
 
+    def get_ancestors_values(self):
+        """
+        Retrieve a list of the ids and titles of the ancestors of this node,
+        using the values precomputed during annotation where available.
+        """
+        if self.ancestors is not None:
+            return [
+                {"id": ancestor["id"], "title": ancestor["title"]}
+                for ancestor in self.ancestors
+            ]
+        return list(self.get_ancestors().values("id", "title"))
+
     def get_descendant_content_ids(self):
         """
         Retrieve a queryset of content_ids for non-topic content nodes that are
@@ -257,6 +275,7 @@ class LocalFileQueryset(models.QuerySet, FilterByUUIDQuerysetMixin):
         for file in self.get_unused_files():
             try:
                 os.remove(paths.get_content_storage_file_path(file.get_filename()))
+                delete_rendered_content(file.get_filename())
                 yield True, file
             except (IOError, OSError, InvalidStorageFilenameError):
                 yield False, file
@@ -306,6 +325,7 @@ class LocalFile(base_models.LocalFile):
 
         try:
             os.remove(paths.get_content_storage_file_path(self.get_filename()))
+            delete_rendered_content(self.get_filename())
             deleted = True
         except (IOError, OSError, InvalidStorageFilenameError):
             deleted = False
@@ -357,6 +377,7 @@ class ChannelMetadata(base_models.ChannelMetadata):
         return self.name
 
     def delete_content_tree_and_files(self):
+        delete_channel_search_index(self.id)
         # Use Django ORM to ensure cascading delete:
         self.root.delete()
         ContentCacheKey.update_cache_key()
@@ -647,6 +647,34 @@ class AnnotationTreeRecursion(TransactionTestCase):
         self.assertFalse(root_node.available)
         self.assertFalse(root_node.coach_content)
 
+    def test_ancestors_set(self):
+        recurse_annotation_up_tree(channel_id="6199dde695db4ee4ab392222d5af1e5c")
+        for node in ContentNode.objects.filter(
+            channel_id="6199dde695db4ee4ab392222d5af1e5c"
+        ):
+            self.assertEqual(
+                node.ancestors,
+                list(
+                    node.get_ancestors().values("id", "title", "lft", "rght", "tree_id")
+                ),
+            )
+
+    @patch("kolibri.core.content.utils.annotation.CHUNKSIZE", 2)
+    def test_ancestors_set_in_batches(self):
+        self.test_ancestors_set()
+
+    def test_ancestors_updated_on_title_change(self):
+        recurse_annotation_up_tree(channel_id="6199dde695db4ee4ab392222d5af1e5c")
+        parent = ContentNode.objects.get(id="da7ecc42e62553eebc8121242746e88a")
+        parent.title = "new title"
+        parent.save()
+        recurse_annotation_up_tree(channel_id="6199dde695db4ee4ab392222d5af1e5c")
+        for node in parent.get_descendants():
+            self.assertIn(
+                "new title",
+                [ancestor["title"] for ancestor in node.ancestors],
+            )
+
     def tearDown(self):
         call_command("flush", interactive=False)
         super(AnnotationTreeRecursion, self).tearDown()
@@ -2,12 +2,18 @@
 To run this test, type this in command line <kolibri manage test -- kolibri.core.content>
 """
 import datetime
+import gzip
+import io
+import json
 import uuid
 
 import mock
 import requests
 from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.urlresolvers import reverse
+from django.db.models import F
+from django.db.models import Q
 from django.test import TestCase
 from django.utils import timezone
 from le_utils.constants import content_kinds
@@ -19,6 +25,10 @@ from kolibri.core.auth.models import Facility
 from kolibri.core.auth.models import FacilityUser
 from kolibri.core.auth.test.helpers import provision_device
 from kolibri.core.content import models as content
+from kolibri.core.content.utils.search import filter_by_search
+from kolibri.core.content.utils.search import get_search_words
+from kolibri.core.content.utils.search import index_channel
+from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.device.models import DevicePermissions
 from kolibri.core.device.models import DeviceSettings
 from kolibri.core.logger.models import ContentSessionLog
@@ -212,6 +222,7 @@ class ContentNodeAPITestCase(APITestCase):
         cls.admin.set_password(DUMMY_PASSWORD)
         cls.admin.save()
         cls.facility.add_admin(cls.admin)
+        index_channel(cls.the_channel_id)
 
     def test_prerequisite_for_filter(self):
         c1_id = content.ContentNode.objects.get(title="c1").id
@@ -242,6 +253,26 @@ class ContentNodeAPITestCase(APITestCase):
         response = self.client.get(reverse("kolibri:core:contentnode-list"))
         self.assertEqual(len(response.data), expected_output)
 
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("granular", {}))
+    @mock.patch("kolibri.core.content.api.get_channel_stats_from_studio")
+    def test_contentnode_granular_channel_stats_not_cached(self, stats_mock):
+        ContentCacheKey.update_cache_key()
+        c1_id = content.ContentNode.objects.get(title="root").id
+        url = reverse("kolibri:core:contentnode_granular-detail", kwargs={"pk": c1_id})
+        stats_mock.return_value = {}
+        response = self.client.get(url)
+        self.assertFalse(response.data["importable"])
+        stats_mock.return_value = {
+            node.id: {
+                "total_resources": 1,
+                "coach_content": False,
+                "num_coach_contents": 0,
+            }
+            for node in content.ContentNode.objects.all()
+        }
+        response = self.client.get(url)
+        self.assertTrue(response.data["importable"])
+
     @mock.patch("kolibri.core.content.api.get_channel_stats_from_studio")
     def test_contentnode_granular_network_import(self, stats_mock):
         c1 = content.ContentNode.objects.get(title="root")
@@ -529,6 +560,81 @@ class ContentNodeAPITestCase(APITestCase):
             },
         )
 
+    def test_contentnode_list_precomputed_ancestors(self):
+        ancestors = [{"id": uuid.uuid4().hex, "title": "precomputed"}]
+        content.ContentNode.objects.all().update(ancestors=ancestors)
+        response = self.client.get(reverse("kolibri:core:contentnode-list"))
+        for item in response.data:
+            self.assertEqual(item["ancestors"], ancestors)
+
+    def test_contentnode_list_unannotated_ancestors(self):
+        response = self.client.get(reverse("kolibri:core:contentnode-list"))
+        for item in response.data:
+            node = content.ContentNode.objects.get(id=item["id"])
+            self.assertEqual(
+                item["ancestors"],
+                list(
+                    node.get_ancestors().values("id", "title", "lft", "rght", "tree_id")
+                ),
+            )
+
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("cached", {}))
+    def test_contentnode_list_response_cached(self):
+        ContentCacheKey.update_cache_key()
+        root_id = content.ContentNode.objects.get(title="root").id
+        url = reverse("kolibri:core:contentnode-list")
+        response = self.client.get(url, data={"parent": root_id})
+        with mock.patch(
+            "kolibri.core.content.api.ContentNodeViewset.serialize"
+        ) as serialize_mock:
+            cached_response = self.client.get(url, data={"parent": root_id})
+            serialize_mock.assert_not_called()
+        self.assertEqual(json.loads(cached_response.content), response.data)
+
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("cached_gzip", {}))
+    def test_contentnode_list_response_cached_gzip(self):
+        ContentCacheKey.update_cache_key()
+        url = reverse("kolibri:core:contentnode-list")
+        response = self.client.get(url)
+        cached_response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(cached_response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            json.loads(
+                gzip.GzipFile(fileobj=io.BytesIO(cached_response.content)).read()
+            ),
+            response.data,
+        )
+
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("cache_invalidated", {}))
+    def test_contentnode_list_response_cache_invalidated(self):
+        ContentCacheKey.update_cache_key()
+        url = reverse("kolibri:core:contentnode-list")
+        self.client.get(url)
+        content.ContentNode.objects.filter(title="c1").update(title="updated")
+        ContentCacheKey.objects.update(key=F("key") + 1)
+        response = self.client.get(url)
+        self.assertIn("updated", [node["title"] for node in response.data])
+
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("cached_type", {}))
+    def test_contentnode_list_response_cached_content_type(self):
+        ContentCacheKey.update_cache_key()
+        url = reverse("kolibri:core:contentnode-list")
+        response = self.client.get(url)
+        cached_response = self.client.get(url)
+        self.assertEqual(cached_response["Content-Type"], response["Content-Type"])
+
+    @mock.patch("kolibri.core.content.api.CONTENT_RESPONSE_CACHE_MAX_SIZE", 1)
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("cache_too_big", {}))
+    def test_contentnode_list_large_response_not_cached(self):
+        ContentCacheKey.update_cache_key()
+        url = reverse("kolibri:core:contentnode-list")
+        self.client.get(url)
+        with mock.patch(
+            "kolibri.core.content.api.ContentNodeViewset.serialize", return_value=[]
+        ) as serialize_mock:
+            self.client.get(url)
+            serialize_mock.assert_called()
+
     def test_contentnode_retrieve(self):
         c1_id = content.ContentNode.objects.get(title="c1").id
         response = self.client.get(
@@ -536,6 +642,48 @@ class ContentNodeAPITestCase(APITestCase):
         )
         self.assertEqual(response.data["id"], c1_id.__str__())
 
+    def test_contentnode_descendants_streamed(self):
+        root = content.ContentNode.objects.get(title="root")
+        c2 = content.ContentNode.objects.get(title="c2")
+        ids = ",".join([root.id, c2.id])
+        url = reverse("kolibri:core:contentnode-descendants")
+        response = self.client.get(url, data={"ids": ids})
+        streamed_response = self.client.get(url, data={"ids": ids, "stream": "true"})
+        self.assertEqual(
+            json.loads(b"".join(streamed_response.streaming_content).decode("utf-8")),
+            response.data,
+        )
+
+    def test_contentnode_descendants_not_streamed(self):
+        root = content.ContentNode.objects.get(title="root")
+        url = reverse("kolibri:core:contentnode-descendants")
+        for stream in ("false", "0", ""):
+            response = self.client.get(url, data={"ids": root.id, "stream": stream})
+            self.assertFalse(response.streaming)
+
+    def test_contentnode_descendants_single_query(self):
+        root = content.ContentNode.objects.get(title="root")
+        c2 = content.ContentNode.objects.get(title="c2")
+        with self.assertNumQueries(2):
+            self.client.get(
+                reverse("kolibri:core:contentnode-descendants"),
+                data={"ids": ",".join([root.id, c2.id])},
+            )
+
+    def test_contentnode_descendants_paginated(self):
+        root = content.ContentNode.objects.get(title="root")
+        descendant_ids = list(
+            root.get_descendants().filter(available=True).values_list("id", flat=True)
+        )
+        response = self.client.get(
+            reverse("kolibri:core:contentnode-descendants"),
+            data={"ids": root.id, "page_size": 2, "page": 2},
+        )
+        self.assertEqual(response.data["count"], len(descendant_ids))
+        self.assertEqual(
+            [node["id"] for node in response.data["results"]], descendant_ids[2:4]
+        )
+
     def test_contentnode_descendants_assessments_exercise_node(self):
         c1 = content.ContentNode.objects.filter(kind=content_kinds.EXERCISE).first()
         c1_id = c1.id
@@ -1063,17 +1211,106 @@ class ContentNodeAPITestCase(APITestCase):
             reverse("kolibri:core:contentnode_search-list"), data={"search": "!?,"}
         )
         self.assertEqual(len(response.data["results"]), 0)
-        # ensure search words when there is only stopwords
+        # ensure search works when there are only stopwords
         response = self.client.get(
             reverse("kolibri:core:contentnode_search-list"), data={"search": "or"}
         )
         self.assertEqual(len(response.data["results"]), 0)
+        response = self.client.get(
+            reverse("kolibri:core:contentnode_search-list"),
+            data={"search": "the root"},
+        )
+        self.assertEqual(len(response.data["results"]), 1)
         # regular search
         response = self.client.get(
             reverse("kolibri:core:contentnode_search-list"), data={"search": "root"}
         )
         self.assertEqual(len(response.data["results"]), 1)
 
+    def test_search_words_ignore_stopwords(self):
+        self.assertEqual(get_search_words("The Root"), ["root"])
+
+    def test_search_words_only_stopwords(self):
+        self.assertEqual(get_search_words("To be or not"), ["to", "be", "or", "not"])
+
+    def test_search_tags(self):
+        response = self.client.get(
+            reverse("kolibri:core:contentnode_search-list"), data={"search": "tag_2"}
+        )
+        titles = set(node["title"] for node in response.data["results"])
+        self.assertSetEqual(titles, {"root", "c2"})
+
+    def test_search_ranked(self):
+        # c2c2 matches on both title and description, so should rank highest
+        response = self.client.get(
+            reverse("kolibri:core:contentnode_search-list"),
+            data={"search": "balbla5 c2c2", "max_results": 1},
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["title"], "c2c2")
+        expected_total = (
+            content.ContentNode.objects.filter(available=True)
+            .filter(Q(title="c2c2") | Q(description="balbla5"))
+            .values_list("content_id", flat=True)
+            .distinct()
+            .count()
+        )
+        self.assertEqual(response.data["total_results"], expected_total)
+
+    @mock.patch("kolibri.core.content.api.cache", LocMemCache("search", {}))
+    def test_search_facets_cached(self):
+        url = reverse("kolibri:core:contentnode_search-list")
+        ContentCacheKey.update_cache_key()
+        response = self.client.get(url, data={"search": "c2"})
+        with mock.patch(
+            "kolibri.core.content.api.distinct_array_aggregate"
+        ) as aggregate_mock:
+            cached_response = self.client.get(url, data={"search": "c2"})
+            aggregate_mock.assert_not_called()
+        self.assertEqual(
+            cached_response.data["channel_ids"], response.data["channel_ids"]
+        )
+        self.assertEqual(
+            cached_response.data["content_kinds"], response.data["content_kinds"]
+        )
+        self.assertEqual(
+            cached_response.data["total_results"], response.data["total_results"]
+        )
+
+    def test_search_facets_filtered_total_results(self):
+        url = reverse("kolibri:core:contentnode_search-list")
+        response = self.client.get(
+            url, data={"search": "c2", "kind": content_kinds.EXERCISE}
+        )
+        expected_total = (
+            filter_by_search(
+                content.ContentNode.objects.filter(
+                    available=True, kind=content_kinds.EXERCISE
+                ),
+                ["c2"],
+            )
+            .order_by()
+            .values_list("content_id", flat=True)
+            .distinct()
+            .count()
+        )
+        self.assertEqual(response.data["total_results"], expected_total)
+        unfiltered_response = self.client.get(url, data={"search": "c2"})
+        self.assertEqual(
+            response.data["content_kinds"], unfiltered_response.data["content_kinds"]
+        )
+        self.assertGreater(
+            unfiltered_response.data["total_results"], response.data["total_results"]
+        )
+
+    @mock.patch("kolibri.core.content.api.search_index_available", return_value=False)
+    def test_search_unindexed(self, available_mock):
+        response = self.client.get(
+            reverse("kolibri:core:contentnode_search-list"), data={"search": "root"}
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["total_results"], 1)
+
     def _create_session_logs(self):
         content_ids = (
             "f2332710c2fd483386cdeb5ecbdda81f",
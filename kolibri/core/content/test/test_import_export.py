@@ -1,3 +1,4 @@
+import hashlib
 import os
 import sys
 import tempfile
@@ -23,8 +24,11 @@ from kolibri.core.content.models import LocalFile
 from kolibri.core.content.utils.content_types_tools import (
     renderable_contentnodes_q_filter,
 )
+from kolibri.core.content.utils.import_export_content import compare_checksums
 from kolibri.core.content.utils.import_export_content import get_import_export_data
+from kolibri.core.content.utils.import_export_content import ImportCheckpoint
 from kolibri.core.content.utils.transfer import TransferCanceled
+from kolibri.core.tasks.job import Job
 from kolibri.utils.tests.helpers import override_option
 
 # helper class for mocking that is equal to anything
@@ -306,7 +310,13 @@ class ImportContentTestCase(TestCase):
         is_cancelled_mock.assert_has_calls([call(), call()])
         # Should be set to the local path we mocked
         FileDownloadMock.assert_called_with(
-            "notest", local_path, session=Any(Session), cancel_check=is_cancelled_mock
+            "notest",
+            local_path,
+            session=Any(Session),
+            cancel_check=is_cancelled_mock,
+            resume_partial=False,
+            keep_partial=False,
+            segments=4,
         )
         # Check that the command itself was also cancelled.
         cancel_mock.assert_called_with()
@@ -418,7 +428,10 @@ class ImportContentTestCase(TestCase):
         call_command("importcontent", "disk", self.the_channel_id, tempfile.mkdtemp())
         is_cancelled_mock.assert_has_calls([call(), call()])
         FileCopyMock.assert_called_with(
-            local_src_path, local_dest_path, cancel_check=is_cancelled_mock
+            local_src_path,
+            local_dest_path,
+            cancel_check=is_cancelled_mock,
+            compute_checksum=True,
         )
         cancel_mock.assert_called_with()
         annotation_mock.set_content_visibility.assert_called()
@@ -959,6 +972,128 @@ class ImportContentTestCase(TestCase):
                 public=False,
             )
 
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.transfer.FileDownload"
+    )
+    @patch("kolibri.core.content.management.commands.importcontent.get_current_job")
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.AsyncCommand.is_cancelled",
+        return_value=False,
+    )
+    def test_remote_import_skips_checkpointed_files(
+        self,
+        is_cancelled_mock,
+        get_current_job_mock,
+        FileDownloadMock,
+        annotation_mock,
+        get_import_export_mock,
+        channel_list_status_mock,
+    ):
+        checksums = [
+            "211523265f53825b82f70ba19218a02e",
+            "6bdfea4a01830fdd4a585181c0b8068c",
+        ]
+        LocalFile.objects.filter(pk__in=checksums).update(file_size=1)
+        job = Job(id, resumable=True)
+        job.save_meta_method = MagicMock()
+        job.checkpoint = {"importcontent": {"processed_up_to": checksums[-1]}}
+        get_current_job_mock.return_value = job
+        get_import_export_mock.return_value = (
+            1,
+            list(LocalFile.objects.filter(pk__in=checksums)),
+            10,
+        )
+        call_command("importcontent", "network", self.the_channel_id)
+        FileDownloadMock.assert_not_called()
+        annotation_mock.set_content_visibility.assert_called_with(
+            self.the_channel_id,
+            checksums,
+            exclude_node_ids=None,
+            node_ids=None,
+            public=False,
+        )
+
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.compare_checksums",
+        return_value=True,
+    )
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.paths.get_content_storage_file_path"
+    )
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.transfer.FileDownload"
+    )
+    @patch("kolibri.core.content.management.commands.importcontent.get_current_job")
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.AsyncCommand.is_interrupted",
+        return_value=True,
+    )
+    @patch(
+        "kolibri.core.content.management.commands.importcontent.AsyncCommand.is_cancelled",
+        return_value=False,
+    )
+    def test_remote_import_resumes_partial_transfer(
+        self,
+        is_cancelled_mock,
+        is_interrupted_mock,
+        get_current_job_mock,
+        FileDownloadMock,
+        path_mock,
+        compare_checksums_mock,
+        annotation_mock,
+        get_import_export_mock,
+        channel_list_status_mock,
+    ):
+        checksums = [
+            "211523265f53825b82f70ba19218a02e",
+            "6bdfea4a01830fdd4a585181c0b8068c",
+        ]
+        local_paths = [tempfile.mkstemp()[1], tempfile.mkstemp()[1]]
+        path_mock.side_effect = local_paths
+        FileDownloadMock.return_value.__iter__.return_value = []
+        FileDownloadMock.return_value.total_size = 0
+        FileDownloadMock.return_value.dest_exists = False
+        LocalFile.objects.filter(pk__in=checksums).update(file_size=1)
+        job = Job(id, resumable=True)
+        job.save_meta_method = MagicMock()
+        job.save_checkpoint_method = MagicMock()
+        job.checkpoint = {"importcontent": {"transferring": [checksums[1]]}}
+        get_current_job_mock.return_value = job
+        get_import_export_mock.return_value = (
+            1,
+            list(LocalFile.objects.filter(pk__in=checksums)),
+            10,
+        )
+        call_command("importcontent", "network", self.the_channel_id)
+        FileDownloadMock.assert_has_calls(
+            [
+                call(
+                    Any(str),
+                    local_paths[0],
+                    session=Any(Session),
+                    cancel_check=is_cancelled_mock,
+                    resume_partial=False,
+                    keep_partial=True,
+                    segments=4,
+                ),
+                call(
+                    Any(str),
+                    local_paths[1],
+                    session=Any(Session),
+                    cancel_check=is_cancelled_mock,
+                    resume_partial=True,
+                    keep_partial=True,
+                    segments=4,
+                ),
+            ],
+            any_order=True,
+        )
+        # The progress is saved to the checkpoint, as the import was interrupted
+        job.save_checkpoint_method.assert_called_with(job)
+        self.assertEqual(
+            job.checkpoint["importcontent"]["processed_up_to"], checksums[1]
+        )
+
 
 @override_option("Paths", "CONTENT_DIR", tempfile.mkdtemp())
 class ExportChannelTestCase(TestCase):
@@ -1246,3 +1381,67 @@ class TestFilesToTransfer(TestCase):
             self.the_channel_id, [], [], False, renderable_only=False, peer_id="1"
         )
         self.assertEqual(len(files_to_transfer), 0)
+
+
+class ImportCheckpointTestCase(TestCase):
+    def test_imported_files_saved_up_to_watermark(self):
+        checkpoint = ImportCheckpoint()
+        checkpoint.set_checksums(["c", "a", "b", "d"])
+        checkpoint.finish("a")
+        checkpoint.finish("c")
+        checkpoint.finish("b", imported=False)
+        checkpoint.start_transfer("d")
+        self.assertEqual(
+            checkpoint.to_dict(),
+            {
+                "processed_up_to": "c",
+                "imported": [],
+                "failed": ["b"],
+                "transferring": ["d"],
+            },
+        )
+
+    def test_resumed_checkpoint(self):
+        checkpoint = ImportCheckpoint(
+            {
+                "processed_up_to": "c",
+                "imported": ["e"],
+                "failed": ["b"],
+                "transferring": ["d"],
+            }
+        )
+        self.assertTrue(checkpoint.was_imported("a"))
+        self.assertFalse(checkpoint.was_imported("b"))
+        self.assertTrue(checkpoint.was_imported("c"))
+        self.assertFalse(checkpoint.was_imported("d"))
+        self.assertTrue(checkpoint.was_imported("e"))
+        self.assertTrue(checkpoint.was_transferring("d"))
+        self.assertFalse(checkpoint.was_transferring("e"))
+
+    def test_empty_checkpoint(self):
+        checkpoint = ImportCheckpoint(None)
+        self.assertFalse(checkpoint.was_imported("a"))
+        self.assertFalse(checkpoint.was_transferring("a"))
+
+
+class CompareChecksumsTestCase(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkstemp()[1]
+        with open(self.path, "wb") as f:
+            f.write(b"abc")
+        self.checksum = hashlib.md5(b"abc").hexdigest()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_file_is_read_without_checksum(self):
+        self.assertTrue(compare_checksums(self.path, self.checksum))
+        self.assertFalse(compare_checksums(self.path, "0" * 32))
+
+    @patch("kolibri.core.content.utils.import_export_content.open")
+    def test_checksum_given_is_compared_without_reading_file(self, open_mock):
+        self.assertTrue(
+            compare_checksums(self.path, self.checksum, checksum=self.checksum)
+        )
+        self.assertFalse(compare_checksums(self.path, "0" * 32, checksum=self.checksum))
+        open_mock.assert_not_called()
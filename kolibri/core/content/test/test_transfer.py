@@ -0,0 +1,385 @@
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+import requests
+from django.test import TestCase
+from mock import MagicMock
+from mock import patch
+
+from kolibri.core.content.utils.transfer import DownloadSession
+from kolibri.core.content.utils.transfer import FileCopy
+from kolibri.core.content.utils.transfer import FileDownload
+from kolibri.core.content.utils.transfer import get_download_session
+from kolibri.core.content.utils.transfer import TransferCanceled
+from kolibri.core.content.utils.transfer import TransferConcurrency
+from kolibri.core.content.utils.transfer import ZERO_COPY_SUPPORTED
+
+
+class FileDownloadResumeTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dest = os.path.join(self.directory, "test.mp4")
+        with open(self.dest + ".transfer", "wb") as f:
+            f.write(b"abc")
+        self.session = MagicMock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _response(self, status_code, content):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = {"content-length": str(len(content))}
+        response.iter_content.return_value = iter([content])
+        return response
+
+    def _download(self, **kwargs):
+        download = FileDownload(
+            "http://test/test.mp4",
+            self.dest,
+            session=self.session,
+            cancel_check=lambda: False,
+            **kwargs
+        )
+        with download:
+            for chunk in download:
+                pass
+        return download
+
+    def test_resume_partial_with_range_request(self):
+        self.session.get.return_value = self._response(206, b"def")
+
+        download = self._download(resume_partial=True)
+
+        # the checksum includes the partial file that was resumed from
+        self.assertEqual(download.checksum, hashlib.md5(b"abcdef").hexdigest())
+        self.session.get.assert_called_once_with(
+            "http://test/test.mp4",
+            headers={"Range": "bytes=3-"},
+            stream=True,
+            timeout=20,
+        )
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+
+    def test_resume_partial_range_not_supported(self):
+        self.session.get.side_effect = [
+            self._response(200, b"abcdef"),
+            self._response(200, b"abcdef"),
+        ]
+
+        download = self._download(resume_partial=True)
+
+        self.assertEqual(self.session.get.call_count, 2)
+        self.assertEqual(download.partial_size, 0)
+        self.assertEqual(download.checksum, hashlib.md5(b"abcdef").hexdigest())
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+
+    def test_partial_removed_without_resume_partial(self):
+        self.session.get.return_value = self._response(200, b"abcdef")
+
+        self._download()
+
+        self.session.get.assert_called_once_with(
+            "http://test/test.mp4", stream=True, timeout=20
+        )
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+
+    def test_cancel_keeps_partial(self):
+        download = FileDownload(
+            "http://test/test.mp4",
+            self.dest,
+            session=self.session,
+            cancel_check=lambda: False,
+            resume_partial=True,
+            keep_partial=True,
+        )
+        self.session.get.return_value = self._response(206, b"def")
+        with download:
+            pass
+        self.assertTrue(os.path.isfile(self.dest + ".transfer"))
+
+    def test_cancel_removes_partial(self):
+        download = FileDownload(
+            "http://test/test.mp4",
+            self.dest,
+            session=self.session,
+            cancel_check=lambda: False,
+            resume_partial=True,
+        )
+        self.session.get.return_value = self._response(206, b"def")
+        with download:
+            pass
+        self.assertFalse(os.path.isfile(self.dest + ".transfer"))
+
+
+@patch("kolibri.core.content.utils.transfer.time")
+class TransferConcurrencyTestCase(TestCase):
+    def _record(self, concurrency, time_mock, elapsed, size):
+        time_mock.return_value += elapsed
+        for _ in range(concurrency.limit):
+            concurrency.record_success(size)
+
+    def test_increases_while_throughput_improves(self, time_mock):
+        time_mock.return_value = 0
+        concurrency = TransferConcurrency(2, 4)
+        self._record(concurrency, time_mock, 1, 10)
+        self.assertEqual(concurrency.limit, 3)
+        self._record(concurrency, time_mock, 1, 10)
+        self.assertEqual(concurrency.limit, 4)
+        self._record(concurrency, time_mock, 1, 10)
+        self.assertEqual(concurrency.limit, 4)
+
+    def test_decreases_when_throughput_drops(self, time_mock):
+        time_mock.return_value = 0
+        concurrency = TransferConcurrency(2, 4)
+        self._record(concurrency, time_mock, 1, 10)
+        self.assertEqual(concurrency.limit, 3)
+        self._record(concurrency, time_mock, 10, 10)
+        self.assertEqual(concurrency.limit, 2)
+
+    def test_halves_on_error(self, time_mock):
+        time_mock.return_value = 0
+        concurrency = TransferConcurrency(8, 10)
+        concurrency.record_error()
+        self.assertEqual(concurrency.limit, 4)
+        concurrency.record_error()
+        concurrency.record_error()
+        concurrency.record_error()
+        self.assertEqual(concurrency.limit, 1)
+
+
+class DownloadSessionTestCase(TestCase):
+    def test_adapter_pool_and_retries(self):
+        session = DownloadSession(pool_size=4, retries=2)
+        adapter = session.get_adapter("https://studio.learningequality.org")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertIn("POST", adapter.max_retries.method_whitelist)
+
+    def test_connection_stats(self):
+        session = DownloadSession()
+        pool = session.get_adapter("http://test").poolmanager.connection_from_url(
+            "http://test/"
+        )
+        pool.num_requests = 3
+        pool.num_connections = 1
+        self.assertEqual(
+            session.connection_stats(), {"requests": 3, "connections": 1, "reused": 2}
+        )
+
+    def test_shared_session(self):
+        self.assertIs(get_download_session(), get_download_session())
+        self.assertIsInstance(get_download_session(), DownloadSession)
+
+
+@patch("kolibri.core.content.utils.transfer.SEGMENTED_DOWNLOAD_MIN_SIZE", 4)
+class SegmentedFileDownloadTestCase(TestCase):
+    content = b"0123456789"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dest = os.path.join(self.directory, "test.mp4")
+        self.session = MagicMock()
+        self.session.get.side_effect = self._get
+        self.ranges = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _get(self, url, headers=None, stream=True, timeout=20):
+        response = MagicMock()
+        response.headers = {
+            "content-length": str(len(self.content)),
+            "accept-ranges": "bytes",
+        }
+        if headers and "Range" in headers:
+            start, end = headers["Range"][len("bytes=") :].split("-")
+            self.ranges.append((int(start), int(end)))
+            content = self.content[int(start) : int(end) + 1]
+            response.status_code = 206
+            # return the range in two chunks, to check that they are written in place
+            middle = len(content) // 2
+            response.iter_content.return_value = iter(
+                [content[:middle], content[middle:]]
+            )
+        else:
+            response.status_code = 200
+            response.iter_content.return_value = iter([self.content])
+        return response
+
+    def _download(self, segments):
+        download = FileDownload(
+            "http://test/test.mp4",
+            self.dest,
+            session=self.session,
+            cancel_check=lambda: False,
+            segments=segments,
+        )
+        transferred = 0
+        with download:
+            for chunk in download:
+                transferred += len(chunk)
+        return download, transferred
+
+    def test_segmented_download(self):
+        download, transferred = self._download(3)
+
+        self.assertTrue(download.segmented)
+        # the segments are written out of order, so the checksum is left to be read from the file
+        self.assertIsNone(download.checksum)
+        self.assertEqual(sorted(self.ranges), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(transferred, len(self.content))
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_small_file_not_segmented(self):
+        self.content = b"012"
+
+        download, transferred = self._download(3)
+
+        self.assertFalse(download.segmented)
+        self.assertEqual(self.ranges, [])
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    @patch("kolibri.core.content.utils.transfer.sleep")
+    def test_segment_resumed_after_error(self, sleep_mock):
+        get = self._get
+        failed = []
+
+        def failing_get(url, headers=None, **kwargs):
+            response = get(url, headers=headers, **kwargs)
+            if headers and headers.get("Range") == "bytes=4-7" and not failed:
+                failed.append(True)
+                response.iter_content.return_value = self._fail_after(b"45")
+            return response
+
+        self.session.get.side_effect = failing_get
+
+        download, transferred = self._download(3)
+
+        # the segment is resumed from where it failed
+        self.assertIn((6, 7), self.ranges)
+        self.assertEqual(transferred, len(self.content))
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def _fail_after(self, chunk):
+        yield chunk
+        raise requests.exceptions.ChunkedEncodingError()
+
+    def test_segment_error_fails_download(self):
+        get = self._get
+
+        def failing_get(url, headers=None, **kwargs):
+            if headers and headers.get("Range") == "bytes=4-7":
+                response = MagicMock()
+                response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+                    response=MagicMock(status_code=404)
+                )
+                return response
+            return get(url, headers=headers, **kwargs)
+
+        self.session.get.side_effect = failing_get
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self._download(3)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.dest + ".transfer"))
+
+    def test_segmented_download_cancelled(self):
+        cancelled = []
+        download = FileDownload(
+            "http://test/test.mp4",
+            self.dest,
+            session=self.session,
+            cancel_check=lambda: bool(cancelled),
+            segments=2,
+            keep_partial=True,
+        )
+        with self.assertRaises(TransferCanceled):
+            with download:
+                for chunk in download:
+                    cancelled.append(True)
+        # a partial segmented download can't be resumed, so it is not kept
+        self.assertFalse(os.path.exists(self.dest + ".transfer"))
+
+
+class FileCopyTestCase(TestCase):
+    content = b"abcdef"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "source.mp4")
+        self.dest = os.path.join(self.directory, "dest.mp4")
+        with open(self.source, "wb") as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _copy(self, **kwargs):
+        copy = FileCopy(
+            self.source, self.dest, cancel_check=lambda: False, block_size=4, **kwargs
+        )
+        transferred = 0
+        with copy:
+            self.assertIsNone(copy.checksum)
+            for chunk in copy:
+                transferred += len(chunk)
+        self.assertEqual(transferred, len(self.content))
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        return copy
+
+    def test_checksum_computed_during_copy(self):
+        copy = self._copy(zero_copy=False)
+        self.assertEqual(copy.checksum, hashlib.md5(self.content).hexdigest())
+
+    @skipUnless(ZERO_COPY_SUPPORTED, "Copying in the kernel is not supported")
+    def test_zero_copy_computes_checksum_when_needed(self):
+        copy = self._copy(compute_checksum=True)
+        self.assertTrue(copy.zero_copy)
+        self.assertEqual(copy.checksum, hashlib.md5(self.content).hexdigest())
+
+    @skipUnless(ZERO_COPY_SUPPORTED, "Copying in the kernel is not supported")
+    def test_zero_copy_without_checksum(self):
+        copy = self._copy()
+        self.assertTrue(copy.zero_copy)
+        self.assertIsNone(copy.checksum)
+
+    @skipUnless(ZERO_COPY_SUPPORTED, "Copying in the kernel is not supported")
+    @patch("kolibri.core.content.utils.transfer.ZERO_COPY_BLOCK_SIZE", 4)
+    def test_zero_copy_falls_back_to_reading(self):
+        calls = []
+
+        def kernel_copy(copy):
+            # copy a block in the kernel, then fail as if it isn't supported
+            if calls:
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            calls.append(True)
+            return original_kernel_copy(copy)
+
+        original_kernel_copy = FileCopy._kernel_copy
+        with patch.object(FileCopy, "_kernel_copy", kernel_copy):
+            copy = self._copy(compute_checksum=True)
+        self.assertFalse(copy.zero_copy)
+        self.assertEqual(copy.checksum, hashlib.md5(self.content).hexdigest())
+
+    @skipUnless(ZERO_COPY_SUPPORTED, "Copying in the kernel is not supported")
+    def test_zero_copy_cancelled(self):
+        copy = FileCopy(self.source, self.dest, cancel_check=lambda: True)
+        with self.assertRaises(TransferCanceled):
+            with copy:
+                for chunk in copy:
+                    pass
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.dest + ".transfer"))
@@ -1,5 +1,6 @@
 import hashlib
 import os
+import shutil
 import tempfile
 import zipfile
 
@@ -8,8 +9,11 @@ from django.test import Client
 from django.test import TestCase
 from mock import patch
 
+from .. import views
 from ..models import LocalFile
 from ..utils.paths import get_content_storage_file_path
+from ..utils.paths import get_hashi_cache_dir_path
+from ..utils.zip_index import ZipIndexCache
 from kolibri.core.auth.test.helpers import provision_device
 from kolibri.utils.tests.helpers import override_option
 
@@ -277,3 +281,151 @@ class ZipContentTestCase(TestCase):
         caching_client = Client(HTTP_IF_MODIFIED_SINCE="Sat, 10-Sep-2016 19:14:07 GMT")
         response = caching_client.get(self.zip_file_base_url + self.other_name)
         self.assertEqual(response.status_code, 304)
+
+    def test_range_request_partial_content(self, filename_patch):
+        response = self.client.get(
+            self.zip_file_base_url + self.test_name_1, HTTP_RANGE="bytes=5-8"
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content).decode(), "is a")
+        self.assertEqual(response["Content-Range"], "bytes 5-8/15")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_range_request_suffix(self, filename_patch):
+        response = self.client.get(
+            self.zip_file_base_url + self.test_name_1, HTTP_RANGE="bytes=-5"
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content).decode(), "test!")
+
+    def test_range_request_not_satisfiable(self, filename_patch):
+        response = self.client.get(
+            self.zip_file_base_url + self.test_name_1, HTTP_RANGE="bytes=100-"
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */15")
+
+    def test_range_request_if_range_mismatch_returns_whole_file(self, filename_patch):
+        response = self.client.get(
+            self.zip_file_base_url + self.test_name_1,
+            HTTP_RANGE="bytes=5-8",
+            HTTP_IF_RANGE='"notthecurrentetag"',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content).decode(), self.test_str_1)
+
+    def test_range_request_ignored_for_hashi_html(self, filename_patch):
+        response = self.client.get(
+            self.zip_file_base_url + self.index_name, HTTP_RANGE="bytes=0-3"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "none")
+
+    def test_rendered_html_cached(self, filename_patch):
+        shutil.rmtree(get_hashi_cache_dir_path())
+        with patch(
+            "kolibri.core.content.views.parse_html",
+            wraps=views.parse_html,
+        ) as parse_html_mock:
+            first = self.client.get(self.zip_file_base_url + self.script_name)
+            second = self.client.get(self.zip_file_base_url + self.script_name)
+            self.assertEqual(parse_html_mock.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_rendered_html_cache_version_change(self, filename_patch):
+        shutil.rmtree(get_hashi_cache_dir_path())
+        self.client.get(self.zip_file_base_url + self.script_name)
+        filename_patch.return_value = "hashi456.js"
+        response = self.client.get(self.zip_file_base_url + self.script_name)
+        self.assertIn("hashi456.js", response.content.decode("utf-8"))
+        self.assertEqual(len(os.listdir(get_hashi_cache_dir_path())), 1)
+
+    def test_rendered_html_cache_deleted_with_file(self, filename_patch):
+        self.client.get(self.zip_file_base_url + self.script_name)
+        (version_key,) = os.listdir(get_hashi_cache_dir_path())
+        cache_path = os.path.join(
+            get_hashi_cache_dir_path(), version_key, self.filename
+        )
+        self.assertTrue(os.path.exists(cache_path))
+        self.zip_file_obj.save()
+        self.zip_file_obj.delete_stored_file()
+        self.assertFalse(os.path.exists(cache_path))
+
+
+class ZipIndexCacheTestCase(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache = ZipIndexCache()
+
+    def _write_zip(self, name, members, compression=zipfile.ZIP_STORED):
+        path = os.path.join(self.tempdir, name)
+        with zipfile.ZipFile(path, "w", compression) as zf:
+            for filename, content in members.items():
+                zf.writestr(filename, content)
+        return path
+
+    def test_stored_and_deflated_members_read(self):
+        members = {"a.txt": "stored content" * 100, "b/c.txt": "more content"}
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            path = self._write_zip("{}.zip".format(compression), members, compression)
+            index = self.cache.get(path)
+            self.assertEqual(sorted(index.namelist()), sorted(members.keys()))
+            for filename, content in members.items():
+                with index.open(filename) as f:
+                    self.assertEqual(f.read().decode(), content)
+
+    def test_missing_member_raises_key_error(self):
+        path = self._write_zip("test.zip", {"a.txt": "a"})
+        with self.assertRaises(KeyError):
+            self.cache.get(path).getinfo("b.txt")
+
+    def test_index_reused(self):
+        path = self._write_zip("test.zip", {"a.txt": "a"})
+        with patch(
+            "kolibri.core.content.utils.zip_index.zipfile.ZipFile",
+            wraps=zipfile.ZipFile,
+        ) as zipfile_mock:
+            self.assertIs(self.cache.get(path), self.cache.get(path))
+            self.assertEqual(zipfile_mock.call_count, 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["members"], 1)
+
+    def test_index_invalidated_when_file_changes(self):
+        path = self._write_zip("test.zip", {"a.txt": "a"})
+        self.cache.get(path)
+        self._write_zip("test.zip", {"a.txt": "a", "b.txt": "bb"})
+        self.assertEqual(len(self.cache.get(path)), 2)
+
+    def test_cache_bounded(self):
+        self.cache.max_entries = 2
+        paths = [self._write_zip("{}.zip".format(i), {"a.txt": "a"}) for i in range(3)]
+        for path in paths:
+            self.cache.get(path)
+        stats = self.cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.cache.get(paths[0])
+        self.assertEqual(self.cache.stats()["misses"], 4)
+
+    @patch("kolibri.core.content.utils.zip_index.MIN_DECOMPRESS_CHECKPOINT_INTERVAL", 1)
+    @patch("kolibri.core.content.utils.zip_index.DECOMPRESS_CHUNK_SIZE", 1024)
+    def test_deflated_member_ranges(self):
+        content = "".join(str(i) for i in range(20000)).encode()
+        path = self._write_zip("test.zip", {"a.txt": content}, zipfile.ZIP_DEFLATED)
+        index = self.cache.get(path)
+        info = index.getinfo("a.txt")
+        self.assertTrue(index.supports_range(info))
+        # read forward from the start, and then out of order, once checkpoints exist
+        for start, length in ((0, len(content)), (50000, 1000), (3, 10), (70000, 5000)):
+            with index.open_range(info, start, length) as f:
+                data = b""
+                chunk = f.read(4096)
+                while chunk:
+                    data += chunk
+                    chunk = f.read(4096)
+            self.assertEqual(data, content[start : start + length])
+        self.assertTrue(index._checkpoints["a.txt"])
+        self.assertGreater(index.size, index._base_size)
@@ -16,6 +16,7 @@ from sqlalchemy.exc import DatabaseError
 from kolibri.core.content.apps import KolibriContentConfig
 from kolibri.core.content.models import ChannelMetadata
 from kolibri.core.content.models import ContentNode
+from kolibri.core.content.utils.annotation import set_ancestors
 from kolibri.core.content.utils.annotation import set_content_visibility_from_disk
 from kolibri.core.content.utils.channel_import import FutureSchemaError
 from kolibri.core.content.utils.channel_import import import_channel_from_local_db
@@ -23,6 +24,7 @@ from kolibri.core.content.utils.channel_import import InvalidSchemaVersionError
 from kolibri.core.content.utils.channels import get_channel_ids_for_content_dirs
 from kolibri.core.content.utils.paths import get_all_content_dir_paths
 from kolibri.core.content.utils.paths import get_content_database_file_path
+from kolibri.core.content.utils.search import index_channel
 from kolibri.core.content.utils.sqlalchemybridge import Bridge
 from kolibri.core.upgrade import version_upgrade
 
@@ -291,3 +293,27 @@ def update_on_device_resources():
     trans.commit()
 
     bridge.end()
+
+
+# The search index was introduced in 0.14.7, so only build it
+# when upgrading from versions prior to this.
+@version_upgrade(old_version="<0.14.7")
+def build_search_index():
+    """
+    Function to populate the search index for channels that were imported
+    before the search index existed.
+    """
+    for channel_id in ChannelMetadata.objects.all().values_list("id", flat=True):
+        index_channel(channel_id)
+
+
+# Precomputed ancestors were introduced in 0.14.7, so only set them
+# when upgrading from versions prior to this.
+@version_upgrade(old_version="<0.14.7")
+def update_ancestors():
+    """
+    Function to set the precomputed ancestors of all nodes for channels that were
+    imported before they were stored on each node.
+    """
+    for channel_id in ChannelMetadata.objects.all().values_list("id", flat=True):
+        set_ancestors(channel_id)
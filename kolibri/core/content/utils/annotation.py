@@ -1,4 +1,5 @@
 import datetime
+import json
 import logging
 import os
 from itertools import groupby
@@ -8,6 +9,7 @@ from django.db.models import Max
 from django.db.models import Sum
 from le_utils.constants import content_kinds
 from sqlalchemy import and_
+from sqlalchemy import bindparam
 from sqlalchemy import cast
 from sqlalchemy import exists
 from sqlalchemy import false
@@ -501,6 +503,112 @@ def set_local_file_availability_from_disk(checksums=None, destination=None):
     )
 
 
+def _update_ancestors(connection, ContentNodeTable, channel_id):
+    """
+    Store on each node of the channel the list of ids, titles and MPTT fields of
+    its ancestors, ordered from the root down, so that they do not have to be
+    queried for when serializing nodes. Only rows whose stored ancestors have
+    changed are written.
+    """
+    query = (
+        select(
+            [
+                ContentNodeTable.c.id,
+                ContentNodeTable.c.title,
+                ContentNodeTable.c.lft,
+                ContentNodeTable.c.rght,
+                ContentNodeTable.c.tree_id,
+                ContentNodeTable.c.ancestors,
+            ]
+        )
+        .where(ContentNodeTable.c.channel_id == channel_id)
+        .order_by(
+            ContentNodeTable.c.tree_id, ContentNodeTable.c.lft, ContentNodeTable.c.id
+        )
+        .limit(CHUNKSIZE)
+    )
+
+    # In MPTT order, the ancestors of a node are exactly the previously seen
+    # nodes that enclose its left and right values, so we only ever need to
+    # keep the current path from the root in memory.
+    path = []
+    current_tree_id = None
+    current_lft = None
+    current_id = None
+
+    while True:
+        batch = query
+        if current_tree_id is not None:
+            # Page through the channel in MPTT order, rather than loading it all at once
+            batch = batch.where(
+                or_(
+                    ContentNodeTable.c.tree_id > current_tree_id,
+                    and_(
+                        ContentNodeTable.c.tree_id == current_tree_id,
+                        ContentNodeTable.c.lft > current_lft,
+                    ),
+                    and_(
+                        ContentNodeTable.c.tree_id == current_tree_id,
+                        ContentNodeTable.c.lft == current_lft,
+                        ContentNodeTable.c.id > current_id,
+                    ),
+                )
+            )
+        nodes = connection.execute(batch).fetchall()
+        if not nodes:
+            break
+
+        updates = []
+        for node_id, title, lft, rght, tree_id, current_ancestors in nodes:
+            if tree_id != current_tree_id:
+                path = []
+                current_tree_id = tree_id
+            current_lft = lft
+            current_id = node_id
+            while path and (path[-1]["lft"] >= lft or path[-1]["rght"] <= rght):
+                path.pop()
+            ancestors = json.dumps(path, sort_keys=True)
+            if ancestors != current_ancestors:
+                updates.append({"_id": node_id, "_ancestors": ancestors})
+            path.append(
+                {
+                    "id": node_id,
+                    "title": title,
+                    "lft": lft,
+                    "rght": rght,
+                    "tree_id": tree_id,
+                }
+            )
+
+        if updates:
+            _write_ancestors(connection, ContentNodeTable, updates)
+
+
+def _write_ancestors(connection, ContentNodeTable, updates):
+    connection.execute(
+        ContentNodeTable.update()
+        .where(ContentNodeTable.c.id == bindparam("_id"))
+        .values(ancestors=bindparam("_ancestors")),
+        updates,
+    )
+
+
+def set_ancestors(channel_id):
+    bridge = Bridge(app_name=CONTENT_APP_NAME)
+
+    ContentNodeTable = bridge.get_table(ContentNode)
+
+    connection = bridge.get_connection()
+
+    trans = connection.begin()
+
+    _update_ancestors(connection, ContentNodeTable, channel_id)
+
+    trans.commit()
+
+    bridge.end()
+
+
 def recurse_annotation_up_tree(channel_id):
     bridge = Bridge(app_name=CONTENT_APP_NAME)
 
@@ -610,6 +718,8 @@ def recurse_annotation_up_tree(channel_id):
         )
     )
 
+    _update_ancestors(connection, ContentNodeTable, channel_id)
+
     # Go from the deepest level to the shallowest
     for level in range(node_depth, 0, -1):
 
@@ -9,6 +9,7 @@ from sqlalchemy.sql import text
 
 from .channels import read_channel_metadata_from_db_file
 from .paths import get_content_database_file_path
+from .search import index_channel
 from .sqlalchemybridge import Bridge
 from .sqlalchemybridge import ClassNotFoundError
 from kolibri.core.content.apps import KolibriContentConfig
@@ -815,5 +816,7 @@ def import_channel_from_local_db(channel_id, cancel_check=None):
         )
     channel.save()
 
+    index_channel(channel_id)
+
     logger.info("Channel {} successfully imported into the database".format(channel_id))
     return import_ran
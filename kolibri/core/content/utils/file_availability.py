@@ -3,7 +3,6 @@ import os
 import re
 from itertools import compress
 
-import requests
 from django.utils.text import compress_string
 
 from kolibri.core.content.models import LocalFile
@@ -65,7 +64,10 @@ def get_available_checksums_from_remote(channel_id, peer_id):
             .distinct()
         )
 
-        response = requests.post(
+        # import here to avoid circular imports
+        from kolibri.core.content.utils.transfer import get_download_session
+
+        response = get_download_session().post(
             get_file_checksums_url(channel_id, baseurl),
             data=compress_string(
                 bytes(json.dumps(list(channel_checksums)).encode("utf-8"))
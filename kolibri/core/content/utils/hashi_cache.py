@@ -0,0 +1,103 @@
+"""
+A disk cache of the HTML rendered for files inside zip files for display in hashi.
+
+Transforming HTML with html5lib to make it work with hashi, and rendering the H5P
+bootloader, is slow, but the output only depends on the zip file, the embedded file
+path, and the version of Kolibri and hashi being used. The rendered output is cached
+in a directory next to content storage, keyed by a version key that callers derive from
+the Kolibri and hashi versions, then by the zip file name (which is a checksum of the zip
+file) and a hash of the embedded file path.
+
+Cache entries are populated lazily when they are first rendered, and the entries for
+other version keys are removed when the first entry for a new version key is written.
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+
+from six import text_type
+
+from kolibri.core.content.utils.paths import get_hashi_cache_dir_path
+
+logger = logging.getLogger(__name__)
+
+_cleaned_version_keys = set()
+
+
+def _get_version_dir_path(version_key):
+    return os.path.join(get_hashi_cache_dir_path(), version_key)
+
+
+def _get_cache_file_path(version_key, zipped_filename, embedded_filepath):
+    return os.path.join(
+        _get_version_dir_path(version_key),
+        zipped_filename,
+        hashlib.md5(embedded_filepath.encode("utf-8")).hexdigest(),
+    )
+
+
+def _remove_other_versions(version_key):
+    if version_key in _cleaned_version_keys:
+        return
+    _cleaned_version_keys.add(version_key)
+    cache_dir = get_hashi_cache_dir_path()
+    for name in os.listdir(cache_dir):
+        if name != version_key:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def _write_cache_file(path, content):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    # write to a temporary file and then move it into place, so that
+    # concurrent requests never read a partially written cache file
+    with tempfile.NamedTemporaryFile(dir=dirname, delete=False) as f:
+        f.write(content)
+    try:
+        os.rename(f.name, path)
+    except OSError:
+        # on Windows rename fails if another request has already written
+        # the cache file, in which case this copy is not needed
+        os.remove(f.name)
+
+
+def get_rendered_content(version_key, zipped_filename, embedded_filepath, render):
+    """
+    Return the bytes of the rendered content for an embedded file path of a zip file,
+    reading them from the cache if present, and otherwise calling render to render
+    the content and writing it to the cache.
+    """
+    path = _get_cache_file_path(version_key, zipped_filename, embedded_filepath)
+    try:
+        with io.open(path, "rb") as f:
+            return f.read()
+    except (IOError, OSError):
+        pass
+    content = render()
+    if isinstance(content, text_type):
+        content = content.encode("utf-8")
+    try:
+        _remove_other_versions(version_key)
+        _write_cache_file(path, content)
+    except (IOError, OSError) as e:
+        logger.debug("Unable to cache rendered content at {}: {}".format(path, e))
+    return content
+
+
+def delete_rendered_content(zipped_filename):
+    """
+    Remove any cached rendered content for a zip file, for when the zip file is deleted.
+    """
+    cache_dir = get_hashi_cache_dir_path()
+    try:
+        version_keys = os.listdir(cache_dir)
+    except OSError:
+        return
+    for version_key in version_keys:
+        shutil.rmtree(
+            os.path.join(cache_dir, version_key, zipped_filename), ignore_errors=True
+        )
@@ -242,7 +242,13 @@ def retry_import(e):
     return False
 
 
-def compare_checksums(file_name, file_id):
+def compare_checksums(file_name, file_id, checksum=None):
+    """
+    Check that the MD5 checksum of the file is the file_id. If the checksum of the file is given,
+    such as the one computed while the file was transferred, it is checked instead of reading the file.
+    """
+    if checksum is not None:
+        return checksum == file_id
     hasher = hashlib.md5()
     with open(file_name, "rb") as f:
         # Read chunks of 4096 bytes for memory efficiency
@@ -250,3 +256,88 @@ def compare_checksums(file_name, file_id):
             hasher.update(chunk)
     checksum = hasher.hexdigest()
     return checksum == file_id
+
+
+class ImportCheckpoint(object):
+    """
+    Tracks the progress of a content import in a form that is small enough to save to the
+    import job's checkpoint frequently, so that an interrupted import can resume without
+    transferring or checking the files that it already imported.
+
+    Files are processed in order of checksum, so rather than the checksums of every imported
+    file, the checkpoint stores the checksum up to which all files have been processed, the
+    checksums of the files beyond it that have been imported, the checksums of the files before
+    it that failed to import, and the checksums of the files that were being transferred.
+    """
+
+    def __init__(self, checkpoint=None):
+        checkpoint = checkpoint or {}
+        # The state saved by a previous run of the import
+        self._previous_processed_up_to = checkpoint.get("processed_up_to")
+        self._previous_imported = set(checkpoint.get("imported", ()))
+        self._previous_failed = set(checkpoint.get("failed", ()))
+        self._previous_transferring = set(checkpoint.get("transferring", ()))
+
+        self.processed_up_to = None
+        self.imported = set()
+        self.failed = set()
+        self.transferring = set()
+        self._order = []
+        self._position = 0
+        self._processed = set()
+
+    def set_checksums(self, checksums):
+        """
+        Set the checksums of all the files to be processed by this run of the import.
+        """
+        self._order = sorted(checksums)
+        self._position = 0
+
+    def was_imported(self, checksum):
+        """
+        Return True if a previous run of the import imported the file.
+        """
+        if checksum in self._previous_imported:
+            return True
+        return (
+            self._previous_processed_up_to is not None
+            and checksum <= self._previous_processed_up_to
+            and checksum not in self._previous_failed
+        )
+
+    def was_transferring(self, checksum):
+        """
+        Return True if a previous run of the import was transferring the file when it was
+        interrupted, so that its partially transferred temporary file can be resumed.
+        """
+        return checksum in self._previous_transferring
+
+    def start_transfer(self, checksum):
+        self.transferring.add(checksum)
+
+    def finish(self, checksum, imported=True):
+        """
+        Record that the file has been processed, and whether it was imported.
+        """
+        self.transferring.discard(checksum)
+        if imported:
+            self.imported.add(checksum)
+        else:
+            self.failed.add(checksum)
+        self._processed.add(checksum)
+        while (
+            self._position < len(self._order)
+            and self._order[self._position] in self._processed
+        ):
+            self.processed_up_to = self._order[self._position]
+            self._processed.discard(self.processed_up_to)
+            self.imported.discard(self.processed_up_to)
+            self._position += 1
+
+    def to_dict(self):
+        return {
+            "processed_up_to": self.processed_up_to,
+            "imported": list(self.imported),
+            "failed": list(self.failed),
+            "transferring": list(self.transferring),
+        }
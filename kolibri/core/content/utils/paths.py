@@ -163,6 +163,15 @@ def get_content_storage_dir_path(datafolder=None, contentfolder=None):
     return path
 
 
+def get_hashi_cache_dir_path(datafolder=None, contentfolder=None):
+    path = os.path.join(
+        get_content_dir_path(datafolder=datafolder, contentfolder=contentfolder),
+        "hashi_cache",
+    )
+    _maybe_makedirs(path)
+    return path
+
+
 def get_content_storage_file_path(filename, datafolder=None, contentfolder=None):
     if not VALID_STORAGE_FILENAME.match(filename):
         raise InvalidStorageFilenameError(
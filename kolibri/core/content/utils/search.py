@@ -0,0 +1,252 @@
+"""
+A full text search index over the title, description and tags of ContentNodes.
+
+On SQLite the index is an FTS5 virtual table, on PostgreSQL it is a table holding
+a weighted tsvector with a GIN index. Only the searchable text is stored in the index,
+matches are always joined back onto the ContentNode table so that availability and any
+other queryset filters are applied against the current node data.
+
+If the index cannot be created (for example on a SQLite build without FTS5), the
+search_index_available function will return False and callers should fall back to
+unindexed searching.
+"""
+import logging
+import re
+
+from django.db import connection
+from django.db import transaction
+from django.db.utils import DatabaseError
+
+from kolibri.core.content.utils.stopwords import stopwords_set
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_TABLE = "content_contentnode_search"
+
+CONTENTNODE_TABLE = "content_contentnode"
+
+# Relative weighting of matches in each of the indexed fields on SQLite,
+# on PostgreSQL the equivalent is done with tsvector weight labels.
+TITLE_WEIGHT = 10.0
+TAGS_WEIGHT = 5.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Matches any run of word characters, so that only plain words ever make
+# it into the full text query syntax of either database backend.
+word_re = re.compile(r"\w+", flags=re.UNICODE)
+
+_search_index_exists = False
+
+
+def _create_sqlite_index(cursor):
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        "node_id UNINDEXED, channel_id UNINDEXED, title, description, tags, "
+        "tokenize = 'unicode61 remove_diacritics 1', prefix = '2 3')".format(
+            table=SEARCH_INDEX_TABLE
+        )
+    )
+
+
+def _create_postgresql_index(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS {table} ("
+        "node_id uuid PRIMARY KEY, channel_id uuid NOT NULL, document tsvector NOT NULL)".format(
+            table=SEARCH_INDEX_TABLE
+        )
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS {table}_document_idx ON {table} USING GIN (document)".format(
+            table=SEARCH_INDEX_TABLE
+        )
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS {table}_channel_id_idx ON {table} (channel_id)".format(
+            table=SEARCH_INDEX_TABLE
+        )
+    )
+
+
+def create_search_index(db_connection=connection):
+    """
+    Create the search index table if it does not already exist.
+    Returns True if the index is available after this call.
+    """
+    try:
+        with db_connection.cursor() as cursor:
+            if db_connection.vendor == "sqlite":
+                _create_sqlite_index(cursor)
+            elif db_connection.vendor == "postgresql":
+                _create_postgresql_index(cursor)
+            else:
+                return False
+    except DatabaseError as e:
+        logger.warning(
+            "Unable to create content search index, search will be unindexed: {}".format(
+                e
+            )
+        )
+        return False
+    return True
+
+
+def drop_search_index(db_connection=connection):
+    global _search_index_exists
+    _search_index_exists = False
+    with db_connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS {table}".format(table=SEARCH_INDEX_TABLE))
+
+
+def search_index_available():
+    """
+    Check whether the search index table exists in the default database.
+    """
+    global _search_index_exists
+    if not _search_index_exists and connection.vendor in ("sqlite", "postgresql"):
+        with connection.cursor() as cursor:
+            _search_index_exists = (
+                SEARCH_INDEX_TABLE in connection.introspection.table_names(cursor)
+            )
+    return _search_index_exists
+
+
+def _tags_subquery():
+    aggregate = (
+        "GROUP_CONCAT(t.tag_name, ' ')"
+        if connection.vendor == "sqlite"
+        else "STRING_AGG(t.tag_name, ' ')"
+    )
+    return (
+        "(SELECT {aggregate} FROM content_contentnode_tags ct "
+        "INNER JOIN content_contenttag t ON t.id = ct.contenttag_id "
+        "WHERE ct.contentnode_id = n.id)".format(aggregate=aggregate)
+    )
+
+
+def _delete_channel(cursor, channel_id):
+    cursor.execute(
+        "DELETE FROM {table} WHERE channel_id = %s".format(table=SEARCH_INDEX_TABLE),
+        [channel_id],
+    )
+
+
+def delete_channel_search_index(channel_id):
+    """
+    Remove all index entries for the nodes of a channel.
+    """
+    if not search_index_available():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        _delete_channel(cursor, channel_id)
+
+
+def index_channel(channel_id):
+    """
+    (Re)build the search index entries for all the nodes in a channel
+    in a single INSERT ... SELECT statement.
+    """
+    if not search_index_available():
+        return
+    logger.info("Building search index for channel {}".format(channel_id))
+    with transaction.atomic(), connection.cursor() as cursor:
+        _delete_channel(cursor, channel_id)
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "INSERT INTO {table} (node_id, channel_id, title, description, tags) "
+                "SELECT n.id, n.channel_id, n.title, COALESCE(n.description, ''), COALESCE({tags}, '') "
+                "FROM {node_table} n WHERE n.channel_id = %s".format(
+                    table=SEARCH_INDEX_TABLE,
+                    node_table=CONTENTNODE_TABLE,
+                    tags=_tags_subquery(),
+                ),
+                [channel_id],
+            )
+        else:
+            cursor.execute(
+                "INSERT INTO {table} (node_id, channel_id, document) "
+                "SELECT n.id, n.channel_id, "
+                "setweight(to_tsvector('simple', n.title), 'A') || "
+                "setweight(to_tsvector('simple', COALESCE({tags}, '')), 'B') || "
+                "setweight(to_tsvector('simple', COALESCE(n.description, '')), 'C') "
+                "FROM {node_table} n WHERE n.channel_id = %s".format(
+                    table=SEARCH_INDEX_TABLE,
+                    node_table=CONTENTNODE_TABLE,
+                    tags=_tags_subquery(),
+                ),
+                [channel_id],
+            )
+
+
+def get_search_words(value):
+    """
+    Split a search string into the lower cased words that are not stopwords,
+    or into all of its words if every one of them is a stopword.
+    """
+    words = word_re.findall(value.lower())
+    return [w for w in words if w not in stopwords_set] or words
+
+
+def _sqlite_search_extra(words):
+    # Every word is quoted so it can never be interpreted as FTS5 query syntax,
+    # and matched as a prefix to approximate the previous substring matching.
+    match = " OR ".join('"{}"*'.format(w) for w in words)
+    rank = "bm25({table}, 0.0, 0.0, {title}, {description}, {tags})".format(
+        table=SEARCH_INDEX_TABLE,
+        title=TITLE_WEIGHT,
+        description=DESCRIPTION_WEIGHT,
+        tags=TAGS_WEIGHT,
+    )
+    return {
+        "where": ["{table} MATCH %s".format(table=SEARCH_INDEX_TABLE)],
+        "params": [match],
+        # bm25 returns more negative values for better matches
+        "select": {"search_rank": rank},
+        "select_params": [],
+    }
+
+
+def _postgresql_search_extra(words):
+    query = " | ".join("{}:*".format(w) for w in words)
+    tsquery = "to_tsquery('simple', %s)"
+    return {
+        "where": [
+            "{table}.document @@ {tsquery}".format(
+                table=SEARCH_INDEX_TABLE, tsquery=tsquery
+            )
+        ],
+        "params": [query],
+        # ts_rank returns higher values for better matches, with matches
+        # weighted by the A (title), B (tags) and C (description) labels
+        "select": {
+            "search_rank": "-ts_rank({table}.document, {tsquery})".format(
+                table=SEARCH_INDEX_TABLE, tsquery=tsquery
+            )
+        },
+        "select_params": [query],
+    }
+
+
+def filter_by_search(queryset, words):
+    """
+    Restrict a ContentNode queryset to nodes matching any of the words,
+    annotated with a search_rank (lower is better) and ordered by it.
+    """
+    if not words:
+        return queryset.none()
+    if connection.vendor == "sqlite":
+        extra = _sqlite_search_extra(words)
+    else:
+        extra = _postgresql_search_extra(words)
+    return queryset.extra(
+        tables=[SEARCH_INDEX_TABLE],
+        where=[
+            "{table}.node_id = {node_table}.id".format(
+                table=SEARCH_INDEX_TABLE, node_table=CONTENTNODE_TABLE
+            )
+        ]
+        + extra["where"],
+        params=extra["params"],
+        select=extra["select"],
+        select_params=extra["select_params"],
+        order_by=["search_rank"],
+    )
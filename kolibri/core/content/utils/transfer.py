@@ -1,14 +1,57 @@
+import errno
+import hashlib
 import logging
 import os
 import shutil
+import threading
 from time import sleep
+from time import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from six.moves import queue
 
 from kolibri.core.content.utils.import_export_content import retry_import
 
 logger = logging.getLogger(__name__)
 
+# The maximum number of files that are transferred at once, and so the number of connections
+# to each host that the download session keeps open
+MAX_CONCURRENT_TRANSFERS = 10
+
+# The number of times the download session retries a request that fails to connect, or that gets
+# a response saying the server is unavailable, and the backoff factor in seconds between retries
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_RETRY_BACKOFF = 0.5
+
+# The smallest file, in bytes, that a download split into segments is split for
+SEGMENTED_DOWNLOAD_MIN_SIZE = 64 * 1024 * 1024
+
+# How many chunks each segment of a segmented download can read ahead of them being written
+SEGMENT_QUEUE_CHUNKS = 2
+
+# Put on the queue of a segmented download by a segment when it has finished
+_SEGMENT_DONE = object()
+
+# Whether files can be copied by the kernel, without reading them into Python and writing them back
+ZERO_COPY_SUPPORTED = hasattr(os, "sendfile") or hasattr(os, "copy_file_range")
+
+# How many bytes to copy at a time when copying in the kernel. Cancellation is checked, and progress
+# reported, after each block, so this is larger than the block size only to reduce system calls.
+ZERO_COPY_BLOCK_SIZE = 16 * 1024 * 1024
+
+# The errors from copying in the kernel that mean it isn't supported for the files being copied,
+# such as copy_file_range between filesystems on older kernels, or sendfile to a file on macOS
+_ZERO_COPY_UNSUPPORTED_ERRNOS = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSOCK,
+    errno.EBADF,
+)
+
 
 class ExistingTransferInProgress(Exception):
     pass
@@ -26,6 +69,115 @@ class TransferNotYetClosed(Exception):
     pass
 
 
+class DownloadSession(requests.Session):
+    """
+    A session for downloading content, shared by all downloads in the process, so that connections
+    to each host are kept alive and reused. At most pool_size connections are opened to each host,
+    so requests beyond that wait for a connection to be free, which limits the concurrent downloads
+    from any one host. Requests that fail to connect, or that the server is unavailable for, are
+    retried with exponential backoff, before the errors are handled by the downloads themselves.
+    """
+
+    def __init__(
+        self,
+        pool_size=MAX_CONCURRENT_TRANSFERS,
+        retries=DOWNLOAD_RETRIES,
+        backoff_factor=DOWNLOAD_RETRY_BACKOFF,
+    ):
+        super(DownloadSession, self).__init__()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            method_whitelist=Retry.DEFAULT_METHOD_WHITELIST | frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_maxsize=pool_size, pool_block=True, max_retries=retry
+        )
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def connection_stats(self):
+        """
+        Return the number of requests made, and connections opened, to the hosts currently in the
+        session's pools, and how many of the requests reused a kept alive connection.
+        """
+        requests_count = 0
+        connections_count = 0
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_count += pool.num_requests
+                    connections_count += pool.num_connections
+        return {
+            "requests": requests_count,
+            "connections": connections_count,
+            "reused": max(requests_count - connections_count, 0),
+        }
+
+
+_download_session = None
+_download_session_lock = threading.Lock()
+
+
+def get_download_session():
+    """
+    Return the download session shared by all downloads in this process.
+    """
+    global _download_session
+    with _download_session_lock:
+        if _download_session is None:
+            _download_session = DownloadSession()
+        return _download_session
+
+
+class TransferConcurrency(object):
+    """
+    Adapts the number of files to transfer at once from a source to how well the source copes,
+    increasing it by one while that improves the throughput, and halving it when a transfer fails.
+    """
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self._reset()
+        # The throughput at the current limit, before it was last increased
+        self._last_throughput = None
+
+    def _reset(self):
+        self._window_start = time()
+        self._window_bytes = 0
+        self._window_transfers = 0
+
+    def record_success(self, size):
+        """
+        Record a completed transfer of size bytes. Once as many transfers as the limit have completed,
+        the throughput is compared to that measured before, and the limit adjusted.
+        """
+        self._window_bytes += size
+        self._window_transfers += 1
+        if self._window_transfers < self.limit:
+            return
+        elapsed = max(time() - self._window_start, 1e-6)
+        throughput = self._window_bytes / elapsed
+        if self._last_throughput is None or throughput >= self._last_throughput:
+            self.limit = min(self.limit + 1, self.maximum)
+        else:
+            # The last increase didn't help, so go back to the previous limit
+            self.limit = max(self.limit - 1, self.minimum)
+        self._last_throughput = throughput
+        self._reset()
+
+    def record_error(self):
+        self.limit = max(self.limit // 2, self.minimum)
+        self._last_throughput = None
+        self._reset()
+
+
 class Transfer(object):
     def __init__(
         self,
@@ -46,6 +198,9 @@ class Transfer(object):
         self.finalized = False
         self.closed = False
         self.cancel_check = cancel_check
+        # The MD5 hash of the data written to the destination, computed as it is written,
+        # or None if the data isn't written in order, so it has to be hashed from the file
+        self._hasher = hashlib.md5()
 
         # TODO (aron): Instead of using signals, have bbq/iceqube add
         # hooks that the app calls every so often to determine whether it
@@ -69,8 +224,15 @@ class Transfer(object):
             else:
                 raise
 
+        self.remove_existing_temp_file = remove_existing_temp_file
+        self._check_temp_file()
+
+        # record whether the destination file already exists, so it can be checked, but don't error out
+        self.dest_exists = os.path.isfile(dest)
+
+    def _check_temp_file(self):
         if os.path.isfile(self.dest_tmp):
-            if remove_existing_temp_file:
+            if self.remove_existing_temp_file:
                 os.remove(self.dest_tmp)
             else:
                 raise ExistingTransferInProgress(
@@ -79,9 +241,6 @@ class Transfer(object):
                     )
                 )
 
-        # record whether the destination file already exists, so it can be checked, but don't error out
-        self.dest_exists = os.path.isfile(dest)
-
     def start(self):
         # open the destination file for writing
         self.dest_file_obj = open(self.dest_tmp, "wb")
@@ -98,8 +257,33 @@ class Transfer(object):
             self.finalize()
             raise
         self.dest_file_obj.write(chunk)
+        if self._hasher is not None:
+            self._hasher.update(chunk)
         return chunk
 
+    @property
+    def checksum(self):
+        """
+        The MD5 checksum of the transferred file, computed while it was transferred, so that it
+        can be verified without reading the file again. None if the transfer hasn't completed, or
+        the checksum couldn't be computed during the transfer.
+        """
+        if not self.completed or self._hasher is None:
+            return None
+        return self._hasher.hexdigest()
+
+    def _hash_partial_file(self, size):
+        """
+        Add the first size bytes of the temporary file, that the transfer is continuing from, to the hash.
+        """
+        with open(self.dest_tmp, "rb") as f:
+            while size > 0:
+                block = f.read(min(self.block_size, size))
+                if not block:
+                    break
+                self._hasher.update(block)
+                size -= len(block)
+
     def _move_tmp_to_dest(self):
         shutil.move(self.dest_tmp, self.dest)
 
@@ -144,6 +328,16 @@ class Transfer(object):
         self.closed = True
 
 
+class _Segment(object):
+    """
+    A byte range of a segmented download, and the position in it that has been read up to.
+    """
+
+    def __init__(self, start, end):
+        self.position = start
+        self.end = end
+
+
 class FileDownload(Transfer):
     def __init__(self, *args, **kwargs):
 
@@ -151,22 +345,68 @@ class FileDownload(Transfer):
         if "session" in kwargs:
             self.session = kwargs.pop("session")
         else:
-            # initialize a fresh requests session, if one wasn't provided
-            self.session = requests.Session()
+            # use the shared download session, if one wasn't provided
+            self.session = get_download_session()
 
         # Record the size of content that has been transferred
         self.transferred_size = 0
 
+        # If resume_partial is True, a temporary file left by an interrupted download of the
+        # same file is kept, and the download is resumed from the end of it when possible
+        self.resume_partial = kwargs.pop("resume_partial", False)
+
+        # If keep_partial is True, the temporary file is kept if the download is canceled
+        # or fails before it completes, so that it can be resumed later
+        self.keep_partial = kwargs.pop("keep_partial", False)
+
+        # The size of the partially downloaded file that the download was resumed from
+        self.partial_size = 0
+
+        # The number of byte range segments to download a large file in concurrently,
+        # when the server supports range requests
+        self.segments = kwargs.pop("segments", 1)
+        self.segmented = False
+
         super(FileDownload, self).__init__(*args, **kwargs)
 
+    def _check_temp_file(self):
+        if self.resume_partial and os.path.isfile(self.dest_tmp):
+            self.partial_size = os.path.getsize(self.dest_tmp)
+        else:
+            super(FileDownload, self)._check_temp_file()
+
+    def _start_partial(self):
+        self.dest_file_obj = open(self.dest_tmp, "ab")
+        self.response = self.session.get(
+            self.source,
+            headers={"Range": "bytes={}-".format(self.partial_size)},
+            stream=True,
+            timeout=self.timeout,
+        )
+        if self.response.status_code == 206:
+            self.transferred_size = self.partial_size
+            self._hash_partial_file(self.partial_size)
+            return
+        # The server doesn't support range requests, or the partial file is no shorter
+        # than the file, so download the whole file again
+        self.response.close()
+        self.dest_file_obj.seek(0)
+        self.dest_file_obj.truncate()
+        self.partial_size = 0
+        self.response = self.session.get(self.source, stream=True, timeout=self.timeout)
+        self.response.raise_for_status()
+
     def start(self):
-        super(FileDownload, self).start()
         # initiate the download, check for status errors, and calculate download size
         try:
-            self.response = self.session.get(
-                self.source, stream=True, timeout=self.timeout
-            )
-            self.response.raise_for_status()
+            if self.partial_size:
+                self._start_partial()
+            else:
+                super(FileDownload, self).start()
+                self.response = self.session.get(
+                    self.source, stream=True, timeout=self.timeout
+                )
+                self.response.raise_for_status()
         except Exception as e:
             retry = retry_import(e)
             if not retry:
@@ -177,6 +417,7 @@ class FileDownload(Transfer):
                 self._kill_gracefully()
 
         try:
+            # When resuming a partial download, this is the size of the rest of the file
             self.total_size = int(self.response.headers["content-length"])
         except KeyError:
             # When a compressed file is saved on Google Cloud Storage,
@@ -191,20 +432,147 @@ class FileDownload(Transfer):
                 # Get size of response content when file is compressed through nginx.
                 self.total_size = len(self.response.content)
 
+        if self._can_segment():
+            self._start_segments()
+
         self.started = True
 
+    def _can_segment(self):
+        return (
+            self.segments > 1
+            and not self.partial_size
+            and self.response.status_code == 200
+            and self.total_size >= SEGMENTED_DOWNLOAD_MIN_SIZE
+            and self.response.headers.get("accept-ranges") == "bytes"
+            and "content-encoding" not in self.response.headers
+        )
+
+    def _start_segments(self):
+        """
+        Download the file in segments of byte ranges, each in its own thread, into a temporary file
+        that is preallocated to the size of the file, so each segment is written in place.
+        """
+        self.response.close()
+        self.segmented = True
+        # The segments are written out of order, so the file is hashed once it is complete
+        self._hasher = None
+        self.dest_file_obj.truncate(self.total_size)
+        segment_size = -(-self.total_size // self.segments)
+        self._segment_queue = queue.Queue(self.segments * SEGMENT_QUEUE_CHUNKS)
+        self._segments_stopped = threading.Event()
+        self._segments_remaining = 0
+        self._segment_threads = []
+        for start in range(0, self.total_size, segment_size):
+            segment = _Segment(start, min(start + segment_size, self.total_size) - 1)
+            thread = threading.Thread(target=self._download_segment, args=(segment,))
+            thread.daemon = True
+            self._segment_threads.append(thread)
+            self._segments_remaining += 1
+        for thread in self._segment_threads:
+            thread.start()
+
+    def _put_segment_chunk(self, item):
+        # Don't block forever if the download has stopped and the queue will never be read
+        while not self._segments_stopped.is_set():
+            try:
+                self._segment_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read_segment(self, response, segment):
+        """
+        Read the response to a segment's range request, up to the end of the segment.
+        Return False if the download stopped before then.
+        """
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise requests.exceptions.HTTPError(
+                "Range request for segment of {} not supported".format(self.source),
+                response=response,
+            )
+        for chunk in response.iter_content(self.block_size):
+            chunk = chunk[: segment.end - segment.position + 1]
+            if not self._put_segment_chunk((segment.position, chunk)):
+                return False
+            segment.position += len(chunk)
+            if segment.position > segment.end:
+                break
+        return True
+
+    def _download_segment(self, segment):
+        while segment.position <= segment.end:
+            try:
+                response = self.session.get(
+                    self.source,
+                    headers={
+                        "Range": "bytes={}-{}".format(segment.position, segment.end)
+                    },
+                    stream=True,
+                    timeout=self.timeout,
+                )
+                try:
+                    if not self._read_segment(response, segment):
+                        return
+                finally:
+                    response.close()
+            except Exception as e:
+                retry = retry_import(e)
+                if not retry:
+                    self._put_segment_chunk(e)
+                    return
+                logger.error("Error reading download segment stream: {}".format(e))
+                # Resume the segment from where it got to, as a download is resumed
+                if not self._wait_to_retry():
+                    return
+        self._put_segment_chunk(_SEGMENT_DONE)
+
+    def _next_segment_chunk(self):
+        while True:
+            if self.cancel_check():
+                self._kill_gracefully()
+            try:
+                item = self._segment_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is _SEGMENT_DONE:
+                self._segments_remaining -= 1
+                if not self._segments_remaining:
+                    self.completed = True
+                    self.close()
+                    self.finalize()
+                    raise StopIteration
+                continue
+            if isinstance(item, Exception):
+                raise item
+            offset, chunk = item
+            self.dest_file_obj.seek(offset)
+            self.dest_file_obj.write(chunk)
+            self.transferred_size += len(chunk)
+            return chunk
+
+    def _stop_segments(self):
+        if self.segmented:
+            self._segments_stopped.set()
+            for thread in self._segment_threads:
+                thread.join()
+
     def __iter__(self):
         assert self.started, "File download must be started before it can be iterated."
         self._content_iterator = self.response.iter_content(self.block_size)
         return self
 
     def next(self):
+        if self.segmented:
+            return self._next_segment_chunk()
+
         if self.cancel_check():
             self._kill_gracefully()
 
         try:
             chunk = super(FileDownload, self).next()
-            self.transferred_size = self.transferred_size + self.block_size
+            self.transferred_size = self.transferred_size + len(chunk)
             return chunk
         except Exception as e:
             retry = retry_import(e)
@@ -216,17 +584,36 @@ class FileDownload(Transfer):
             return self.next()
 
     def close(self):
+        self._stop_segments()
         if hasattr(self, "response"):
             self.response.close()
         super(FileDownload, self).close()
 
-    def resume(self):
+    def cancel(self):
+        # The segments of a segmented download leave gaps in the file, so it can't be resumed
+        if self.keep_partial and not self.segmented:
+            self.close()
+            self.canceled = True
+        else:
+            super(FileDownload, self).cancel()
+
+    def _wait_to_retry(self):
+        """
+        Wait before retrying the download, returning False if it is canceled in the meantime.
+        """
         logger.info("Waiting 30s before retrying import: {}".format(self.source))
         for i in range(30):
-            if self.cancel_check():
+            if self.cancel_check() or (
+                self.segmented and self._segments_stopped.is_set()
+            ):
                 logger.info("Canceling import: {}".format(self.source))
-                return
+                return False
             sleep(1)
+        return True
+
+    def resume(self):
+        if not self._wait_to_retry():
+            return
 
         try:
 
@@ -247,6 +634,8 @@ class FileDownload(Transfer):
                     range_headers = {"Range": "bytes={}-".format(self.transferred_size)}
                     resume_headers.update(range_headers)
 
+                # Return the connection of the failed response to the pool
+                self.response.close()
                 self.response = self.session.get(
                     self.source,
                     headers=resume_headers,
@@ -264,6 +653,9 @@ class FileDownload(Transfer):
             if byte_range_resume is None:
                 self.dest_file_obj.seek(0)
                 self.dest_file_obj.truncate()
+                self.transferred_size = 0
+                self.partial_size = 0
+                self._hasher = hashlib.md5()
         except Exception as e:
             logger.error("Error reading download stream: {}".format(e))
             retry = retry_import(e)
@@ -273,7 +665,30 @@ class FileDownload(Transfer):
             self.resume()
 
 
+class CopiedBlock(object):
+    """
+    A block of a file that was copied in the kernel, without being read into memory,
+    that is generated in place of a chunk of the file's content to report its size.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+
 class FileCopy(Transfer):
+    def __init__(self, *args, **kwargs):
+        # If compute_checksum is True, the checksum of the file is computed while it is copied
+        # in the kernel, by reading each block from the source after it is copied. Otherwise
+        # the file is never read into memory, and has to be read again to check its checksum.
+        self.compute_checksum = kwargs.pop("compute_checksum", False)
+        self.zero_copy = kwargs.pop("zero_copy", ZERO_COPY_SUPPORTED)
+        self._copy_file_range = hasattr(os, "copy_file_range")
+        self._copied_size = 0
+        super(FileCopy, self).__init__(*args, **kwargs)
+
     def start(self):
         assert (
             not self.started
@@ -296,6 +711,64 @@ class FileCopy(Transfer):
         self._content_iterator = self._read_block_iterator()
         return self
 
+    def _kernel_copy(self):
+        """
+        Copy the next block of the file in the kernel, returning the number of bytes copied.
+        """
+        source_fd = self.source_file_obj.fileno()
+        dest_fd = self.dest_file_obj.fileno()
+        if self._copy_file_range:
+            try:
+                return os.copy_file_range(
+                    source_fd, dest_fd, ZERO_COPY_BLOCK_SIZE, self._copied_size
+                )
+            except OSError as e:
+                if e.errno not in _ZERO_COPY_UNSUPPORTED_ERRNOS:
+                    raise
+                self._copy_file_range = False
+        if not hasattr(os, "sendfile"):
+            raise OSError(errno.ENOSYS, "sendfile is not supported")
+        return os.sendfile(dest_fd, source_fd, self._copied_size, ZERO_COPY_BLOCK_SIZE)
+
+    def next(self):
+        if not self.zero_copy:
+            return super(FileCopy, self).next()
+
+        if self.cancel_check():
+            self._kill_gracefully()
+
+        try:
+            size = self._kernel_copy()
+        except OSError as e:
+            if e.errno not in _ZERO_COPY_UNSUPPORTED_ERRNOS:
+                raise
+            logger.debug(
+                "Copying {} in the kernel isn't supported: {}".format(self.source, e)
+            )
+            # Copy the rest of the file by reading and writing it
+            self.zero_copy = False
+            self.source_file_obj.seek(self._copied_size)
+            self.dest_file_obj.seek(self._copied_size)
+            return self.next()
+
+        if not size:
+            self.completed = True
+            self.close()
+            self.finalize()
+            raise StopIteration
+
+        if self.compute_checksum:
+            # The source was just read by the kernel, so this is read from the page cache
+            block = self.source_file_obj.read(size)
+            self._hasher.update(block)
+        else:
+            self._hasher = None
+            # Keep the position in the source up to date, in case the copy falls back to reading it
+            self.source_file_obj.seek(self._copied_size + size)
+            block = CopiedBlock(size)
+        self._copied_size += size
+        return block
+
     def close(self):
         self.source_file_obj.close()
         super(FileCopy, self).close()
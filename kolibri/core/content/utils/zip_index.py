@@ -0,0 +1,401 @@
+"""
+A bounded, process wide cache of the central directories of zip files in content storage.
+
+Parsing the central directory of an HTML5 app zip file with thousands of entries is
+expensive, and a single page load can request hundreds of assets from the same zip file.
+Rather than opening the zip file with zipfile.ZipFile on every request, the index of its
+members is parsed once and kept in a least recently used cache, keyed by the path to the
+zip file. As content storage filenames are checksums, the only way for a cached index to
+go stale is for the file to be deleted or rewritten, which is detected by comparing the
+size and modification time of the file on each lookup.
+
+No file handles are held by the cache, each member that is read opens its own handle on
+the zip file, so that zip files can still be deleted while their index is cached.
+Members that are stored uncompressed are read directly from the zip file at the offset of
+their data, rather than going through the zipfile decompression and CRC machinery.
+
+Byte ranges of stored members are read by seeking directly to the start of the range.
+Byte ranges of deflated members are read by decompressing from the nearest checkpoint of
+the decompressor state before the start of the range. Checkpoints are recorded at intervals
+as members are decompressed, and are cached along with the index of the zip file, so that
+seeking within deflated media does not require decompressing the member from the start.
+"""
+import io
+import logging
+import os
+import struct
+import sys
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# The approximate maximum memory, in bytes, to use for cached zip file indexes
+ZIP_INDEX_CACHE_MAX_SIZE = 32 * 1024 * 1024
+
+# The maximum number of zip file indexes to cache
+ZIP_INDEX_CACHE_MAX_ENTRIES = 256
+
+# Local file header signature, and the offset and format of the filename and extra field
+# lengths within the local file header, from the zip file specification
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_FILE_HEADER_SIZE = 30
+LOCAL_FILE_HEADER_LENGTHS = struct.Struct("<HH")
+LOCAL_FILE_HEADER_LENGTHS_OFFSET = 26
+
+# The size of chunks of compressed data read, and of decompressed data produced at once
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+# The maximum number of decompressor checkpoints to record for each deflated member,
+# and the minimum number of decompressed bytes between them
+MAX_DECOMPRESS_CHECKPOINTS = 64
+MIN_DECOMPRESS_CHECKPOINT_INTERVAL = 1024 * 1024
+
+# The approximate memory used by a checkpoint, which is dominated by the 32KB
+# window of the copied zlib decompressor
+DECOMPRESS_CHECKPOINT_SIZE = 48 * 1024
+
+RANGE_COMPRESS_TYPES = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+
+class StoredMemberFile(io.RawIOBase):
+    """
+    A read only file-like object over the bytes of an uncompressed zip file member,
+    reading directly from the underlying zip file.
+    """
+
+    def __init__(self, fileobj, size):
+        self._fileobj = fileobj
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fileobj.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._fileobj.close()
+        super(StoredMemberFile, self).close()
+
+
+class DeflatedMemberFile(io.RawIOBase):
+    """
+    A read only file-like object over a range of the decompressed bytes of a deflated
+    zip file member, reading from the underlying zip file.
+
+    Checkpoints of the decompressor state are recorded in the checkpoints dict, keyed
+    by the decompressed offset they were taken at, and used to resume decompression
+    as close as possible before the start of the range.
+    """
+
+    def __init__(self, fileobj, data_offset, info, checkpoints, start, length):
+        self._fileobj = fileobj
+        self._compress_size = info.compress_size
+        self._checkpoints = checkpoints
+        self._interval = max(
+            MIN_DECOMPRESS_CHECKPOINT_INTERVAL,
+            info.file_size // MAX_DECOMPRESS_CHECKPOINTS + 1,
+        )
+        resume_positions = [pos for pos in list(checkpoints) if pos <= start]
+        if resume_positions:
+            self._pos = max(resume_positions)
+            self._read_pos, decompressor = checkpoints[self._pos]
+            self._decompressor = decompressor.copy()
+        else:
+            self._pos = 0
+            self._read_pos = 0
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._fileobj.seek(data_offset + self._read_pos)
+        self._input = b""
+        self._skip(start - self._pos)
+        self._remaining = length
+
+    def _checkpoint(self):
+        if (
+            self._pos // self._interval
+            and self._pos not in self._checkpoints
+            and len(self._checkpoints) < MAX_DECOMPRESS_CHECKPOINTS
+            and not any(
+                pos // self._interval == self._pos // self._interval
+                for pos in list(self._checkpoints)
+            )
+        ):
+            # the compressed offset of the checkpoint excludes any input
+            # that has been read but not yet consumed by the decompressor
+            self._checkpoints[self._pos] = (
+                self._read_pos - len(self._input),
+                self._decompressor.copy(),
+            )
+
+    def _decompress(self, size):
+        while True:
+            if not self._input and self._read_pos < self._compress_size:
+                self._input = self._fileobj.read(
+                    min(DECOMPRESS_CHUNK_SIZE, self._compress_size - self._read_pos)
+                )
+                if not self._input:
+                    raise zipfile.BadZipfile("Truncated deflated zip file member")
+                self._read_pos += len(self._input)
+            data = self._decompressor.decompress(self._input, size)
+            self._input = self._decompressor.unconsumed_tail
+            if data or (not self._input and self._read_pos >= self._compress_size):
+                self._pos += len(data)
+                self._checkpoint()
+                return data
+
+    def _skip(self, size):
+        while size > 0:
+            data = self._decompress(min(size, DECOMPRESS_CHUNK_SIZE))
+            if not data:
+                break
+            size -= len(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        if not size:
+            return b""
+        data = self._decompress(size)
+        self._remaining -= len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._fileobj.close()
+        super(DeflatedMemberFile, self).close()
+
+
+class ZipIndex(object):
+    """
+    The parsed central directory of a zip file, providing the subset of the
+    zipfile.ZipFile interface used for serving zip file content.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        self.stat_key = (stat.st_size, stat.st_mtime)
+        with zipfile.ZipFile(path) as zf:
+            self._infolist = zf.infolist()
+        self._infos = {info.filename: info for info in self._infolist}
+        # offsets of member data, read lazily from local file headers
+        self._data_offsets = {}
+        # decompressor checkpoints of deflated members that byte ranges have been read from
+        self._checkpoints = {}
+        self._base_size = sum(
+            sys.getsizeof(info)
+            + len(info.filename)
+            + len(info.extra)
+            + len(info.comment)
+            for info in self._infolist
+        )
+
+    @property
+    def size(self):
+        """
+        The approximate memory used by the index, including decompressor checkpoints.
+        """
+        return self._base_size + DECOMPRESS_CHECKPOINT_SIZE * sum(
+            len(checkpoints) for checkpoints in list(self._checkpoints.values())
+        )
+
+    def __len__(self):
+        return len(self._infolist)
+
+    def namelist(self):
+        return [info.filename for info in self._infolist]
+
+    def infolist(self):
+        return list(self._infolist)
+
+    def getinfo(self, name):
+        """
+        Return the ZipInfo for the named member, raising KeyError if there is no such member.
+        """
+        return self._infos[name]
+
+    def _get_data_offset(self, fileobj, info):
+        offset = self._data_offsets.get(info.filename)
+        if offset is None:
+            fileobj.seek(info.header_offset)
+            header = fileobj.read(LOCAL_FILE_HEADER_SIZE)
+            if (
+                len(header) != LOCAL_FILE_HEADER_SIZE
+                or header[:4] != LOCAL_FILE_HEADER_SIGNATURE
+            ):
+                raise zipfile.BadZipfile(
+                    "Bad local file header for {} in {}".format(
+                        info.filename, self.path
+                    )
+                )
+            filename_length, extra_length = LOCAL_FILE_HEADER_LENGTHS.unpack_from(
+                header, LOCAL_FILE_HEADER_LENGTHS_OFFSET
+            )
+            offset = (
+                info.header_offset
+                + LOCAL_FILE_HEADER_SIZE
+                + filename_length
+                + extra_length
+            )
+            self._data_offsets[info.filename] = offset
+        return offset
+
+    def _open_file(self, info):
+        if info.flag_bits & 0x1:
+            raise RuntimeError(
+                "File {} is encrypted, password required for extraction".format(
+                    info.filename
+                )
+            )
+        return io.open(self.path, "rb")
+
+    def supports_range(self, info):
+        """
+        Whether byte ranges of the member can be opened with open_range.
+        """
+        return info.compress_type in RANGE_COMPRESS_TYPES and not info.flag_bits & 0x1
+
+    def open(self, name, mode="r"):
+        """
+        Open a member of the zip file, by name or ZipInfo, for reading.
+        """
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        fileobj = self._open_file(info)
+        try:
+            fileobj.seek(self._get_data_offset(fileobj, info))
+            if info.compress_type == zipfile.ZIP_STORED:
+                return StoredMemberFile(fileobj, info.file_size)
+            return zipfile.ZipExtFile(fileobj, "r", info, None, close_fileobj=True)
+        except Exception:
+            fileobj.close()
+            raise
+
+    def open_range(self, name, start, length):
+        """
+        Open length bytes of a member of the zip file, by name or ZipInfo, for reading,
+        starting at the start byte of the decompressed member.
+        """
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        if not self.supports_range(info):
+            raise NotImplementedError(
+                "Byte ranges of {} cannot be read".format(info.filename)
+            )
+        fileobj = self._open_file(info)
+        try:
+            data_offset = self._get_data_offset(fileobj, info)
+            if info.compress_type == zipfile.ZIP_STORED:
+                fileobj.seek(data_offset + start)
+                return StoredMemberFile(fileobj, length)
+            checkpoints = self._checkpoints.setdefault(info.filename, {})
+            return DeflatedMemberFile(
+                fileobj, data_offset, info, checkpoints, start, length
+            )
+        except Exception:
+            fileobj.close()
+            raise
+
+
+class ZipIndexCache(object):
+    """
+    A thread safe least recently used cache of ZipIndex objects, bounded both by
+    the number of zip files and by the approximate memory used by their indexes.
+    """
+
+    def __init__(
+        self, max_size=ZIP_INDEX_CACHE_MAX_SIZE, max_entries=ZIP_INDEX_CACHE_MAX_ENTRIES
+    ):
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def size(self):
+        """
+        The approximate memory used by all the cached indexes.
+        """
+        return sum(index.size for index in list(self._indexes.values()))
+
+    def get(self, path):
+        """
+        Return the ZipIndex for the zip file at path, parsing and caching it if it is
+        not cached, or if the file has changed since it was cached.
+        """
+        stat = os.stat(path)
+        stat_key = (stat.st_size, stat.st_mtime)
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is not None:
+                if index.stat_key == stat_key:
+                    # mark as most recently used
+                    self._indexes[path] = self._indexes.pop(path)
+                    self.hits += 1
+                    return index
+                del self._indexes[path]
+            self.misses += 1
+        # parse outside of the lock, so that other zip files can be served meanwhile
+        index = ZipIndex(path)
+        with self._lock:
+            if path in self._indexes:
+                del self._indexes[path]
+            self._indexes[path] = index
+            size = self.size
+            while len(self._indexes) > 1 and (
+                size > self.max_size or len(self._indexes) > self.max_entries
+            ):
+                evicted_path = next(iter(self._indexes))
+                size -= self._indexes.pop(evicted_path).size
+                self.evictions += 1
+                logger.debug("Evicted zip index for {}".format(evicted_path))
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self):
+        """
+        Return a dict describing the current usage of the cache.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._indexes),
+                "members": sum(len(index) for index in self._indexes.values()),
+                "size": self.size,
+                "max_size": self.max_size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+zip_index_cache = ZipIndexCache()
+
+
+def get_zip_index(path):
+    return zip_index_cache.get(path)
@@ -8,7 +8,7 @@ import json
 import logging
 import mimetypes
 import os
-import zipfile
+import re
 from collections import OrderedDict
 from xml.etree.ElementTree import SubElement
 
@@ -23,6 +23,7 @@ from django.http.response import HttpResponseNotModified
 from django.template import loader
 from django.templatetags.static import static
 from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.views.decorators.http import etag
 from django.views.generic.base import View
@@ -30,7 +31,9 @@ from django.views.generic.base import View
 from .api import cache_forever
 from .decorators import add_security_headers
 from .models import ContentNode
+from .utils.hashi_cache import get_rendered_content
 from .utils.paths import get_content_storage_file_path
+from .utils.zip_index import get_zip_index
 from kolibri import __version__ as kolibri_version
 from kolibri.core.content.errors import InvalidStorageFilenameError
 from kolibri.core.content.hooks import ContentNodeDisplayHook
@@ -62,6 +65,15 @@ def calculate_zip_content_etag(request, *args, **kwargs):
     ).hexdigest()
 
 
+def get_hashi_cache_version_key():
+    # The rendered HTML embeds the URL of the hashi script, so the cache key for it
+    # has to change whenever that does, as well as when the Kolibri version changes.
+    return hashlib.md5(
+        kolibri_version.encode("utf-8")
+        + static("content/{}".format(get_hashi_filename())).encode("utf-8")
+    ).hexdigest()
+
+
 def get_path_or_404(zipped_filename):
     try:
         # calculate the local file path to the zip file
@@ -179,45 +191,54 @@ def parse_html(content):
         return content
 
 
-def get_h5p(zf, embedded_filepath):
+def render_h5p_bootloader(zf):
+    """
+    Get the h5p bootloader, and then run it through our hashi templating code.
+    """
+    try:
+        h5pdata = load_json_from_zipfile(zf, "h5p.json")
+        contentdata = load_json_from_zipfile(zf, "content/content.json")
+    except KeyError:
+        raise Http404("No valid h5p file was found at this location")
+    jsfiles, cssfiles = recursive_h5p_dependencies(zf, h5pdata)
+    jsfiles = jsfiles.keys()
+    cssfiles = cssfiles.keys()
+    path_includes_version = (
+        "true" if "-" in [name for name in zf.namelist() if "/" in name][0] else "false"
+    )
+    template = loader.get_template("content/h5p.html")
+    main_library_data = [
+        lib
+        for lib in h5pdata["preloadedDependencies"]
+        if lib["machineName"] == h5pdata["mainLibrary"]
+    ][0]
+    bootstrap_content = template.render(
+        {
+            "jsfiles": jsfiles,
+            "cssfiles": cssfiles,
+            "content": json.dumps(
+                json.dumps(contentdata, separators=(",", ":"), ensure_ascii=False)
+            ),
+            "library": "{machineName} {majorVersion}.{minorVersion}".format(
+                **main_library_data
+            ),
+            "path_includes_version": path_includes_version,
+        },
+        None,
+    )
+    return parse_html(bootstrap_content)
+
+
+def get_h5p(zf, zipped_filename, embedded_filepath):
     file_size = 0
     if not embedded_filepath:
-        # Get the h5p bootloader, and then run it through our hashi templating code.
         # return the H5P bootloader code
-        try:
-            h5pdata = load_json_from_zipfile(zf, "h5p.json")
-            contentdata = load_json_from_zipfile(zf, "content/content.json")
-        except KeyError:
-            raise Http404("No valid h5p file was found at this location")
-        jsfiles, cssfiles = recursive_h5p_dependencies(zf, h5pdata)
-        jsfiles = jsfiles.keys()
-        cssfiles = cssfiles.keys()
-        path_includes_version = (
-            "true"
-            if "-" in [name for name in zf.namelist() if "/" in name][0]
-            else "false"
-        )
-        template = loader.get_template("content/h5p.html")
-        main_library_data = [
-            lib
-            for lib in h5pdata["preloadedDependencies"]
-            if lib["machineName"] == h5pdata["mainLibrary"]
-        ][0]
-        bootstrap_content = template.render(
-            {
-                "jsfiles": jsfiles,
-                "cssfiles": cssfiles,
-                "content": json.dumps(
-                    json.dumps(contentdata, separators=(",", ":"), ensure_ascii=False)
-                ),
-                "library": "{machineName} {majorVersion}.{minorVersion}".format(
-                    **main_library_data
-                ),
-                "path_includes_version": path_includes_version,
-            },
-            None,
+        content = get_rendered_content(
+            get_hashi_cache_version_key(),
+            zipped_filename,
+            embedded_filepath,
+            lambda: render_h5p_bootloader(zf),
         )
-        content = parse_html(bootstrap_content)
         content_type = "text/html"
         response = HttpResponse(content, content_type=content_type)
         file_size = len(response.content)
@@ -237,6 +258,61 @@ def get_h5p(zf, embedded_filepath):
     return response
 
 
+byte_range_re = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_byte_range(request, file_size):
+    """
+    Parse a single byte range from the Range header of the request, returning a tuple of the
+    inclusive start and end byte positions, or None if the whole file should be returned.
+    Requests for multiple byte ranges are not supported, and return the whole file.
+    """
+    match = byte_range_re.match(request.META.get("HTTP_RANGE", "").strip())
+    if not match:
+        return None
+    # only return a range of the file if the client's copy is still current
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range and if_range.strip() != quote_etag(calculate_zip_content_etag(request)):
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # a suffix range, for the last bytes of the file
+        return max(file_size - int(end), 0), file_size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    end = min(int(end), file_size - 1) if end else file_size - 1
+    return start, end
+
+
+def get_streaming_response(request, zf, info, content_type):
+    """
+    Generate a streaming response object, pulling data from within the zip file,
+    for the whole of the embedded file or for the byte range requested.
+    """
+    file_size = info.file_size
+    byte_range = get_byte_range(request, file_size) if zf.supports_range(info) else None
+    if byte_range is None:
+        response = FileResponse(zf.open(info), content_type=content_type)
+    elif byte_range[0] >= file_size:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */{}".format(file_size)
+        file_size = 0
+    else:
+        start, end = byte_range
+        file_size = end - start + 1
+        response = FileResponse(
+            zf.open_range(info, start, file_size),
+            content_type=content_type,
+            status=206,
+        )
+        response["Content-Range"] = "bytes {}-{}/{}".format(start, end, info.file_size)
+    response["Accept-Ranges"] = "bytes" if zf.supports_range(info) else "none"
+    return response, file_size
+
+
 def get_embedded_file(
     request, zf, zipped_filename, embedded_filepath, skip_hashi=False
 ):
@@ -266,14 +342,18 @@ def get_embedded_file(
         and (embedded_filepath.endswith("htm") or embedded_filepath.endswith("html"))
         and not skip_hashi
     ):
-        content = zf.open(info).read()
-        html = parse_html(content)
+
+        def render():
+            with zf.open(info) as f:
+                return parse_html(f.read())
+
+        html = get_rendered_content(
+            get_hashi_cache_version_key(), zipped_filename, embedded_filepath, render
+        )
         response = HttpResponse(html, content_type=content_type)
         file_size = len(response.content)
     else:
-        # generate a streaming response object, pulling data from within the zip file
-        response = FileResponse(zf.open(info), content_type=content_type)
-        file_size = info.file_size
+        response, file_size = get_streaming_response(request, zf, info, content_type)
 
     # set the content-length header to the size of the embedded file
     if file_size:
@@ -321,24 +401,25 @@ class ZipContentView(View):
         if request.META.get("HTTP_IF_MODIFIED_SINCE"):
             return HttpResponseNotModified()
 
-        with zipfile.ZipFile(zipped_path) as zf:
-
-            # handle H5P files
-            if zipped_path.endswith("h5p"):
-                if not embedded_filepath or embedded_filepath.startswith("dist/"):
-                    response = get_h5p(zf, embedded_filepath)
-                else:
-                    # Don't bother doing any hashi parsing of HTML content for h5p
-                    response = get_embedded_file(
-                        request, zf, zipped_filename, embedded_filepath, skip_hashi=True
-                    )
+        zf = get_zip_index(zipped_path)
+
+        # handle H5P files
+        if zipped_path.endswith("h5p"):
+            if not embedded_filepath or embedded_filepath.startswith("dist/"):
+                response = get_h5p(zf, zipped_filename, embedded_filepath)
             else:
+                # Don't bother doing any hashi parsing of HTML content for h5p
                 response = get_embedded_file(
-                    request, zf, zipped_filename, embedded_filepath
+                    request, zf, zipped_filename, embedded_filepath, skip_hashi=True
                 )
+        else:
+            response = get_embedded_file(
+                request, zf, zipped_filename, embedded_filepath
+            )
 
-        # ensure the browser knows not to try byte-range requests, as we don't support them here
-        response["Accept-Ranges"] = "none"
+        # byte-range requests are only supported for files streamed from within the zip file,
+        # ensure the browser knows not to try them for any other responses
+        response.setdefault("Accept-Ranges", "none")
 
         return response
 
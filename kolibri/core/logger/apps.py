@@ -11,4 +11,5 @@ class KolibriLoggerConfig(AppConfig):
     verbose_name = "Kolibri Logger"
 
     def ready(self):
-        pass
+        from .signals import update_content_popularity_on_save  # noqa: F401
+        from .signals import update_resumable_content_on_save  # noqa: F401
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 05:36
+from __future__ import unicode_literals
+
+import morango.models.fields.uuids
+from django.db import migrations
+from django.db import models
+from django.db.models import Count
+
+
+def populate_content_popularity(apps, schema_editor):
+    ContentPopularity = apps.get_model("logger", "ContentPopularity")
+    ContentSessionLog = apps.get_model("logger", "ContentSessionLog")
+    counts = (
+        ContentSessionLog.objects.order_by()
+        .values_list("content_id")
+        .annotate(count=Count("content_id"))
+    )
+    ContentPopularity.objects.bulk_create(
+        [
+            ContentPopularity(content_id=content_id, count=count)
+            for content_id, count in counts.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logger", "0007_contentsessionlog_visitor_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentPopularity",
+            fields=[
+                (
+                    "content_id",
+                    morango.models.fields.uuids.UUIDField(
+                        primary_key=True, serialize=False
+                    ),
+                ),
+                ("count", models.IntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_content_popularity, migrations.RunPython.noop),
+    ]
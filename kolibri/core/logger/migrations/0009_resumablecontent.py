@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 05:39
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import morango.models.fields.uuids
+from django.conf import settings
+from django.db import migrations
+from django.db import models
+
+import kolibri.core.fields
+
+# Kept in sync with kolibri.core.logger.utils.resume.MAX_RESUMABLE_CONTENT
+MAX_RESUMABLE_CONTENT = 50
+
+
+def populate_resumable_content(apps, schema_editor):
+    ContentSummaryLog = apps.get_model("logger", "ContentSummaryLog")
+    ResumableContent = apps.get_model("logger", "ResumableContent")
+    user_counts = {}
+    seen = set()
+    resumable_content = []
+    logs = (
+        ContentSummaryLog.objects.filter(progress__lt=1)
+        .order_by("user_id", "-end_timestamp")
+        .values_list("user_id", "content_id", "end_timestamp", "start_timestamp")
+    )
+    for user_id, content_id, end_timestamp, start_timestamp in logs.iterator():
+        if (
+            user_counts.get(user_id, 0) >= MAX_RESUMABLE_CONTENT
+            or (user_id, content_id) in seen
+        ):
+            continue
+        user_counts[user_id] = user_counts.get(user_id, 0) + 1
+        seen.add((user_id, content_id))
+        resumable_content.append(
+            ResumableContent(
+                user_id=user_id,
+                content_id=content_id,
+                last_engaged=end_timestamp or start_timestamp,
+            )
+        )
+    ResumableContent.objects.bulk_create(resumable_content, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("logger", "0008_contentpopularity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResumableContent",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_id", morango.models.fields.uuids.UUIDField()),
+                ("last_engaged", kolibri.core.fields.DateTimeTzField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name="resumablecontent",
+            unique_together=set([("user", "content_id")]),
+        ),
+        migrations.AlterIndexTogether(
+            name="resumablecontent",
+            index_together=set([("user", "last_engaged")]),
+        ),
+        migrations.RunPython(populate_resumable_content, migrations.RunPython.noop),
+    ]
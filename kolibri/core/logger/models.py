@@ -328,3 +328,32 @@ class ExamAttemptLog(BaseAttemptLog):
 
     def calculate_partition(self):
         return self.dataset_id
+
+
+class ContentPopularity(models.Model):
+    """
+    This model stores the number of session logs for each content item, maintained
+    incrementally as session logs are created, and periodically recalculated from
+    the session logs, so that the most popular content can be read with an indexed query.
+    It is derived data local to this device and is not synced.
+    """
+
+    content_id = UUIDField(primary_key=True)
+    count = models.IntegerField(default=0, db_index=True)
+
+
+class ResumableContent(models.Model):
+    """
+    This model stores the content that each user has most recently engaged with but
+    not yet finished, maintained from their content summary logs as they are saved,
+    and bounded to a small number of entries per user so that it can be cheaply read
+    to recommend content to resume. It is derived data local to this device and is not synced.
+    """
+
+    user = models.ForeignKey(FacilityUser, on_delete=models.CASCADE)
+    content_id = UUIDField()
+    last_engaged = DateTimeTzField()
+
+    class Meta:
+        unique_together = ("user", "content_id")
+        index_together = ("user", "last_engaged")
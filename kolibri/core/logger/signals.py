@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import ContentSessionLog
+from .models import ContentSummaryLog
+from .utils.popularity import increment_content_popularity
+from .utils.resume import update_resumable_content
+
+
+@receiver(post_save, sender=ContentSessionLog)
+def update_content_popularity_on_save(sender, instance=None, created=False, **kwargs):
+    """
+    Count every newly created session log towards the popularity of its content.
+    """
+    if created:
+        increment_content_popularity(instance.content_id)
+
+
+@receiver(post_save, sender=ContentSummaryLog)
+def update_resumable_content_on_save(sender, instance=None, **kwargs):
+    """
+    Keep the resumable content of the user up to date with their summary logs.
+    """
+    update_resumable_content(instance)
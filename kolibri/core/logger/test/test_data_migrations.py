@@ -0,0 +1,41 @@
+import uuid
+
+from django.utils import timezone
+
+from kolibri.core.auth.models import Facility
+from kolibri.core.auth.test.helpers import provision_device
+from kolibri.core.auth.test.migrationtestcase import TestMigrations
+
+
+class ContentPopularityBackfillTestCase(TestMigrations):
+
+    migrate_from = "0007_contentsessionlog_visitor_id"
+    migrate_to = "0008_contentpopularity"
+    app = "logger"
+
+    def setUp(self):
+        provision_device()
+        self.facility = Facility.objects.create(name="facility")
+        self.content_ids = [uuid.uuid4().hex, uuid.uuid4().hex]
+        super(ContentPopularityBackfillTestCase, self).setUp()
+
+    def setUpBeforeMigration(self, apps):
+        ContentSessionLog = apps.get_model("logger", "ContentSessionLog")
+        for content_id in [self.content_ids[0]] * 2 + [self.content_ids[1]]:
+            ContentSessionLog.objects.create(
+                id=uuid.uuid4().hex,
+                channel_id=uuid.uuid4().hex,
+                content_id=content_id,
+                start_timestamp=timezone.now(),
+                kind="video",
+                dataset_id=self.facility.dataset_id,
+            )
+
+    def test_popularity_populated(self):
+        ContentPopularity = self.apps.get_model("logger", "ContentPopularity")
+        self.assertEqual(
+            ContentPopularity.objects.get(content_id=self.content_ids[0]).count, 2
+        )
+        self.assertEqual(
+            ContentPopularity.objects.get(content_id=self.content_ids[1]).count, 1
+        )
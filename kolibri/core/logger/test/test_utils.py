@@ -2,9 +2,26 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import uuid
+from datetime import timedelta
+
+import mock
 from django.test import TestCase
+from django.utils import timezone
 
+from ..models import ContentPopularity
+from ..models import ContentSessionLog
+from ..models import ContentSummaryLog
+from ..models import ResumableContent
 from ..utils.data import bytes_for_humans
+from ..utils.popularity import POPULARITY_UPDATE_INTERVAL
+from ..utils.popularity import schedule_content_popularity_update
+from ..utils.popularity import update_content_popularity
+from ..utils.resume import MAX_RESUMABLE_CONTENT
+from kolibri.core.auth.models import Facility
+from kolibri.core.auth.models import FacilityUser
+from kolibri.core.auth.test.helpers import provision_device
+from kolibri.utils.time_utils import local_now
 
 
 class BytesForHumans(TestCase):
@@ -27,3 +44,123 @@ class BytesForHumans(TestCase):
         self.assertEqual(
             "611.77PB", bytes_for_humans(611.77 * 1024 * 1024 * 1024 * 1024 * 1024)
         )
+
+
+class ContentPopularityTestCase(TestCase):
+    def setUp(self):
+        provision_device()
+        Facility.objects.create(name="facility")
+        self.channel_id = uuid.uuid4().hex
+        self.content_ids = [uuid.uuid4().hex, uuid.uuid4().hex]
+
+    def _create_session_log(self, content_id):
+        return ContentSessionLog.objects.create(
+            channel_id=self.channel_id,
+            content_id=content_id,
+            start_timestamp=timezone.now(),
+            kind="video",
+        )
+
+    def test_session_log_create_increments_popularity(self):
+        for _ in range(3):
+            self._create_session_log(self.content_ids[0])
+        self._create_session_log(self.content_ids[1])
+        self.assertEqual(
+            ContentPopularity.objects.get(content_id=self.content_ids[0]).count, 3
+        )
+        self.assertEqual(
+            ContentPopularity.objects.get(content_id=self.content_ids[1]).count, 1
+        )
+
+    def test_session_log_update_does_not_increment_popularity(self):
+        log = self._create_session_log(self.content_ids[0])
+        log.progress = 1
+        log.save()
+        self.assertEqual(
+            ContentPopularity.objects.get(content_id=self.content_ids[0]).count, 1
+        )
+
+    def test_update_content_popularity(self):
+        for _ in range(2):
+            self._create_session_log(self.content_ids[0])
+        self._create_session_log(self.content_ids[1])
+        ContentSessionLog.objects.filter(content_id=self.content_ids[1]).delete()
+        ContentPopularity.objects.filter(content_id=self.content_ids[0]).update(
+            count=10
+        )
+        update_content_popularity()
+        self.assertEqual(
+            ContentPopularity.objects.get(content_id=self.content_ids[0]).count, 2
+        )
+        self.assertFalse(
+            ContentPopularity.objects.filter(content_id=self.content_ids[1]).exists()
+        )
+
+    @mock.patch("kolibri.core.logger.utils.popularity.scheduler")
+    def test_schedule_content_popularity_update_daily(self, scheduler_mock):
+        schedule_content_popularity_update()
+        scheduled_time = scheduler_mock.schedule.call_args[0][0]
+        self.assertEqual((scheduled_time.hour, scheduled_time.minute), (3, 15))
+        self.assertGreater(scheduled_time, local_now())
+        self.assertLessEqual(scheduled_time, local_now() + timedelta(days=1))
+        scheduler_mock.schedule.assert_called_once_with(
+            scheduled_time,
+            update_content_popularity,
+            repeat=None,
+            interval=POPULARITY_UPDATE_INTERVAL,
+        )
+
+
+class ResumableContentTestCase(TestCase):
+    def setUp(self):
+        provision_device()
+        self.facility = Facility.objects.create(name="facility")
+        self.user = FacilityUser.objects.create(username="user", facility=self.facility)
+        self.channel_id = uuid.uuid4().hex
+
+    def _create_summary_log(self, content_id, progress=0.5, end_timestamp=None):
+        now = timezone.now()
+        return ContentSummaryLog.objects.create(
+            user=self.user,
+            channel_id=self.channel_id,
+            content_id=content_id,
+            start_timestamp=now,
+            end_timestamp=end_timestamp or now,
+            progress=progress,
+            kind="video",
+        )
+
+    def test_summary_log_save_adds_resumable_content(self):
+        log = self._create_summary_log(uuid.uuid4().hex)
+        resumable = ResumableContent.objects.get(user=self.user)
+        self.assertEqual(resumable.content_id, log.content_id)
+        self.assertEqual(resumable.last_engaged, log.end_timestamp)
+
+    def test_summary_log_update_updates_last_engaged(self):
+        log = self._create_summary_log(uuid.uuid4().hex)
+        log.end_timestamp = log.end_timestamp + timedelta(minutes=5)
+        log.save()
+        resumable = ResumableContent.objects.get(user=self.user)
+        self.assertEqual(resumable.last_engaged, log.end_timestamp)
+
+    def test_summary_log_finished_removes_resumable_content(self):
+        log = self._create_summary_log(uuid.uuid4().hex)
+        log.progress = 1
+        log.save()
+        self.assertFalse(ResumableContent.objects.filter(user=self.user).exists())
+
+    def test_resumable_content_bounded(self):
+        start = timezone.now()
+        content_ids = [uuid.uuid4().hex for _ in range(MAX_RESUMABLE_CONTENT + 5)]
+        for i, content_id in enumerate(content_ids):
+            self._create_summary_log(
+                content_id, end_timestamp=start + timedelta(seconds=i)
+            )
+        self.assertEqual(
+            set(
+                ResumableContent.objects.filter(user=self.user).values_list(
+                    "content_id", flat=True
+                )
+            ),
+            set(content_ids[5:]),
+        )
@@ -0,0 +1,71 @@
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+
+from kolibri.core.logger.models import ContentPopularity
+from kolibri.core.logger.models import ContentSessionLog
+from kolibri.core.tasks.main import scheduler
+from kolibri.utils.time_utils import local_now
+
+logger = logging.getLogger(__name__)
+
+# Recalculate popularity from the session logs once a day, to account for
+# session logs that have been synced or deleted rather than created locally
+POPULARITY_UPDATE_INTERVAL = 24 * 60 * 60
+
+BATCH_SIZE = 1000
+
+
+def increment_content_popularity(content_id):
+    updated = ContentPopularity.objects.filter(content_id=content_id).update(
+        count=F("count") + 1
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                ContentPopularity.objects.create(content_id=content_id, count=1)
+        except IntegrityError:
+            # Created concurrently since we checked, so just increment it
+            ContentPopularity.objects.filter(content_id=content_id).update(
+                count=F("count") + 1
+            )
+
+
+def update_content_popularity():
+    """
+    Recalculate the popularity of all content from the session logs.
+    """
+    logger.info("Updating content popularity from session logs")
+    counts = (
+        ContentSessionLog.objects.order_by()
+        .values_list("content_id")
+        .annotate(count=Count("content_id"))
+    )
+    with transaction.atomic():
+        ContentPopularity.objects.all().delete()
+        ContentPopularity.objects.bulk_create(
+            [
+                ContentPopularity(content_id=content_id, count=count)
+                for content_id, count in counts
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def schedule_content_popularity_update():
+    current_dt = local_now()
+    update_time = current_dt.replace(hour=3, minute=15, second=0, microsecond=0)
+    if update_time < current_dt:
+        # If it is past 3:15AM, change the day to tomorrow.
+        update_time = update_time + timedelta(days=1)
+    # Repeat indefinitely
+    scheduler.schedule(
+        update_time,
+        update_content_popularity,
+        repeat=None,
+        interval=POPULARITY_UPDATE_INTERVAL,
+    )
@@ -0,0 +1,35 @@
+from django.db import transaction
+
+from kolibri.core.logger.models import ResumableContent
+
+# The maximum number of unfinished content items to keep for each user,
+# this is larger than the number of items recommended to leave room for
+# content that has since been removed from the device.
+MAX_RESUMABLE_CONTENT = 50
+
+
+def update_resumable_content(summarylog):
+    """
+    Add or remove the content of a summary log from the resumable content of its user,
+    according to whether it has been finished.
+    """
+    with transaction.atomic():
+        if summarylog.progress >= 1:
+            ResumableContent.objects.filter(
+                user_id=summarylog.user_id, content_id=summarylog.content_id
+            ).delete()
+            return
+        ResumableContent.objects.update_or_create(
+            user_id=summarylog.user_id,
+            content_id=summarylog.content_id,
+            defaults={
+                "last_engaged": summarylog.end_timestamp or summarylog.start_timestamp
+            },
+        )
+        stale_ids = (
+            ResumableContent.objects.filter(user_id=summarylog.user_id)
+            .order_by("-last_engaged")
+            .values_list("id", flat=True)[MAX_RESUMABLE_CONTENT:]
+        )
+        if stale_ids:
+            ResumableContent.objects.filter(id__in=list(stale_ids)).delete()
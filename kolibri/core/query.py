@@ -8,9 +8,12 @@ try:
     from django.contrib.postgres.aggregates import ArrayAgg
 
     class NotNullArrayAgg(ArrayAgg):
+        template = "%(function)s(%(distinct)s%(expressions)s)"
+
         def __init__(self, *args, **kwargs):
             self.result_field = kwargs.pop("result_field", None)
-            super(NotNullArrayAgg, self).__init__(*args, **kwargs)
+            distinct = "DISTINCT " if kwargs.pop("distinct", False) else ""
+            super(NotNullArrayAgg, self).__init__(*args, distinct=distinct, **kwargs)
 
         def convert_value(self, value, expression, connection, context):
             if not value:
@@ -49,12 +52,13 @@ class GroupConcatSubquery(Subquery):
 
 
 class GroupConcat(Aggregate):
-    template = "GROUP_CONCAT(%(field)s)"
+    template = "GROUP_CONCAT(%(distinct)s%(field)s)"
     output_field = CharField()
 
     def __init__(self, *args, **kwargs):
         self.result_field = kwargs.pop("result_field", None)
-        super(GroupConcat, self).__init__(*args, **kwargs)
+        distinct = "DISTINCT " if kwargs.pop("distinct", False) else ""
+        super(GroupConcat, self).__init__(*args, distinct=distinct, **kwargs)
 
     def convert_value(self, value, expression, connection, context):
         if not value:
@@ -96,3 +100,17 @@ def annotate_array_aggregate(queryset, **kwargs):
             for target, source in kwargs.items()
         }
     )
+
+
+def distinct_array_aggregate(model, source):
+    """
+    Return an aggregate expression that collects the distinct values of the source
+    field into a list, suitable for use in an annotate or aggregate call.
+    """
+    if connection.vendor == "postgresql" and NotNullArrayAgg is not None:
+        aggregate_class = NotNullArrayAgg
+    else:
+        aggregate_class = GroupConcat
+    return aggregate_class(
+        source, distinct=True, result_field=get_source_field(model, source)
+    )
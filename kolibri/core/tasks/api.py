@@ -1,7 +1,10 @@
+import hashlib
 import logging
 import ntpath
 import os
 import shutil
+import threading
+import time
 from functools import partial
 from tempfile import NamedTemporaryFile
 
@@ -13,6 +16,8 @@ from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.http.response import Http404
 from django.http.response import HttpResponseBadRequest
+from django.utils.http import parse_etags
+from django.utils.http import quote_etag
 from django.utils.translation import get_language_from_request
 from django.utils.translation import gettext_lazy as _
 from morango.models import ScopeDefinition
@@ -55,10 +60,14 @@ from kolibri.core.discovery.utils.network.errors import URLParseError
 from kolibri.core.logger.csv_export import CSV_EXPORT_FILENAMES
 from kolibri.core.tasks.exceptions import JobNotFound
 from kolibri.core.tasks.exceptions import UserCancelledError
+from kolibri.core.tasks.job import Priority
+from kolibri.core.tasks.job import Resource
 from kolibri.core.tasks.job import State
 from kolibri.core.tasks.main import facility_queue
 from kolibri.core.tasks.main import priority_queue
 from kolibri.core.tasks.main import queue
+from kolibri.core.tasks.notifications import add_listener
+from kolibri.core.tasks.notifications import remove_listener
 from kolibri.core.tasks.utils import get_current_job
 from kolibri.utils import conf
 
@@ -80,6 +89,20 @@ DISK_IO_ERROR_STRING = _("There was a disk access error.")
 
 CATCHALL_SERVER_ERROR_STRING = _("There was an unknown error.")
 
+# The longest time in seconds that a request for task changes can wait for a change,
+# each waiting request occupies a server thread, so this should be kept short.
+MAX_CHANGES_WAIT = 30
+
+# The most requests for task changes that can wait for a change at once, any further
+# requests respond straight away, so that they cannot occupy every server thread.
+MAX_CHANGES_WAITERS = 10
+
+# How often in seconds a waiting request for task changes checks the progress of running
+# tasks, the other changes to tasks wake waiting requests when they happen.
+CHANGES_PROGRESS_INTERVAL = 1
+
+_changes_waiters = threading.BoundedSemaphore(MAX_CHANGES_WAITERS)
+
 
 def get_channel_name(channel_id, require_channel=False):
     try:
@@ -188,7 +211,7 @@ class BaseViewSet(viewsets.ViewSet):
 
     def default_permission_classes(self):
         # task permissions shared between facility management and device management
-        if self.action in ["list", "deletefinishedtasks"]:
+        if self.action in ["list", "changes", "deletefinishedtasks"]:
             return [CanManageContent | CanExportLogs]
         elif self.action == "startexportlogcsv":
             return [CanExportLogs]
@@ -199,11 +222,65 @@ class BaseViewSet(viewsets.ViewSet):
         return [CanManageContent]
 
     def list(self, request):
+        etag = _jobs_etag(*_jobs_state(self.queues))
+        if _etag_matches(request, etag):
+            return _not_modified_response(etag)
+
         jobs_response = [
-            _job_to_response(j) for _queue in self.queues for j in _queue.jobs
+            _job_to_response(j) for _queue in self.queues for j in _queue.job_statuses
         ]
 
-        return Response(jobs_response)
+        response = Response(jobs_response)
+        response["ETag"] = etag
+        return response
+
+    @decorators.action(methods=["get"], detail=False)
+    def changes(self, request):
+        """
+        Return the tasks that have changed since the job revision given in the 'since' parameter,
+        along with all running tasks, as their progress is updated without changing the revision,
+        the ids of all current tasks, so that deleted tasks can be removed, and the current revision
+        to pass as 'since' in the next request.
+
+        If the tasks have not changed since the revision given by 'since' or the ETag given by
+        the If-None-Match header, and the 'wait' parameter is given, waits up to that many seconds
+        for a change, or for the progress of a running task to change, before responding.
+        """
+        try:
+            since = int(request.query_params.get("since", 0))
+            wait = min(float(request.query_params.get("wait", 0)), MAX_CHANGES_WAIT)
+        except ValueError:
+            raise serializers.ValidationError("since and wait must be numbers")
+
+        state = _jobs_state(self.queues)
+        revision = state[0]
+        etag_matches = _etag_matches(request, _jobs_etag(*state))
+        if wait > 0 and (etag_matches or since == revision):
+            state = _wait_for_jobs_change(self.queues, state, wait)
+            revision = state[0]
+            etag_matches = _etag_matches(request, _jobs_etag(*state))
+        etag = _jobs_etag(*state)
+        if etag_matches:
+            return _not_modified_response(etag)
+
+        if since > revision:
+            # The job storage has been reset since the client's revision
+            since = 0
+        response = Response(
+            {
+                "revision": revision,
+                "tasks": [
+                    _job_to_response(j)
+                    for _queue in self.queues
+                    for j in _queue.job_statuses_since(since)
+                ],
+                "task_ids": [
+                    job_id for _queue in self.queues for job_id in _queue.job_ids
+                ],
+            }
+        )
+        response["ETag"] = etag
+        return response
 
     def create(self, request):
         # unimplemented. Call out to the task-specific APIs for now.
@@ -312,6 +389,8 @@ class TasksViewSet(BaseViewSet):
                 extra_metadata=task,
                 track_progress=True,
                 cancellable=True,
+                resumable=True,
+                resources=[Resource.NETWORK],
             )
         elif sourcetype == "local":
             task = validate_local_import_task(request, request.data)
@@ -326,6 +405,8 @@ class TasksViewSet(BaseViewSet):
                 extra_metadata=task,
                 track_progress=True,
                 cancellable=True,
+                resumable=True,
+                resources=[Resource.disk(task["drive_id"])],
             )
         else:
             raise serializers.ValidationError("sourcetype must be 'remote' or 'local'")
@@ -355,6 +436,9 @@ class TasksViewSet(BaseViewSet):
                 extra_metadata=task,
                 cancellable=True,
                 track_progress=True,
+                resumable=True,
+                priority=Priority.LOW,
+                resources=[Resource.NETWORK],
             )
             job_ids.append(import_job_id)
 
@@ -401,6 +485,8 @@ class TasksViewSet(BaseViewSet):
             extra_metadata=task,
             track_progress=True,
             cancellable=True,
+            resumable=True,
+            resources=[Resource.NETWORK],
         )
 
         resp = _job_to_response(queue.fetch_job(job_id))
@@ -428,6 +514,9 @@ class TasksViewSet(BaseViewSet):
                 extra_metadata=task,
                 track_progress=True,
                 cancellable=True,
+                resumable=True,
+                priority=Priority.LOW,
+                resources=[Resource.disk(task["drive_id"])],
             )
             job_ids.append(import_job_id)
 
@@ -473,6 +562,8 @@ class TasksViewSet(BaseViewSet):
             extra_metadata=task,
             track_progress=True,
             cancellable=True,
+            resumable=True,
+            resources=[Resource.disk(task["drive_id"])],
         )
 
         resp = _job_to_response(queue.fetch_job(job_id))
@@ -557,6 +648,8 @@ class TasksViewSet(BaseViewSet):
                 track_progress=True,
                 cancellable=True,
                 extra_metadata=task,
+                priority=Priority.LOW,
+                resources=[Resource.disk(task["drive_id"])],
             )
             job_ids.append(export_job_id)
 
@@ -583,6 +676,7 @@ class TasksViewSet(BaseViewSet):
             node_ids=task["node_ids"],
             exclude_node_ids=task["exclude_node_ids"],
             extra_metadata=task,
+            resources=[Resource.disk(task["drive_id"])],
         )
 
         # attempt to get the created Task, otherwise return pending status
@@ -668,6 +762,8 @@ class TasksViewSet(BaseViewSet):
             "locale": locale,
             "extra_metadata": job_metadata,
             "track_progress": True,
+            "priority": Priority.HIGH,
+            "cpu_bound": True,
         }
 
         job_id = priority_queue.enqueue(call_command, *job_args, **job_kwd_args)
@@ -713,6 +809,8 @@ class TasksViewSet(BaseViewSet):
             overwrite="true",
             extra_metadata=job_metadata,
             track_progress=True,
+            priority=Priority.HIGH,
+            cpu_bound=True,
         )
 
         resp = _job_to_response(priority_queue.fetch_job(job_id))
@@ -769,6 +867,8 @@ class TasksViewSet(BaseViewSet):
             overwrite="true",
             extra_metadata=job_metadata,
             track_progress=True,
+            priority=Priority.HIGH,
+            cpu_bound=True,
         )
 
         resp = _job_to_response(priority_queue.fetch_job(job_id))
@@ -831,6 +931,7 @@ class TasksViewSet(BaseViewSet):
             extra_metadata=job_metadata,
             track_progress=False,
             cancellable=True,
+            cpu_bound=True,
         )
 
         resp = _job_to_response(priority_queue.fetch_job(job_id))
@@ -1080,6 +1181,19 @@ def validate_and_prepare_peer_sync_job(request, **kwargs):
     return job_data
 
 
+def _import_channel_unless_resumed(job, *args, **kwargs):
+    """
+    Import the channel database, unless the job is resuming after an interruption, and
+    imported the channel database before it was interrupted.
+    """
+    if job is not None and job.checkpoint.get("channel_imported"):
+        return
+    call_command("importchannel", *args, **kwargs)
+    if job is not None and job.resumable:
+        job.checkpoint["channel_imported"] = True
+        job.save_checkpoint()
+
+
 def _remoteimport(
     channel_id,
     baseurl,
@@ -1091,9 +1205,10 @@ def _remoteimport(
     exclude_node_ids=None,
     extra_metadata=None,
 ):
+    job = get_current_job()
 
-    call_command(
-        "importchannel",
+    _import_channel_unless_resumed(
+        job,
         "network",
         channel_id,
         baseurl=baseurl,
@@ -1102,7 +1217,6 @@ def _remoteimport(
     )
 
     # Make some real-time updates to the metadata
-    job = get_current_job()
 
     # Signal to UI that the DB-downloading step is done so it knows to display
     # progress correctly
@@ -1140,9 +1254,10 @@ def _diskimport(
     exclude_node_ids=None,
     extra_metadata=None,
 ):
+    job = get_current_job()
 
-    call_command(
-        "importchannel",
+    _import_channel_unless_resumed(
+        job,
         "disk",
         channel_id,
         directory,
@@ -1151,7 +1266,6 @@ def _diskimport(
     )
 
     # Make some real-time updates to the metadata
-    job = get_current_job()
 
     # Signal to UI that the DB-downloading step is done so it knows to display
     # progress correctly
@@ -1219,6 +1333,67 @@ def _localexport(
         raise
 
 
+def _jobs_state(queues):
+    """
+    Return the job revision, and the progress of the running jobs of the queues, which
+    together change whenever the status of any of the jobs changes.
+    """
+    progress = tuple(
+        sorted(job for _queue in queues for job in _queue.running_job_progress)
+    )
+    return queues[0].revision, progress
+
+
+def _jobs_etag(revision, progress):
+    if not progress:
+        return quote_etag(str(revision))
+    return quote_etag(
+        "{}-{}".format(
+            revision, hashlib.md5(repr(progress).encode("utf-8")).hexdigest()
+        )
+    )
+
+
+def _etag_matches(request, etag):
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    return "*" in etags or etag in etags or "W/" + etag in etags
+
+
+def _not_modified_response(etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response["ETag"] = etag
+    return response
+
+
+def _wait_for_jobs_change(queues, state, wait):
+    """
+    Wait up to wait seconds for the state of the jobs, as returned by _jobs_state, to change
+    from state, and return the new state. Waiting requests are woken by the notification sent
+    whenever the job revision changes, and only check for progress while jobs are running.
+    Returns straight away if MAX_CHANGES_WAITERS requests are already waiting.
+    """
+    if not _changes_waiters.acquire(False):
+        return state
+    event = threading.Event()
+    add_listener(event)
+    try:
+        deadline = time.time() + wait
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return state
+            event.wait(
+                min(remaining, CHANGES_PROGRESS_INTERVAL) if state[1] else remaining
+            )
+            event.clear()
+            new_state = _jobs_state(queues)
+            if new_state != state:
+                return new_state
+    finally:
+        remove_listener(event)
+        _changes_waiters.release()
+
+
 def _job_to_response(job):
     if not job:
         return {
@@ -0,0 +1,328 @@
+"""
+Benchmarks of the task system, to track the performance of the job storage and workers over time.
+
+Each benchmark runs against a fresh job store, either a temporary SQLite database or a Postgres
+database given by its URL, and with the jobs run either in the worker threads or in the pool of
+worker processes used for CPU bound jobs. The results are returned as a dict that can be dumped
+as JSON, so that they can be compared between runs.
+
+The benchmarks measure:
+- enqueue: the throughput of enqueueing jobs one at a time, and all at once with enqueue_many.
+- dispatch: the latency from each job being enqueued to it being started by a worker, and the
+  throughput of running all of the jobs, for jobs that do nothing (noop), that sleep (sleep), or
+  that report their progress many times (chatty).
+- progress_update: the time taken to write a progress update to the job store.
+- cancel: the latency from a running job being cancelled to it being marked as cancelled.
+"""
+import os
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+import kolibri
+from kolibri.core.tasks.compat import PROCESS_POOL
+from kolibri.core.tasks.job import Job
+from kolibri.core.tasks.job import State
+from kolibri.core.tasks.queue import Queue
+from kolibri.core.tasks.storage import FINISHED_STATES
+from kolibri.core.tasks.utils import get_current_job
+from kolibri.core.tasks.worker import Worker
+
+BENCHMARK_QUEUE = "benchmark"
+
+SQLITE = "sqlite"
+POSTGRES = "postgres"
+STORES = (SQLITE, POSTGRES)
+
+THREAD = "thread"
+PROCESS = "process"
+MODES = (THREAD, PROCESS)
+
+NOOP = "noop"
+SLEEP = "sleep"
+CHATTY = "chatty"
+KINDS = (NOOP, SLEEP, CHATTY)
+
+# How long, in seconds, each sleep job sleeps for
+SLEEP_DURATION = 0.05
+
+# How many times each chatty job reports its progress
+CHATTY_PROGRESS_UPDATES = 100
+
+# How often, in seconds, to check the job store while waiting for jobs to change state
+POLL_INTERVAL = 0.01
+
+# How long, in seconds, to wait for jobs to change state before giving up
+TIMEOUT = 600
+
+
+class BenchmarkTimeout(Exception):
+    pass
+
+
+def benchmark_job(kind):
+    """
+    The job that is run by the dispatch benchmarks, which records when it was started.
+    """
+    job = get_current_job()
+    job.extra_metadata["started_at"] = time.time()
+    job.save_meta()
+    if kind == SLEEP:
+        time.sleep(SLEEP_DURATION)
+    elif kind == CHATTY:
+        for i in range(CHATTY_PROGRESS_UPDATES):
+            job.check_for_cancel()
+            job.update_progress(i + 1, CHATTY_PROGRESS_UPDATES)
+
+
+def cancellable_job():
+    """
+    The job that is run by the cancel benchmark, which runs until it is cancelled.
+    """
+    job = get_current_job()
+    job.extra_metadata["started_at"] = time.time()
+    job.save_meta()
+    start = time.time()
+    while time.time() - start < TIMEOUT:
+        job.check_for_cancel()
+        time.sleep(POLL_INTERVAL)
+
+
+def summarize(values):
+    """
+    Summarize a list of durations, in seconds, as milliseconds.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(int(len(values) * p), len(values) - 1)] * 1000
+
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "min_ms": values[0] * 1000,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "max_ms": values[-1] * 1000,
+    }
+
+
+@contextmanager
+def job_store(store, postgres_url=None):
+    """
+    Create a connection to an empty job store, and remove it afterwards.
+    """
+    if store == SQLITE:
+        directory = tempfile.mkdtemp()
+        connection = create_engine(
+            "sqlite:///{path}".format(
+                path=os.path.join(directory, "job_storage.sqlite3")
+            ),
+            connect_args={"check_same_thread": False},
+            poolclass=NullPool,
+        )
+        try:
+            yield connection
+        finally:
+            connection.dispose()
+            shutil.rmtree(directory, ignore_errors=True)
+    elif store == POSTGRES:
+        connection = create_engine(postgres_url, pool_pre_ping=True)
+        queue = Queue(BENCHMARK_QUEUE, connection)
+        queue.storage.clear(queue=BENCHMARK_QUEUE, force=True)
+        try:
+            yield connection
+        finally:
+            queue.storage.clear(queue=BENCHMARK_QUEUE, force=True)
+            connection.dispose()
+    else:
+        raise ValueError("Unknown job store {}".format(store))
+
+
+def wait_for_jobs(storage, job_ids, states):
+    """
+    Wait until all of the jobs are in one of the states, and return their statuses.
+    """
+    job_ids = set(job_ids)
+    start = time.time()
+    while time.time() - start < TIMEOUT:
+        statuses = [
+            status
+            for status in storage.get_all_job_statuses(BENCHMARK_QUEUE)
+            if status.job_id in job_ids
+        ]
+        if len(statuses) == len(job_ids) and all(
+            status.state in states for status in statuses
+        ):
+            return statuses
+        time.sleep(POLL_INTERVAL)
+    raise BenchmarkTimeout("Jobs did not reach the states {}".format(states))
+
+
+def benchmark_enqueue(connection, num_jobs):
+    queue = Queue(BENCHMARK_QUEUE, connection)
+
+    start = time.time()
+    for _ in range(num_jobs):
+        queue.storage.enqueue_job(Job(benchmark_job, NOOP), BENCHMARK_QUEUE)
+    single_duration = time.time() - start
+    queue.storage.clear(queue=BENCHMARK_QUEUE, force=True)
+
+    jobs = [Job(benchmark_job, NOOP) for _ in range(num_jobs)]
+    start = time.time()
+    queue.enqueue_many(jobs)
+    bulk_duration = time.time() - start
+    queue.storage.clear(queue=BENCHMARK_QUEUE, force=True)
+
+    return {
+        "jobs": num_jobs,
+        "single_seconds": single_duration,
+        "single_jobs_per_second": num_jobs / single_duration,
+        "bulk_seconds": bulk_duration,
+        "bulk_jobs_per_second": num_jobs / bulk_duration,
+    }
+
+
+def benchmark_dispatch(worker, kind, mode, num_jobs):
+    storage = worker.storage
+    job_ids = []
+    start = time.time()
+    for _ in range(num_jobs):
+        job = Job(
+            benchmark_job,
+            kind,
+            track_progress=True,
+            cancellable=True,
+            cpu_bound=mode == PROCESS,
+            extra_metadata={"enqueued_at": time.time()},
+        )
+        job_ids.append(storage.enqueue_job(job, BENCHMARK_QUEUE))
+    statuses = wait_for_jobs(storage, job_ids, FINISHED_STATES)
+    duration = time.time() - start
+    storage.clear(queue=BENCHMARK_QUEUE, force=True)
+
+    return {
+        "jobs": num_jobs,
+        "failed": len([s for s in statuses if s.state != State.COMPLETED]),
+        "seconds": duration,
+        "jobs_per_second": num_jobs / duration,
+        "latency": summarize(
+            [
+                s.extra_metadata["started_at"] - s.extra_metadata["enqueued_at"]
+                for s in statuses
+                if "started_at" in s.extra_metadata
+            ]
+        ),
+    }
+
+
+def benchmark_progress_update(connection, num_updates):
+    queue = Queue(BENCHMARK_QUEUE, connection)
+    job_id = queue.storage.enqueue_job(Job(benchmark_job, NOOP), BENCHMARK_QUEUE)
+    queue.storage.mark_job_as_running(job_id)
+    durations = []
+    for i in range(num_updates):
+        start = time.time()
+        queue.storage.update_job_progress(job_id, i + 1, num_updates)
+        durations.append(time.time() - start)
+    queue.storage.clear(queue=BENCHMARK_QUEUE, force=True)
+    return summarize(durations)
+
+
+def benchmark_cancel(worker, mode, num_jobs):
+    storage = worker.storage
+    queue = Queue(BENCHMARK_QUEUE, worker.storage.engine)
+    durations = []
+    for _ in range(num_jobs):
+        job = Job(cancellable_job, cancellable=True, cpu_bound=mode == PROCESS)
+        job_id = storage.enqueue_job(job, BENCHMARK_QUEUE)
+        start = time.time()
+        while "started_at" not in storage.get_job(job_id).extra_metadata:
+            if time.time() - start > TIMEOUT:
+                raise BenchmarkTimeout("Job was not started")
+            time.sleep(POLL_INTERVAL)
+        start = time.time()
+        queue.cancel(job_id)
+        wait_for_jobs(storage, [job_id], FINISHED_STATES)
+        durations.append(time.time() - start)
+    storage.clear(queue=BENCHMARK_QUEUE, force=True)
+    return summarize(durations)
+
+
+def run_benchmarks(
+    num_jobs=100,
+    num_workers=3,
+    stores=(SQLITE,),
+    modes=MODES,
+    kinds=KINDS,
+    postgres_url=None,
+    num_cancels=5,
+    log=None,
+):
+    """
+    Run the benchmarks for each job store, and for each worker mode, and return the results.
+
+    :param num_jobs: the number of jobs to enqueue and run for each benchmark.
+    :param num_workers: the number of workers to run the jobs with.
+    :param stores: the job stores to benchmark, sqlite and/or postgres.
+    :param modes: the worker modes to benchmark, thread and/or process.
+    :param kinds: the kinds of job to run in the dispatch benchmarks, noop, sleep and/or chatty.
+    :param postgres_url: the URL of the Postgres database to benchmark, required for postgres.
+    :param num_cancels: the number of jobs to cancel in the cancel benchmark.
+    :param log: a function to call with a message as each benchmark is started.
+    """
+    results = {
+        "kolibri_version": kolibri.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "parameters": {
+            "jobs": num_jobs,
+            "workers": num_workers,
+            "cancels": num_cancels,
+            "sleep_seconds": SLEEP_DURATION,
+            "chatty_progress_updates": CHATTY_PROGRESS_UPDATES,
+        },
+        "stores": {},
+    }
+    log = log or (lambda message: None)
+
+    for store in stores:
+        if store == POSTGRES and not postgres_url:
+            results["stores"][store] = {"skipped": "No Postgres URL given"}
+            continue
+        store_results = results["stores"][store] = {"modes": {}}
+        with job_store(store, postgres_url=postgres_url) as connection:
+            log("{}: enqueue".format(store))
+            store_results["enqueue"] = benchmark_enqueue(connection, num_jobs)
+            log("{}: progress update".format(store))
+            store_results["progress_update"] = benchmark_progress_update(
+                connection, num_jobs
+            )
+            for mode in modes:
+                if mode == PROCESS and not PROCESS_POOL:
+                    store_results["modes"][mode] = {
+                        "skipped": "Process pool not supported"
+                    }
+                    continue
+                mode_results = store_results["modes"][mode] = {"dispatch": {}}
+                worker = Worker(BENCHMARK_QUEUE, connection, num_workers=num_workers)
+                try:
+                    for kind in kinds:
+                        log("{}, {}: dispatch {} jobs".format(store, mode, kind))
+                        mode_results["dispatch"][kind] = benchmark_dispatch(
+                            worker, kind, mode, num_jobs
+                        )
+                    log("{}, {}: cancel".format(store, mode))
+                    mode_results["cancel"] = benchmark_cancel(worker, mode, num_cancels)
+                finally:
+                    worker.shutdown(wait=True)
+
+    return results
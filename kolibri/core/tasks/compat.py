@@ -17,3 +17,11 @@ except ImportError:
     from threading import local  # noqa
 
     MULTIPROCESS = False
+
+try:
+    # Process pools need working semaphores, which are missing on some platforms
+    import multiprocessing.synchronize  # noqa
+
+    PROCESS_POOL = True
+except ImportError:
+    PROCESS_POOL = False
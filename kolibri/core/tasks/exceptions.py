@@ -9,5 +9,14 @@ class UserCancelledError(CancelledError):
     pass
 
 
+class JobInterruptedError(UserCancelledError):
+    """
+    An error raised when the current job is cancelled because its worker is shutting down,
+    rather than by the user, so a resumable job will be resumed when the worker restarts.
+    """
+
+    pass
+
+
 class JobNotFound(Exception):
     pass
@@ -46,6 +46,50 @@ class State(object):
     COMPLETED = "COMPLETED"
 
 
+class Priority(object):
+    """
+    The Priority object enumerates standard priorities for Jobs. Queued jobs with a lower
+    priority value are started before those with a higher value, and jobs with the same
+    priority are started in the order they were queued.
+
+    HIGH is for jobs that a user is actively waiting on, such as exports of user data.
+
+    REGULAR is the default priority.
+
+    LOW is for bulk jobs that can wait for other jobs to run first.
+    """
+
+    HIGH = 0
+    REGULAR = 5
+    LOW = 10
+
+
+class Resource(object):
+    """
+    The Resource object enumerates the classes of resources that a Job can declare it uses,
+    so that the workers can limit how many jobs use each resource at the same time.
+
+    NETWORK is for jobs that make heavy use of the network, such as downloading content.
+
+    DISK is for jobs that make heavy use of an external drive, and should be specified with the
+    id of the drive using Resource.disk, so that jobs on different drives can run at the same time.
+
+    CPU is for jobs that make heavy use of the processor.
+    """
+
+    NETWORK = "network"
+    DISK = "disk"
+    CPU = "cpu"
+
+    @staticmethod
+    def disk(drive_id):
+        return "{}:{}".format(Resource.DISK, drive_id)
+
+    @staticmethod
+    def get_class(resource):
+        return resource.split(":", 1)[0]
+
+
 class Job(object):
     """
     Job represents a function whose execution has been deferred through the Client's schedule function.
@@ -62,7 +106,11 @@ class Job(object):
             "exception",
             "track_progress",
             "cancellable",
+            "resumable",
+            "cpu_bound",
             "extra_metadata",
+            "priority",
+            "resources",
             "progress",
             "total_progress",
             "args",
@@ -71,6 +119,16 @@ class Job(object):
         ]
         return {key: self.__dict__[key] for key in keys}
 
+    def __setstate__(self, state):
+        # Jobs pickled before priorities, resources, resumable and cpu_bound were added have none of them
+        self.priority = Priority.REGULAR
+        self.resources = []
+        self.resumable = False
+        self.cpu_bound = False
+        # The checkpoint is stored separately from the pickled job
+        self.checkpoint = {}
+        self.__dict__.update(state)
+
     def __init__(self, func, *args, **kwargs):
         """
         Create a new Job that will run func given the arguments passed to Job(). If the track_progress keyword parameter
@@ -85,7 +143,11 @@ class Job(object):
             kwargs = copy.copy(func.kwargs)
             kwargs["track_progress"] = func.track_progress
             kwargs["cancellable"] = func.cancellable
+            kwargs["resumable"] = func.resumable
+            kwargs["cpu_bound"] = func.cpu_bound
             kwargs["extra_metadata"] = func.extra_metadata.copy()
+            kwargs["priority"] = func.priority
+            kwargs["resources"] = list(func.resources)
             func = func.func
         self.job_id = uuid.uuid4().hex
         self.state = kwargs.pop("state", State.QUEUED)
@@ -93,7 +155,15 @@ class Job(object):
         self.exception = None
         self.track_progress = kwargs.pop("track_progress", False)
         self.cancellable = kwargs.pop("cancellable", False)
+        self.resumable = kwargs.pop("resumable", False)
+        self.checkpoint = {}
         self.extra_metadata = kwargs.pop("extra_metadata", {})
+        self.priority = kwargs.pop("priority", Priority.REGULAR)
+        self.resources = kwargs.pop("resources", [])
+        # CPU bound jobs are run in a separate process, so that they don't hold the GIL
+        self.cpu_bound = kwargs.pop("cpu_bound", False)
+        if self.cpu_bound and Resource.CPU not in self.resources:
+            self.resources = list(self.resources) + [Resource.CPU]
         self.progress = 0
         self.total_progress = 0
         self.args = args
@@ -103,6 +173,7 @@ class Job(object):
         self.update_progress_method = None
         self.check_for_cancel_method = None
         self.save_as_cancellable_method = None
+        self.save_checkpoint_method = None
 
         if callable(func):
             funcstring = stringify_func(func)
@@ -123,6 +194,18 @@ class Job(object):
             )
         self.save_meta_method(self)
 
+    def save_checkpoint(self):
+        """
+        Save the job's checkpoint, a dict of whatever state the job needs to resume from
+        where it left off. If the job is resumable, and the workers are restarted while it
+        is running, it is requeued and restarted with the last checkpoint it saved.
+        """
+        if self.save_checkpoint_method is None:
+            raise ReferenceError(
+                "save_checkpoint_method is not defined on this job, cannot save checkpoint"
+            )
+        self.save_checkpoint_method(self)
+
     def update_progress(self, progress, total_progress):
         if self.track_progress:
             if self.update_progress_method is None:
@@ -164,6 +247,7 @@ class Job(object):
             cancel_job_func,
             save_job_meta_func,
             save_as_cancellable_func,
+            save_job_checkpoint_func=None,
         ):
             """
             Call the function stored in self.func, and passing in update_progress_func
@@ -173,6 +257,7 @@ class Job(object):
             :param cancel_job_func: The callback to see if the user wants to cancel the job.
             :param save_job_meta_func: The callback to save any changes to meta data
             :param save_as_cancellable_func: The callback to save any changes to meta data
+            :param save_job_checkpoint_func: The callback to save the job's checkpoint
             :return: Any
             """
 
@@ -180,6 +265,7 @@ class Job(object):
 
             self.save_meta_method = save_job_meta_func
             self.save_as_cancellable_method = save_as_cancellable_func
+            self.save_checkpoint_method = save_job_checkpoint_func
             if self.track_progress:
                 self.update_progress_method = update_progress_func
 
@@ -232,3 +318,32 @@ class Job(object):
                 total=self.total_progress,
             )
         )
+
+
+class JobStatus(object):
+    """
+    JobStatus represents the current status of a Job, as stored in the job columns of the storage backend,
+    so that the status of many jobs can be read without unpickling each of the jobs.
+    """
+
+    def __init__(
+        self,
+        job_id,
+        state,
+        progress,
+        total_progress,
+        cancellable,
+        extra_metadata,
+        exception,
+        traceback,
+    ):
+        self.job_id = job_id
+        self.state = state
+        self.progress = progress or 0
+        self.total_progress = total_progress or 0
+        self.cancellable = bool(cancellable)
+        self.extra_metadata = extra_metadata or {}
+        self.exception = exception
+        self.traceback = traceback or ""
+
+    percentage_progress = Job.percentage_progress
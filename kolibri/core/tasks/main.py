@@ -1,5 +1,6 @@
 import logging
 import os
+from datetime import timedelta
 
 from django.utils.functional import SimpleLazyObject
 from sqlalchemy import create_engine
@@ -12,6 +13,7 @@ from kolibri.core.tasks.queue import Queue
 from kolibri.core.tasks.scheduler import Scheduler
 from kolibri.core.tasks.worker import Worker
 from kolibri.utils import conf
+from kolibri.utils.time_utils import local_now
 
 
 logger = logging.getLogger(__name__)
@@ -114,9 +116,42 @@ def __scheduler():
 scheduler = SimpleLazyObject(__scheduler)
 
 
+# Only vacuum the job storage database when at least this fraction of it is free space
+JOB_STORAGE_VACUUM_FREE_FRACTION = 0.25
+
+
+def clean_job_storage():
+    """
+    Delete the finished jobs that are past the configured retention, and vacuum the
+    job storage database if that has left enough free space to be worth reclaiming.
+    """
+    deleted = queue.storage.delete_old_jobs(
+        max_age=conf.OPTIONS["Tasks"]["FINISHED_JOB_RETENTION_DAYS"] * 24 * 60 * 60,
+        max_count=conf.OPTIONS["Tasks"]["FINISHED_JOB_RETENTION_COUNT"],
+    )
+    logger.info("Deleted {} finished jobs from job storage.".format(deleted))
+    queue.storage.vacuum(min_free_fraction=JOB_STORAGE_VACUUM_FREE_FRACTION)
+
+
+def schedule_job_storage_cleanup():
+    current_dt = local_now()
+    cleanup_time = current_dt.replace(hour=3, minute=30, second=0, microsecond=0)
+    if cleanup_time < current_dt:
+        # If it is past 3:30AM, change the day to tomorrow.
+        cleanup_time = cleanup_time + timedelta(days=1)
+    # Repeat indefinitely
+    scheduler.schedule(
+        cleanup_time, clean_job_storage, repeat=None, interval=24 * 60 * 60
+    )
+
+
 def initialize_workers():
     logger.info("Starting scheduler workers.")
-    regular_worker = Worker(task_queue_name, connection=connection, num_workers=1)
+    regular_worker = Worker(
+        task_queue_name,
+        connection=connection,
+        num_workers=conf.OPTIONS["Tasks"]["REGULAR_QUEUE_WORKERS"],
+    )
     priority_worker = Worker(priority_queue_name, connection=connection, num_workers=3)
     facility_worker = Worker(facility_queue_name, connection=connection, num_workers=1)
     return regular_worker, priority_worker, facility_worker
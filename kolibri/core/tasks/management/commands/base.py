@@ -6,6 +6,7 @@ from collections import namedtuple
 import click
 from django.core.management.base import BaseCommand
 
+from kolibri.core.tasks.exceptions import JobInterruptedError
 from kolibri.core.tasks.exceptions import UserCancelledError
 from kolibri.core.tasks.utils import get_current_job
 
@@ -143,6 +144,19 @@ class AsyncCommand(BaseCommand):
         except (UserCancelledError, KeyError):
             return True
 
+    def is_interrupted(self):
+        """
+        Return True if the job was cancelled because the workers are shutting down,
+        rather than by the user, in which case a resumable job will be resumed.
+        """
+        try:
+            self.check_for_cancel()
+            return False
+        except JobInterruptedError:
+            return True
+        except (UserCancelledError, KeyError):
+            return False
+
     def cancel(self):
         return self.check_for_cancel()
 
@@ -0,0 +1,226 @@
+"""
+Notification of workers when there are new jobs for them to start or cancel, so that
+workers can wait for a notification rather than repeatedly polling the job storage.
+
+Workers in the same process as the notifying code are woken by setting their wakeup
+events directly. Workers in other processes on the same device are woken by a UDP
+datagram sent to a listener socket on the loopback interface. Each process with
+workers records the port of its listener in a file, named after the port, in a
+directory in KOLIBRI_HOME, so that any number of processes can be notified.
+
+Notifications are best effort, so workers should still check the job storage
+occasionally in case a notification was missed.
+"""
+import io
+import logging
+import os
+import socket
+import threading
+import time
+
+from six import text_type
+
+from kolibri.utils import conf
+from kolibri.utils.system import pid_exists
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_HOST = "127.0.0.1"
+
+# How long, in seconds, to wait before trying to listen again after an error
+LISTENER_RETRY_INTERVAL = 1
+
+_lock = threading.Lock()
+
+# Wakeup events of the workers in this process
+_events = set()
+
+_listener = None
+
+
+def get_notification_ports_dir():
+    return os.path.join(conf.KOLIBRI_HOME, "job_storage_notify")
+
+
+def _get_port_file_path(port):
+    return os.path.join(get_notification_ports_dir(), text_type(port))
+
+
+def _register_port(port):
+    try:
+        try:
+            os.makedirs(get_notification_ports_dir())
+        except OSError:
+            # already exists, any other error will be raised when writing the file
+            pass
+        with io.open(_get_port_file_path(port), "w") as f:
+            f.write(text_type(os.getpid()))
+    except (IOError, OSError) as e:
+        logger.warning(
+            "Unable to record job notification port, workers in this process will "
+            "not be notified of jobs created by other processes: {}".format(e)
+        )
+
+
+def _unregister_port(port):
+    try:
+        os.remove(_get_port_file_path(port))
+    except (IOError, OSError):
+        pass
+
+
+def _read_notification_ports():
+    try:
+        names = os.listdir(get_notification_ports_dir())
+    except (IOError, OSError):
+        return []
+    ports = []
+    for name in names:
+        try:
+            ports.append(int(name))
+        except ValueError:
+            pass
+    return ports
+
+
+def _remove_stale_ports():
+    """
+    Remove the recorded ports of processes that are no longer running,
+    for example because they were killed before they could remove them.
+    """
+    for port in _read_notification_ports():
+        try:
+            with io.open(_get_port_file_path(port), "r") as f:
+                pid = int(f.read().strip())
+        except (IOError, OSError, ValueError):
+            continue
+        if pid != os.getpid() and not pid_exists(pid):
+            _unregister_port(port)
+
+
+def _wake_events():
+    with _lock:
+        events = list(_events)
+    for event in events:
+        event.set()
+
+
+class NotificationListener(threading.Thread):
+    """
+    A thread that listens for notification datagrams from other processes,
+    and wakes the workers in this process when one is received.
+    """
+
+    def __init__(self):
+        super(NotificationListener, self).__init__(name="JOBNOTIFICATIONLISTENER")
+        self.daemon = True
+        self.stopped = False
+        self.socket = None
+        self.port = None
+        self._bind()
+
+    def _bind(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((NOTIFICATION_HOST, 0))
+        self.port = self.socket.getsockname()[1]
+
+    def _close(self):
+        _unregister_port(self.port)
+        try:
+            self.socket.close()
+        except (IOError, OSError):
+            pass
+
+    def _restart(self):
+        """
+        Replace the socket after an error, retrying until it succeeds or the listener
+        is stopped, and wake the workers in case a notification was missed meanwhile.
+        """
+        self._close()
+        while not self.stopped:
+            try:
+                self._bind()
+            except (IOError, OSError) as e:
+                logger.warning(
+                    "Unable to listen for job notifications, retrying: {}".format(e)
+                )
+                time.sleep(LISTENER_RETRY_INTERVAL)
+                continue
+            _register_port(self.port)
+            break
+        _wake_events()
+
+    def start(self):
+        _remove_stale_ports()
+        super(NotificationListener, self).start()
+        _register_port(self.port)
+
+    def run(self):
+        while not self.stopped:
+            try:
+                self.socket.recv(1)
+            except (IOError, OSError) as e:
+                if self.stopped:
+                    break
+                logger.warning(
+                    "Error listening for job notifications, restarting: {}".format(e)
+                )
+                self._restart()
+                continue
+            if not self.stopped:
+                _wake_events()
+        self._close()
+
+    def stop(self):
+        self.stopped = True
+        _unregister_port(self.port)
+        # wake the listening thread so that it can exit
+        _send_datagram(self.port)
+
+
+def _send_datagram(port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(b"1", (NOTIFICATION_HOST, port))
+    except (IOError, OSError) as e:
+        logger.debug("Unable to send job notification: {}".format(e))
+    finally:
+        sock.close()
+
+
+def add_listener(event):
+    """
+    Register the wakeup event of a worker, to be set whenever workers are notified.
+    The first registered event starts the listener for notifications from other processes.
+    """
+    global _listener
+    with _lock:
+        _events.add(event)
+        if _listener is None:
+            _listener = NotificationListener()
+            _listener.start()
+
+
+def remove_listener(event):
+    """
+    Unregister the wakeup event of a worker.
+    Removing the last registered event stops the listener for notifications from other processes.
+    """
+    global _listener
+    with _lock:
+        _events.discard(event)
+        if not _events and _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def notify_workers():
+    """
+    Wake all workers, in this process and any other, to check the job storage.
+    """
+    _wake_events()
+    with _lock:
+        local_port = _listener.port if _listener is not None else None
+    for port in _read_notification_ports():
+        if port != local_port:
+            _send_datagram(port)
@@ -0,0 +1,205 @@
+"""
+Running jobs in a pool of worker processes, for jobs that are CPU bound and would hold the GIL,
+slowing down the server and every other job, if they were run in the worker threads.
+
+A job running in another process cannot call the worker's methods to update its progress,
+check whether it has been cancelled, or save its metadata, so these are marshalled over a
+JobChannel: the job process puts messages for the worker on a queue, that a thread in the
+worker process reads and handles, and the worker sets flags for the jobs it wants to cancel,
+that the job process reads when the job checks for cancellation.
+"""
+import logging
+import os
+import threading
+from multiprocessing import Manager
+
+try:
+    from multiprocessing import get_context
+except ImportError:
+    # Python 2 can only fork new processes
+    get_context = None
+
+from kolibri.core.tasks.exceptions import JobInterruptedError
+from kolibri.core.tasks.exceptions import UserCancelledError
+
+logger = logging.getLogger(__name__)
+
+# Message kinds sent by jobs to the worker
+PROGRESS = "progress"
+META = "meta"
+CANCELLABLE = "cancellable"
+CHECKPOINT = "checkpoint"
+_FLUSH = "flush"
+
+# Flags set by the worker for jobs
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+
+
+def _start_manager():
+    # Forking the worker process, which has many threads, can leave the forked process
+    # deadlocked on a lock that another thread held at the time, so where possible the
+    # manager's server process is started in a fresh interpreter instead.
+    if get_context is not None:
+        return get_context("spawn").Manager()
+    return Manager()
+
+
+class JobChannel(object):
+    """
+    The worker end of the channel between a worker and the jobs it runs in other processes.
+    """
+
+    def __init__(self, handle_message):
+        """
+        :param handle_message: a function accepting a message kind, job_id and value,
+        called in the channel's thread for each message sent by a job.
+        """
+        self.handle_message = handle_message
+        # The manager runs a server process that holds the queue and flags, so that
+        # they can be passed to the job processes along with each job
+        self._manager = _start_manager()
+        self._messages = self._manager.Queue()
+        self._flags = self._manager.dict()
+        self._flushed = 0
+        self._flush_requested = 0
+        self._flush_condition = threading.Condition()
+        self._thread = threading.Thread(target=self._receive, name="JOBCHANNEL")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._messages.get()
+            except (EOFError, IOError):
+                # The manager process has exited, as it does at interpreter exit
+                break
+            if message is None:
+                break
+            kind, job_id, value = message
+            if kind == _FLUSH:
+                with self._flush_condition:
+                    self._flushed = value
+                    self._flush_condition.notify_all()
+                continue
+            try:
+                self.handle_message(kind, job_id, value)
+            except Exception:
+                logger.exception(
+                    "Error handling {} message for job {}".format(kind, job_id)
+                )
+
+    def flush(self):
+        """
+        Wait until every message that has been sent so far has been handled.
+        """
+        with self._flush_condition:
+            self._flush_requested += 1
+            token = self._flush_requested
+        self._messages.put((_FLUSH, None, token))
+        with self._flush_condition:
+            while self._flushed < token and self._thread.is_alive():
+                self._flush_condition.wait(1)
+
+    def set_flag(self, job_id, flag):
+        self._flags[job_id] = flag
+
+    def clear_flag(self, job_id):
+        self._flags.pop(job_id, None)
+
+    def get_client(self):
+        """
+        Return the job end of the channel, to pass to a job process along with the job.
+        """
+        return JobChannelClient(self._messages, self._flags)
+
+    def shutdown(self):
+        self._messages.put(None)
+        self._thread.join()
+        self._manager.shutdown()
+
+
+class JobChannelClient(object):
+    """
+    The job end of the channel, that provides the job with the functions that the worker
+    would otherwise pass to it, which send messages to the worker instead.
+    """
+
+    def __init__(self, messages, flags):
+        self._messages = messages
+        self._flags = flags
+
+    def update_progress(self, job_id, progress, total_progress):
+        self._messages.put((PROGRESS, job_id, (progress, total_progress)))
+
+    def check_for_cancel(self, job_id):
+        flag = self._flags.get(job_id)
+        if flag == INTERRUPTED:
+            raise JobInterruptedError()
+        if flag == CANCELLED:
+            raise UserCancelledError()
+
+    def save_job_meta(self, job):
+        self._messages.put((META, job.job_id, job.extra_metadata))
+
+    def save_job_as_cancellable(self, job_id, cancellable=True):
+        self._messages.put((CANCELLABLE, job_id, cancellable))
+
+    def save_job_checkpoint(self, job):
+        self._messages.put((CHECKPOINT, job.job_id, job.checkpoint))
+
+
+# The process that _prepare_process last ran in
+_prepared_pid = None
+
+# Database connections inherited from the worker process, which are kept
+# but never used, as closing them would also close them for the worker
+_inherited_connections = []
+
+
+def _prepare_process():
+    """
+    Prepare a job process to run Django code, the first time it runs a job.
+    """
+    global _prepared_pid
+    if _prepared_pid == os.getpid():
+        return
+    _prepared_pid = os.getpid()
+
+    from django.apps import apps
+
+    if not apps.ready:
+        # The process was spawned rather than forked, so Django needs to be set up
+        import django
+
+        django.setup()
+    else:
+        from django.db import connections
+
+        for conn in connections.all():
+            if conn.connection is not None:
+                _inherited_connections.append(conn.connection)
+                conn.connection = None
+
+
+def execute_job_in_process(job, checkpoint, client, execute):
+    """
+    Run a job in a job process, passing it the functions of the client to communicate
+    with the worker.
+
+    :param job: the Job to run.
+    :param checkpoint: the job's checkpoint, which is not pickled with the job.
+    :param client: the JobChannelClient of the worker's JobChannel.
+    :param execute: a function that wraps the job's lambda to execute, as the worker does.
+    """
+    _prepare_process()
+    job.checkpoint = checkpoint
+    lambda_to_execute = execute(job.get_lambda_to_execute())
+    return lambda_to_execute(
+        update_progress_func=client.update_progress,
+        cancel_job_func=client.check_for_cancel,
+        save_job_meta_func=client.save_job_meta,
+        save_as_cancellable_func=client.save_job_as_cancellable,
+        save_job_checkpoint_func=client.save_job_checkpoint,
+    )
@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+class ProgressAggregator(object):
+    """
+    Buffers progress updates for jobs in memory, so that the progress of each job is written
+    to the job storage at most once every interval seconds, however often it is reported.
+
+    The first progress update for a job is written immediately, later updates within the interval
+    are buffered and written when the interval has elapsed, so the stored progress is never more
+    than interval seconds behind. Any buffered progress is also written when a job finishes,
+    so that the final progress of every job is always stored.
+    """
+
+    def __init__(self, write_progress, interval):
+        """
+        :param write_progress: a function accepting a job_id, progress and total_progress,
+        that writes the progress of the job to storage.
+        :param interval: the minimum time in seconds between progress writes for each job.
+        """
+        self.write_progress = write_progress
+        self.interval = interval
+        # Progress writes are made while holding the lock, so that they
+        # can never be written to storage out of order.
+        self._lock = threading.Lock()
+        # Key: job_id, Value: tuple of the buffered progress and total_progress
+        self._pending = {}
+        # Key: job_id, Value: time of the last progress write
+        self._last_write = {}
+        # Key: job_id, Value: Timer to write the buffered progress
+        self._timers = {}
+
+    def _write(self, job_id, progress, total_progress):
+        self._last_write[job_id] = time.time()
+        self.write_progress(job_id, progress, total_progress)
+
+    def update(self, job_id, progress, total_progress):
+        with self._lock:
+            last_write = self._last_write.get(job_id)
+            wait = (
+                last_write + self.interval - time.time()
+                if last_write is not None
+                else 0
+            )
+            if wait <= 0:
+                self._pending.pop(job_id, None)
+                self._write(job_id, progress, total_progress)
+                return
+            self._pending[job_id] = (progress, total_progress)
+            if job_id not in self._timers:
+                timer = threading.Timer(wait, self.flush, args=(job_id,))
+                timer.daemon = True
+                self._timers[job_id] = timer
+                timer.start()
+
+    def flush(self, job_id):
+        """
+        Write any buffered progress for the job.
+        """
+        with self._lock:
+            self._timers.pop(job_id, None)
+            pending = self._pending.pop(job_id, None)
+            if pending is not None:
+                self._write(job_id, *pending)
+
+    def finish(self, job_id):
+        """
+        Write any buffered progress for the job, and stop tracking it,
+        this should be called before the job's state changes from running.
+        """
+        with self._lock:
+            timer = self._timers.pop(job_id, None)
+            if timer is not None:
+                timer.cancel()
+            pending = self._pending.pop(job_id, None)
+            if pending is not None:
+                self._write(job_id, *pending)
+            self._last_write.pop(job_id, None)
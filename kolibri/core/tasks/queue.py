@@ -17,7 +17,7 @@ class Queue(object):
 
     @property
     def job_ids(self):
-        return [job.job_id for job in self.storage.get_all_jobs(self.name)]
+        return self.storage.get_job_ids(self.name)
 
     @property
     def jobs(self):
@@ -28,6 +28,41 @@ class Queue(object):
         """
         return self.storage.get_all_jobs(self.name)
 
+    @property
+    def job_statuses(self):
+        """
+        Return the status of all the jobs scheduled, queued, running, failed or completed,
+        without loading the jobs themselves.
+        Returns: A list of JobStatus objects.
+
+        """
+        return self.storage.get_all_job_statuses(self.name)
+
+    @property
+    def revision(self):
+        """
+        Return the current job revision, which is shared by all queues, and changes
+        whenever any job is added, updated or deleted, other than to update its progress.
+        """
+        return self.storage.get_revision()
+
+    @property
+    def running_job_progress(self):
+        """
+        Return the id, progress and total progress of each running job, as the progress
+        of a job changes without changing the job revision.
+        """
+        return self.storage.get_running_job_progress(self.name)
+
+    def job_statuses_since(self, revision):
+        """
+        Return the status of the jobs that have changed since the given job revision,
+        and of the running jobs.
+        Returns: A list of JobStatus objects.
+
+        """
+        return self.storage.get_job_statuses_since(self.name, revision)
+
     def enqueue(self, func, *args, **kwargs):
         """
         Enqueues a function func for execution.
@@ -44,9 +79,19 @@ class Queue(object):
         "check_for_cancel" parameter is passed in. When called, it raises an error when the user has requested a job
         to be cancelled.
 
+        A job enqueued with the "resumable" keyword parameter is requeued if the workers are restarted while it is
+        running, and can save a checkpoint with job.save_checkpoint() to resume from when it is restarted.
+
+        A job enqueued with the "cpu_bound" keyword parameter is run in a worker process rather than a worker thread,
+        so that it doesn't hold the GIL while it runs. Its function, arguments and result must be pickleable.
+
         The caller can also pass in any pickleable object into the "extra_metadata" parameter. This data is stored
         within the job and can be retrieved when the job status is queried.
 
+        The "priority" parameter sets the job's priority, one of the values of Priority, queued jobs are started in
+        order of priority. The "resources" parameter is a list of the resources that the job uses, from Resource, the
+        workers limit how many running jobs use each resource at the same time.
+
         All other parameters are directly passed to the function when it starts running.
 
         :type func: callable or str
@@ -66,6 +111,17 @@ class Queue(object):
         job_id = self.storage.enqueue_job(job, self.name)
         return job_id
 
+    def enqueue_many(self, jobs):
+        """
+        Enqueue many Job objects at once, in a single transaction, rather than committing each one separately.
+
+        :type jobs: list of Job
+        :return: a list of the job_ids of the jobs.
+        """
+        for job in jobs:
+            job.state = State.QUEUED
+        return self.storage.enqueue_jobs(jobs, self.name)
+
     def cancel(self, job_id):
         """
         Mark a job as canceling, and let the worker pick this up to initiate
@@ -96,6 +152,13 @@ class Queue(object):
         """
         self.storage.clear(force=True, queue=self.name)
 
+    def restart(self):
+        """
+        Requeue resumable jobs that were interrupted when the workers were stopped, so that they
+        resume from their last checkpoint, and clear all other jobs.
+        """
+        self.storage.restart_queue(self.name)
+
     def clear(self):
         """
         Clear all succeeded, failed, or cancelled jobs.
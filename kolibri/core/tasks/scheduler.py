@@ -1,9 +1,11 @@
-import time
+import copy
+import threading
 from datetime import datetime
 from datetime import timedelta
 
 from sqlalchemy import Column
 from sqlalchemy import DateTime
+from sqlalchemy import func
 from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import PickleType
@@ -13,15 +15,23 @@ from sqlalchemy.ext.declarative import declarative_base
 from kolibri.core.tasks.exceptions import JobNotFound
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
+from kolibri.core.tasks.notifications import add_listener
+from kolibri.core.tasks.notifications import notify_workers
+from kolibri.core.tasks.notifications import remove_listener
 from kolibri.core.tasks.queue import Queue
 from kolibri.core.tasks.storage import StorageMixin
-from kolibri.core.tasks.utils import InfiniteLoopThread
+from kolibri.core.tasks.utils import NotifiedLoopThread
 from kolibri.utils.conf import OPTIONS
 from kolibri.utils.time_utils import local_now
 from kolibri.utils.time_utils import naive_utc_datetime
 
 Base = declarative_base()
 
+# The longest time, in seconds, that the scheduler waits before checking for due jobs. The scheduler
+# waits until the next job is due, and is notified whenever a job is scheduled, so this is only a
+# fallback in case a notification is missed.
+SCHEDULE_CHECK_INTERVAL = 60
+
 
 class ScheduledJob(Base):
     """
@@ -63,6 +73,8 @@ class Scheduler(StorageMixin):
             self.queue = queue(connection=connection)
 
         self._schedule_checker = None
+        # Set to wake the schedule checker, whenever a job may have been scheduled
+        self._wakeup_event = threading.Event()
 
         super(Scheduler, self).__init__(connection, Base=Base)
 
@@ -97,15 +109,22 @@ class Scheduler(StorageMixin):
                 session.merge(scheduled_job)
             else:
                 raise ValueError("Job not in scheduled jobs queue")
+        notify_workers()
 
     def start_schedule_checker(self):
         """
-        Starts up the job checker thread, that starts scheduled jobs when there are workers free,
-        and checks for cancellation requests for jobs currently assigned to a worker.
+        Starts up the schedule checker thread, that enqueues scheduled jobs when they are due.
+        It runs when the next scheduled job is due, and whenever it is notified that a job has been scheduled.
         Returns: the Thread object.
         """
-        t = InfiniteLoopThread(
-            self.check_schedule, thread_name="SCHEDULECHECKER", wait_between_runs=0.5
+        add_listener(self._wakeup_event)
+        # Check for jobs that became due while the scheduler wasn't running straight away
+        self._wakeup_event.set()
+        t = NotifiedLoopThread(
+            self.check_schedule,
+            thread_name="SCHEDULECHECKER",
+            wakeup_event=self._wakeup_event,
+            wait_between_runs=SCHEDULE_CHECK_INTERVAL,
         )
         t.start()
         return t
@@ -123,6 +142,7 @@ class Scheduler(StorageMixin):
 
     def shutdown_scheduler(self):
         if self._schedule_checker:
+            remove_listener(self._wakeup_event)
             self._schedule_checker.stop()
 
     def enqueue_at(self, dt, func, *args, **kwargs):
@@ -173,7 +193,8 @@ class Scheduler(StorageMixin):
             )
             session.merge(scheduled_job)
 
-            return job.job_id
+        notify_workers()
+        return job.job_id
 
     def get_jobs(self):
         with self.session_scope() as s:
@@ -211,34 +232,46 @@ class Scheduler(StorageMixin):
         self.cancel(None)
 
     def check_schedule(self):
-        start = time.time()
+        """
+        Enqueue all the jobs that are due, in a single transaction, and reschedule those that repeat.
+        Returns: the number of seconds until the next scheduled job is due, or None if there are none.
+        """
         naive_utc_now = datetime.utcnow()
         with self.session_scope() as s:
-            scheduled_jobs = self._ns_query(s).filter(
-                ScheduledJob.scheduled_time <= naive_utc_now
+            scheduled_jobs = (
+                self._ns_query(s)
+                .filter(ScheduledJob.scheduled_time <= naive_utc_now)
+                .all()
             )
+            jobs_for_queue = []
             for scheduled_job in scheduled_jobs:
-                new_repeat = 0
-                repeat = False
-                if scheduled_job.repeat is None:
-                    new_repeat = None
-                    repeat = True
-                elif scheduled_job.repeat > 0:
-                    new_repeat = scheduled_job.repeat - 1
-                    repeat = True
-                job_for_queue = scheduled_job.obj
-                self.queue.enqueue(job_for_queue)
-                if repeat:
+                # Enqueue a copy of the job, so that the scheduled job is left unchanged
+                job_for_queue = copy.copy(scheduled_job.obj)
+                job_for_queue.state = State.QUEUED
+                jobs_for_queue.append(job_for_queue)
+                if scheduled_job.repeat is None or scheduled_job.repeat > 0:
                     # Update this scheduled job to repeat this
-                    self.schedule(
-                        self._now() + timedelta(seconds=scheduled_job.interval),
-                        job_for_queue,
-                        interval=scheduled_job.interval,
-                        repeat=new_repeat,
+                    if scheduled_job.repeat is not None:
+                        scheduled_job.repeat -= 1
+                    scheduled_job.scheduled_time = naive_utc_datetime(
+                        self._now() + timedelta(seconds=scheduled_job.interval)
                     )
                 else:
                     s.delete(scheduled_job)
-            return time.time() - start
+            if jobs_for_queue:
+                self.queue.storage.enqueue_jobs(
+                    jobs_for_queue, self.queue.name, session=s
+                )
+            next_scheduled_time = (
+                s.query(func.min(ScheduledJob.scheduled_time))
+                .filter(ScheduledJob.queue == self.queue.name)
+                .scalar()
+            )
+        if jobs_for_queue:
+            notify_workers()
+        if next_scheduled_time is None:
+            return None
+        return (next_scheduled_time - datetime.utcnow()).total_seconds()
 
     def _ns_query(self, session):
         """
@@ -1,26 +1,39 @@
 import logging
+from collections import Counter
 from contextlib import contextmanager
-from copy import copy
+from datetime import datetime
+from datetime import timedelta
 
+import pytz
+from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import DateTime
+from sqlalchemy import Float
 from sqlalchemy import func
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import or_
 from sqlalchemy import PickleType
 from sqlalchemy import String
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from kolibri.core.tasks.exceptions import JobNotFound
+from kolibri.core.tasks.job import JobStatus
+from kolibri.core.tasks.job import Priority
+from kolibri.core.tasks.job import Resource
 from kolibri.core.tasks.job import State
+from kolibri.core.tasks.notifications import notify_workers
 from kolibri.utils.conf import OPTIONS
 
 Base = declarative_base()
 
 logger = logging.getLogger(__name__)
 
+FINISHED_STATES = (State.COMPLETED, State.FAILED, State.CANCELED)
+
 
 class ORMJob(Base):
     """
@@ -40,15 +53,65 @@ class ORMJob(Base):
     # The job's order in the entire global queue of jobs.
     queue_order = Column(Integer, autoincrement=True)
 
+    # The job's priority, queued jobs are started in order of priority and then queue_order.
+    priority = Column(Integer, default=Priority.REGULAR, index=True)
+
+    # A comma separated list of the resources that the job uses.
+    resources = Column(String, nullable=True)
+
     # The queue name passed to the client when the job is scheduled.
     queue = Column(String, index=True)
 
     # The original Job object, pickled here for so we can easily access it.
     obj = Column(PickleType(protocol=OPTIONS["Python"]["PICKLE_PROTOCOL"]))
 
+    # The parts of the job that change while it runs. These are stored in their own
+    # columns so that they can be updated and read without repickling the job object,
+    # and override the corresponding attributes of the pickled job when it is read.
+    progress = Column(Float, default=0)
+
+    total_progress = Column(Float, default=0)
+
+    cancellable = Column(Boolean, default=False)
+
+    # Whether the job can be resumed from its checkpoint if the workers are restarted while it runs
+    resumable = Column(Boolean, default=False)
+
+    checkpoint = Column(
+        PickleType(protocol=OPTIONS["Python"]["PICKLE_PROTOCOL"]), nullable=True
+    )
+
+    extra_metadata = Column(
+        PickleType(protocol=OPTIONS["Python"]["PICKLE_PROTOCOL"]), nullable=True
+    )
+
+    exception = Column(String, nullable=True)
+
+    traceback = Column(String, nullable=True)
+
     time_created = Column(DateTime(timezone=True), server_default=func.now())
+    # The time that the job's state last changed.
     time_updated = Column(DateTime(timezone=True), server_onupdate=func.now())
 
+    # The job revision of the last change to the job, see JobRevision.
+    revision = Column(Integer, default=0, index=True)
+
+    __table_args__ = (Index("queue__state__queue_order", queue, state, queue_order),)
+
+
+class JobRevision(Base):
+    """
+    A single row counter of the changes to the jobs table, incremented in the same transaction
+    as every change to a job, so that readers can cheaply check whether any job has changed,
+    and find the jobs that have changed since a given revision.
+    """
+
+    __tablename__ = "job_revision"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+
+    revision = Column(Integer, default=0)
+
 
 class StorageMixin(object):
     def __init__(self, connection, Base=Base):
@@ -75,6 +138,28 @@ class StorageMixin(object):
         self.Base.metadata.drop_all(self.engine)
         self.Base.metadata.create_all(self.engine)
 
+    def vacuum(self, min_free_fraction=0):
+        """
+        Rebuild the database file to reclaim the space left by deleted rows.
+        Only supported for SQLite, and skipped unless at least min_free_fraction
+        of the pages of the database file are free.
+
+        :return: True if the database was vacuumed.
+        """
+        if self.engine.name != "sqlite":
+            return False
+        try:
+            page_count = self.engine.execute("PRAGMA page_count;").scalar()
+            free_count = self.engine.execute("PRAGMA freelist_count;").scalar()
+            if not free_count or free_count < page_count * min_free_fraction:
+                return False
+            self.engine.execute("VACUUM;")
+        except OperationalError as e:
+            # The vacuum fails if another connection is writing to the database
+            logger.warning("Unable to vacuum the job storage database: {}".format(e))
+            return False
+        return True
+
     def set_sqlite_pragmas(self):
         """
         Sets the connection PRAGMAs for the sqlalchemy engine stored in self.engine.
@@ -90,7 +175,68 @@ class StorageMixin(object):
             pass
 
 
+def _within_resource_limits(resources, usage, resource_limits):
+    for resource in resources.split(",") if resources else []:
+        limit = resource_limits.get(Resource.get_class(resource))
+        if limit is not None and usage[resource] >= limit:
+            return False
+    return True
+
+
+# Job columns that are updated too often to change the job revision when they are updated alone
+_PROGRESS_COLUMNS = {"progress", "total_progress"}
+
+
 class Storage(StorageMixin):
+    def __init__(self, connection, Base=Base):
+        super(Storage, self).__init__(connection, Base=Base)
+        self._create_revision()
+
+    def recreate_tables(self):
+        super(Storage, self).recreate_tables()
+        self._create_revision()
+
+    def _create_revision(self):
+        """
+        Create the single row of the job revision table, if it does not exist yet.
+        """
+        try:
+            with self.session_scope() as s:
+                if not s.query(JobRevision.id).filter_by(id=1).count():
+                    s.add(JobRevision(id=1, revision=0))
+        except IntegrityError:
+            # Created by another process since we checked
+            pass
+
+    @contextmanager
+    def session_scope(self):
+        """
+        As StorageMixin.session_scope, but notifies the workers, and anything else waiting for
+        changes to the jobs, once a change to the job revision has been committed.
+        """
+        with super(Storage, self).session_scope() as session:
+            yield session
+        if session.info.pop("revision_changed", False):
+            notify_workers()
+
+    def _next_revision(self, session):
+        """
+        Increment the job revision within the session's transaction, and return the new revision.
+        """
+        session.query(JobRevision).filter_by(id=1).update(
+            {JobRevision.revision: JobRevision.revision + 1},
+            synchronize_session=False,
+        )
+        session.info["revision_changed"] = True
+        return session.query(JobRevision.revision).filter_by(id=1).scalar()
+
+    def get_revision(self):
+        """
+        Return the current job revision, which changes whenever any job is added, updated or deleted.
+        """
+        with self.session_scope() as s:
+            return s.query(JobRevision.revision).filter_by(id=1).scalar() or 0
+
     def _add_save_meta_method(self, job):
         """
         Adds a save_meta method to a job object so that a job
@@ -100,6 +246,24 @@ class Storage(StorageMixin):
         job.save_meta_method = self.save_job_meta
         return job
 
+    def _job_from_orm_job(self, orm_job):
+        """
+        Return the job object of an ORMJob, updated with the values of its job columns.
+        """
+        job = orm_job.obj
+        job.state = orm_job.state
+        job.progress = orm_job.progress or 0
+        job.total_progress = orm_job.total_progress or 0
+        job.cancellable = bool(orm_job.cancellable)
+        job.checkpoint = orm_job.checkpoint or {}
+        if orm_job.extra_metadata is not None:
+            job.extra_metadata = orm_job.extra_metadata
+        if orm_job.exception is not None:
+            job.exception = orm_job.exception
+        if orm_job.traceback is not None:
+            job.traceback = orm_job.traceback
+        return self._add_save_meta_method(job)
+
     def enqueue_job(self, j, queue):
         """
         Add the job given by j to the job queue.
@@ -107,22 +271,69 @@ class Storage(StorageMixin):
         Note: Does not actually run the job.
         """
         with self.session_scope() as session:
-            orm_job = session.query(ORMJob).get(j.job_id)
-            if orm_job and orm_job.state not in [
-                State.COMPLETED,
-                State.FAILED,
-                State.CANCELED,
-            ]:
-                # If this job is already queued or running, don't try to replace it.
-                return j.job_id
-            orm_job = ORMJob(id=j.job_id, state=j.state, queue=queue, obj=j)
-            session.merge(orm_job)
+            self._add_jobs(session, [j], queue)
             try:
                 session.commit()
             except Exception as e:
                 logger.error("Got an error running session.commit(): {}".format(e))
+                return j.job_id
 
-            return j.job_id
+        return j.job_id
+
+    def enqueue_jobs(self, jobs, queue, session=None):
+        """
+        Add the jobs to the job queue in a single transaction.
+
+        :param session: a session to add the jobs in, so that they are committed along with the other
+        changes made in it. The caller is responsible for committing it and notifying the workers.
+        If not given, the jobs are committed in a new session.
+        :return: the job_ids of the jobs.
+        """
+        if session is not None:
+            self._add_jobs(session, jobs, queue)
+        else:
+            with self.session_scope() as session:
+                self._add_jobs(session, jobs, queue)
+        return [j.job_id for j in jobs]
+
+    def _add_jobs(self, session, jobs, queue):
+        job_ids = [j.job_id for j in jobs]
+        # Jobs that are already queued or running are not replaced
+        unfinished_job_ids = set()
+        for i in range(0, len(job_ids), 500):
+            unfinished_job_ids.update(
+                job_id
+                for (job_id,) in session.query(ORMJob.id).filter(
+                    ORMJob.id.in_(job_ids[i : i + 500]),
+                    ORMJob.state.notin_(FINISHED_STATES),
+                )
+            )
+        jobs = [j for j in jobs if j.job_id not in unfinished_job_ids]
+        if not jobs:
+            return
+        queue_order = session.query(func.max(ORMJob.queue_order)).scalar() or 0
+        revision = self._next_revision(session)
+        for j in jobs:
+            queue_order += 1
+            orm_job = ORMJob(
+                id=j.job_id,
+                state=j.state,
+                queue=queue,
+                queue_order=queue_order,
+                revision=revision,
+                obj=j,
+                priority=j.priority,
+                resources=",".join(j.resources),
+                progress=j.progress,
+                total_progress=j.total_progress,
+                cancellable=j.cancellable,
+                resumable=j.resumable,
+                checkpoint=None,
+                extra_metadata=j.extra_metadata,
+                exception=None,
+                traceback=None,
+            )
+            session.merge(orm_job)
 
     def mark_job_as_canceled(self, job_id):
         """
@@ -141,17 +352,46 @@ class Storage(StorageMixin):
         """
         self._update_job(job_id, State.CANCELING)
 
-    def get_next_queued_job(self, queues):
+    def _get_running_resource_usage(self, session):
+        """
+        Return a Counter of the number of running jobs using each resource.
+        """
+        usage = Counter()
+        for (resources,) in session.query(ORMJob.resources).filter(
+            ORMJob.state == State.RUNNING, ORMJob.resources != ""
+        ):
+            usage.update(resources.split(","))
+        return usage
+
+    def get_next_queued_job(self, queues, resource_limits=None):
+        """
+        Return the queued job in any of the queues that should be started next,
+        in order of priority, and then of when it was queued.
+
+        :param resource_limits: a dict of the maximum number of running jobs that can use
+        any one resource of a resource class at once, keyed by resource class. Jobs that
+        would exceed a limit are skipped until the running jobs using the resource finish.
+        """
         with self.session_scope() as s:
-            orm_job = (
+            query = (
                 s.query(ORMJob)
                 .filter(ORMJob.queue.in_(queues))
                 .filter_by(state=State.QUEUED)
-                .order_by(ORMJob.queue_order)
-                .first()
+                .order_by(ORMJob.priority, ORMJob.queue_order)
             )
+            if not resource_limits:
+                orm_job = query.first()
+            else:
+                orm_job = None
+                usage = self._get_running_resource_usage(s)
+                for job_id, resources in query.with_entities(
+                    ORMJob.id, ORMJob.resources
+                ):
+                    if _within_resource_limits(resources, usage, resource_limits):
+                        orm_job = s.query(ORMJob).get(job_id)
+                        break
             if orm_job:
-                job = self._add_save_meta_method(orm_job.obj)
+                job = self._job_from_orm_job(orm_job)
             else:
                 job = None
             return job
@@ -164,12 +404,68 @@ class Storage(StorageMixin):
                 .filter_by(state=State.CANCELING)
                 .order_by(ORMJob.queue_order)
             )
-            return [self._add_save_meta_method(job.obj) for job in jobs]
+            return [self._job_from_orm_job(job) for job in jobs]
 
     def get_all_jobs(self, queue):
         with self.session_scope() as s:
             orm_jobs = s.query(ORMJob).filter(ORMJob.queue == queue).all()
-            return [self._add_save_meta_method(o.obj) for o in orm_jobs]
+            return [self._job_from_orm_job(o) for o in orm_jobs]
+
+    def get_all_job_statuses(self, queue):
+        """
+        Return the JobStatus of every job in the queue, read only from the job columns,
+        without unpickling any of the jobs.
+        """
+        with self.session_scope() as s:
+            rows = s.query(
+                ORMJob.id,
+                ORMJob.state,
+                ORMJob.progress,
+                ORMJob.total_progress,
+                ORMJob.cancellable,
+                ORMJob.extra_metadata,
+                ORMJob.exception,
+                ORMJob.traceback,
+            ).filter(ORMJob.queue == queue)
+            return [JobStatus(*row) for row in rows]
+
+    def get_job_statuses_since(self, queue, revision):
+        """
+        Return the JobStatus of every job in the queue that has changed since the given job revision,
+        and of every running job, as updates to the progress of a job do not change the job revision.
+        """
+        with self.session_scope() as s:
+            rows = s.query(
+                ORMJob.id,
+                ORMJob.state,
+                ORMJob.progress,
+                ORMJob.total_progress,
+                ORMJob.cancellable,
+                ORMJob.extra_metadata,
+                ORMJob.exception,
+                ORMJob.traceback,
+            ).filter(
+                ORMJob.queue == queue,
+                or_(ORMJob.revision > revision, ORMJob.state == State.RUNNING),
+            )
+            return [JobStatus(*row) for row in rows.order_by(ORMJob.revision)]
+
+    def get_running_job_progress(self, queue):
+        """
+        Return the id, progress and total progress of every running job in the queue, which can
+        change without the job revision changing.
+        """
+        with self.session_scope() as s:
+            return [
+                tuple(row)
+                for row in s.query(
+                    ORMJob.id, ORMJob.progress, ORMJob.total_progress
+                ).filter(ORMJob.queue == queue, ORMJob.state == State.RUNNING)
+            ]
+
+    def get_job_ids(self, queue):
+        with self.session_scope() as s:
+            return [job_id for (job_id,) in s.query(ORMJob.id).filter_by(queue=queue)]
 
     def count_all_jobs(self, queue):
         with self.session_scope() as s:
@@ -207,7 +503,83 @@ class Storage(StorageMixin):
                     )
                 )
 
-            q.delete(synchronize_session=False)
+            if q.delete(synchronize_session=False):
+                self._next_revision(s)
+
+    def delete_old_jobs(self, max_age=None, max_count=None, queue=None):
+        """
+        Delete finished jobs, COMPLETED, FAILED, or CANCELED, that are past their retention.
+        :type max_age: NoneType or int
+        :param max_age: delete the jobs that finished more than this many seconds ago.
+        :type max_count: NoneType or int
+        :param max_count: delete all but the max_count most recently queued finished jobs of each queue.
+        :type queue: NoneType or str
+        :param queue: the queue to delete jobs from. If None, delete jobs from all queues.
+        :return: the number of jobs deleted.
+        """
+        deleted = 0
+        with self.session_scope() as s:
+            finished = s.query(ORMJob).filter(ORMJob.state.in_(FINISHED_STATES))
+            if queue:
+                finished = finished.filter(ORMJob.queue == queue)
+            if max_age is not None:
+                cutoff = datetime.now(pytz.utc) - timedelta(seconds=max_age)
+                deleted += finished.filter(
+                    or_(
+                        ORMJob.time_updated < cutoff,
+                        ORMJob.time_updated.is_(None) & (ORMJob.time_created < cutoff),
+                    )
+                ).delete(synchronize_session=False)
+            if max_count is not None:
+                queues = (
+                    [queue]
+                    if queue
+                    else [q for (q,) in s.query(ORMJob.queue).distinct()]
+                )
+                for q in queues:
+                    newest_deleted = (
+                        finished.filter(ORMJob.queue == q)
+                        .with_entities(ORMJob.queue_order)
+                        .order_by(ORMJob.queue_order.desc())
+                        .offset(max_count)
+                        .limit(1)
+                        .scalar()
+                    )
+                    if newest_deleted is not None:
+                        deleted += finished.filter(
+                            ORMJob.queue == q, ORMJob.queue_order <= newest_deleted
+                        ).delete(synchronize_session=False)
+            if deleted:
+                self._next_revision(s)
+        return deleted
+
+    def restart_queue(self, queue):
+        """
+        Reset the jobs in the queue for when its workers are started: resumable jobs that were
+        queued or running when the workers stopped are requeued, to resume from their checkpoints,
+        and all other jobs are cleared.
+        :return: the number of requeued jobs.
+        """
+        interrupted_states = (State.QUEUED, State.RUNNING)
+        with self.session_scope() as s:
+            jobs = s.query(ORMJob).filter_by(queue=queue)
+            deleted = jobs.filter(
+                or_(
+                    ORMJob.resumable.isnot(True),
+                    ORMJob.state.notin_(interrupted_states),
+                )
+            ).delete(synchronize_session=False)
+            requeued = jobs.update(
+                {
+                    "state": State.QUEUED,
+                    "time_updated": datetime.now(pytz.utc),
+                    "revision": self._next_revision(s),
+                },
+                synchronize_session=False,
+            )
+            if deleted and not requeued:
+                self._next_revision(s)
+        return requeued
 
     def update_job_progress(self, job_id, progress, total_progress):
         """
@@ -234,7 +606,9 @@ class Storage(StorageMixin):
         Returns: None
 
         """
-        self._update_job(job_id, State.FAILED, exception=exception, traceback=traceback)
+        self._update_job(
+            job_id, State.FAILED, exception=str(exception), traceback=str(traceback)
+        )
 
     def mark_job_as_running(self, job_id):
         self._update_job(job_id, State.RUNNING)
@@ -245,46 +619,44 @@ class Storage(StorageMixin):
     def save_job_meta(self, job):
         self._update_job(job.job_id, extra_metadata=job.extra_metadata)
 
+    def save_job_checkpoint(self, job):
+        self._update_job(job.job_id, checkpoint=job.checkpoint)
+
     def save_job_as_cancellable(self, job_id, cancellable=True):
         self._update_job(job_id, cancellable=cancellable)
 
     def _update_job(self, job_id, state=None, **kwargs):
+        """
+        Update the job columns of the job given by job_id, in a single UPDATE statement.
+        The pickled job object is not changed, as the job columns override it when it is read.
+        """
+        values = kwargs
+        if state is not None:
+            values["state"] = state
+            values["time_updated"] = datetime.now(pytz.utc)
         with self.session_scope() as session:
-            try:
-                job, orm_job = self._get_job_and_orm_job(job_id, session)
-                # Note (aron): looks like SQLAlchemy doesn't automatically
-                # save any pickletype fields even if we re-set (orm_job.obj = job) that
-                # field. My hunch is that it's tracking the id of the object,
-                # and if that doesn't change, then SQLAlchemy doesn't repickle the object
-                # and save to the DB.
-                # Our hack here is to just copy the job object, and then set thespecific
-                # field we want to edit, in this case the job.state. That forces
-                # SQLAlchemy to re-pickle the object, thus setting it to the correct state.
-                job = copy(job)
-                if state is not None:
-                    orm_job.state = job.state = state
-                for kwarg in kwargs:
-                    setattr(job, kwarg, kwargs[kwarg])
-                orm_job.obj = job
-                session.add(orm_job)
-                return job, orm_job
-            except JobNotFound:
-                if state:
-                    logger.error(
-                        "Tried to update job with id {} with state {} but it was not found".format(
-                            job_id, state
-                        )
-                    )
-                else:
-                    logger.error(
-                        "Tried to update job with id {} but it was not found".format(
-                            job_id
-                        )
+            if set(values) - _PROGRESS_COLUMNS:
+                values["revision"] = self._next_revision(session)
+            updated = (
+                session.query(ORMJob)
+                .filter_by(id=job_id)
+                .update(values, synchronize_session=False)
+            )
+        if not updated:
+            if state:
+                logger.error(
+                    "Tried to update job with id {} with state {} but it was not found".format(
+                        job_id, state
                     )
+                )
+            else:
+                logger.error(
+                    "Tried to update job with id {} but it was not found".format(job_id)
+                )
 
     def _get_job_and_orm_job(self, job_id, session):
         orm_job = session.query(ORMJob).filter_by(id=job_id).one_or_none()
         if orm_job is None:
             raise JobNotFound()
-        job = self._add_save_meta_method(orm_job.obj)
+        job = self._job_from_orm_job(orm_job)
         return job, orm_job
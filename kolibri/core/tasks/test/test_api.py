@@ -1,3 +1,6 @@
+import threading
+import time
+
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.core.urlresolvers import reverse
@@ -21,6 +24,7 @@ from kolibri.core.auth.test.test_api import FacilityUserFactory
 from kolibri.core.device.models import DevicePermissions
 from kolibri.core.device.models import DeviceSettings
 from kolibri.core.discovery.utils.network.errors import NetworkLocationNotFound
+from kolibri.core.tasks.api import _import_channel_unless_resumed
 from kolibri.core.tasks.api import prepare_sync_task
 from kolibri.core.tasks.api import ResourceGoneError
 from kolibri.core.tasks.api import validate_and_prepare_peer_sync_job
@@ -28,6 +32,8 @@ from kolibri.core.tasks.api import validate_prepare_sync_job
 from kolibri.core.tasks.exceptions import JobNotFound
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
+from kolibri.core.tasks.main import priority_queue
+from kolibri.core.tasks.main import queue
 
 DUMMY_PASSWORD = "password"
 
@@ -92,7 +98,7 @@ class TaskAPITestCase(BaseAPITestCase):
 
     def test_tasks_clearable_flag(self, queue_mock):
         with patch(
-            "kolibri.core.tasks.queue.Queue.jobs", new_callable=PropertyMock
+            "kolibri.core.tasks.queue.Queue.job_statuses", new_callable=PropertyMock
         ) as jobs_mock:
             jobs_mock.return_value = [
                 fake_job(state=state)
@@ -119,6 +125,100 @@ class TaskAPITestCase(BaseAPITestCase):
                 assert_clearable(i, True)
 
 
+class TaskChangesAPITestCase(BaseAPITestCase):
+    def setUp(self):
+        super(TaskChangesAPITestCase, self).setUp()
+        queue.empty()
+        priority_queue.empty()
+        self.job_id = queue.enqueue(id, extra_metadata={"type": "TEST"})
+
+    def tearDown(self):
+        queue.empty()
+        priority_queue.empty()
+
+    def test_list_not_modified(self):
+        response = self.client.get(reverse("kolibri:core:task-list"))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse("kolibri:core:task-list"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes(self):
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t["id"] for t in response.data["tasks"]], [self.job_id])
+        self.assertEqual(response.data["task_ids"], [self.job_id])
+        revision = response.data["revision"]
+
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        new_job_id = queue.enqueue(id, extra_metadata={"type": "TEST"})
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"), {"since": revision}
+        )
+        self.assertEqual([t["id"] for t in response.data["tasks"]], [new_job_id])
+        self.assertEqual(set(response.data["task_ids"]), {self.job_id, new_job_id})
+        self.assertGreater(response.data["revision"], revision)
+
+    def test_changes_wait_times_out(self):
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"),
+            {"since": response.data["revision"], "wait": 0.1},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_wait_woken_by_change(self):
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+        revision = response.data["revision"]
+        timer = threading.Timer(
+            0.2, queue.enqueue, args=(id,), kwargs={"extra_metadata": {"type": "TEST"}}
+        )
+        timer.start()
+        start = time.time()
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"), {"since": revision, "wait": 10}
+        )
+        timer.join()
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.data["revision"], revision)
+
+    def test_changes_wait_limited_waiters(self):
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+        with patch(
+            "kolibri.core.tasks.api._changes_waiters", threading.BoundedSemaphore(1)
+        ) as waiters:
+            waiters.acquire()
+            start = time.time()
+            response = self.client.get(
+                reverse("kolibri:core:task-changes"),
+                {"since": response.data["revision"], "wait": 10},
+                HTTP_IF_NONE_MATCH=response["ETag"],
+            )
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_include_running_job_progress(self):
+        queue.storage.mark_job_as_running(self.job_id)
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+        revision = response.data["revision"]
+        queue.storage.update_job_progress(self.job_id, 5, 10)
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"),
+            {"since": revision},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["revision"], revision)
+        self.assertEqual(response.data["tasks"][0]["percentage"], 0.5)
+
+
 class TaskAPIPermissionsTestCase(APITestCase):
     def setUp(self):
         DeviceSettings.objects.create(is_provisioned=True)
@@ -720,3 +820,36 @@ class FacilityTaskHelperTestCase(TestCase):
 
         with self.assertRaises(AuthenticationFailed):
             validate_and_prepare_peer_sync_job(req, extra_metadata=dict(type="test"))
+
+
+@patch("kolibri.core.tasks.api.call_command")
+class ImportChannelUnlessResumedTestCase(TestCase):
+    def test_no_job(self, call_command_mock):
+        _import_channel_unless_resumed(None, "network", "channel_id")
+        call_command_mock.assert_called_once_with(
+            "importchannel", "network", "channel_id"
+        )
+
+    def test_saves_checkpoint(self, call_command_mock):
+        job = Job(id, resumable=True)
+        job.save_checkpoint_method = Mock()
+        _import_channel_unless_resumed(job, "network", "channel_id")
+        call_command_mock.assert_called_once_with(
+            "importchannel", "network", "channel_id"
+        )
+        job.save_checkpoint_method.assert_called_once_with(job)
+        self.assertTrue(job.checkpoint["channel_imported"])
+
+    def test_skips_imported_channel(self, call_command_mock):
+        job = Job(id, resumable=True)
+        job.checkpoint = {"channel_imported": True}
+        _import_channel_unless_resumed(job, "network", "channel_id")
+        call_command_mock.assert_not_called()
+
+    def test_not_resumable(self, call_command_mock):
+        job = Job(id)
+        _import_channel_unless_resumed(job, "network", "channel_id")
+        call_command_mock.assert_called_once_with(
+            "importchannel", "network", "channel_id"
+        )
+        self.assertEqual(job.checkpoint, {})
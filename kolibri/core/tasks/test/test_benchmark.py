@@ -0,0 +1,45 @@
+import json
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from mock import patch
+from six import StringIO
+
+from kolibri.core.tasks import benchmark
+
+
+class BenchmarkTasksTestCase(SimpleTestCase):
+    def test_results_are_json(self):
+        results = benchmark.run_benchmarks(
+            num_jobs=3,
+            num_workers=2,
+            stores=(benchmark.SQLITE, benchmark.POSTGRES),
+            modes=(benchmark.THREAD,),
+            num_cancels=1,
+        )
+        results = json.loads(json.dumps(results))
+
+        sqlite = results["stores"][benchmark.SQLITE]
+        self.assertEqual(sqlite["enqueue"]["jobs"], 3)
+        self.assertEqual(sqlite["progress_update"]["count"], 3)
+        thread = sqlite["modes"][benchmark.THREAD]
+        for kind in benchmark.KINDS:
+            self.assertEqual(thread["dispatch"][kind]["failed"], 0)
+            self.assertEqual(thread["dispatch"][kind]["latency"]["count"], 3)
+        self.assertEqual(thread["cancel"]["count"], 1)
+        # Postgres is skipped without a URL
+        self.assertIn("skipped", results["stores"][benchmark.POSTGRES])
+
+    def test_command_writes_json(self):
+        out = StringIO()
+        with patch("sys.stdout", out):
+            call_command(
+                "benchmarktasks",
+                jobs=1,
+                cancels=1,
+                modes=benchmark.THREAD,
+                kinds=benchmark.NOOP,
+                stderr=StringIO(),
+            )
+        results = json.loads(out.getvalue())
+        self.assertIn(benchmark.SQLITE, results["stores"])
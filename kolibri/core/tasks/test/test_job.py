@@ -24,3 +24,15 @@ class JobTest(TestCase):
         cancellable = not self.job.cancellable
         with self.assertRaises(ReferenceError):
             self.job.save_as_cancellable(cancellable=cancellable)
+
+    def test_job_save_checkpoint(self):
+        callback = mock.Mock()
+        self.job.save_checkpoint_method = callback
+        self.job.checkpoint["done"] = True
+
+        self.job.save_checkpoint()
+        callback.assert_called_once_with(self.job)
+
+    def test_job_save_checkpoint__no_callback(self):
+        with self.assertRaises(ReferenceError):
+            self.job.save_checkpoint()
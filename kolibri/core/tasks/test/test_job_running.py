@@ -273,6 +273,25 @@ class TestQueue(object):
         # and hopefully it's canceled by this point
         assert job.state == State.CANCELED
 
+    def test_interrupted_resumable_job_is_requeued(self, inmem_queue):
+        job_id = inmem_queue.enqueue(cancelable_job, cancellable=True, resumable=True)
+
+        interval = 0.1
+        time_spent = 0
+        job = inmem_queue.fetch_job(job_id)
+        while job.state != State.RUNNING:
+            time.sleep(interval)
+            time_spent += interval
+            job = inmem_queue.fetch_job(job_id)
+            assert time_spent < 5
+
+        # Stopping the workers interrupts the job, rather than cancelling it
+        inmem_queue.e.shutdown(wait=True)
+        assert inmem_queue.fetch_job(job_id).state == State.RUNNING
+
+        inmem_queue.restart()
+        assert inmem_queue.fetch_job(job_id).state == State.QUEUED
+
     def test_can_cancel_a_job_that_updates_progress(self, inmem_queue):
         job_id = inmem_queue.enqueue(
             update_progress_cancelable_job, cancellable=True, track_progress=True
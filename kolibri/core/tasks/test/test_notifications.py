@@ -0,0 +1,90 @@
+import os
+import socket
+import threading
+import time
+
+from mock import patch
+
+from kolibri.core.tasks import notifications
+
+
+def send_datagram(port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(b"1", (notifications.NOTIFICATION_HOST, port))
+    finally:
+        sock.close()
+
+
+class TestNotifications:
+    def setup_method(self):
+        self.event = threading.Event()
+        notifications.add_listener(self.event)
+
+    def teardown_method(self):
+        notifications.remove_listener(self.event)
+
+    def test_notify_workers_sets_event(self):
+        notifications.notify_workers()
+        assert self.event.wait(1)
+
+    def test_datagram_from_other_process_sets_event(self):
+        port = notifications._listener.port
+        assert port in notifications._read_notification_ports()
+        send_datagram(port)
+        assert self.event.wait(1)
+
+    def test_notify_workers_notifies_all_other_processes(self):
+        other_sockets = []
+        try:
+            for _ in range(2):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.bind((notifications.NOTIFICATION_HOST, 0))
+                sock.settimeout(1)
+                other_sockets.append(sock)
+                notifications._register_port(sock.getsockname()[1])
+            notifications.notify_workers()
+            for sock in other_sockets:
+                assert sock.recv(1) == b"1"
+        finally:
+            for sock in other_sockets:
+                notifications._unregister_port(sock.getsockname()[1])
+                sock.close()
+
+    def test_stale_ports_removed(self):
+        notifications._register_port(1)
+        with open(notifications._get_port_file_path(1), "w") as f:
+            f.write("{}".format(os.getpid() + 1))
+        with patch.object(notifications, "pid_exists", return_value=False):
+            notifications._remove_stale_ports()
+        assert 1 not in notifications._read_notification_ports()
+        assert notifications._listener.port in notifications._read_notification_ports()
+
+    def test_listener_survives_socket_error(self):
+        listener = notifications._listener
+        old_port = listener.port
+        # closing the socket from under the listener makes it fail to receive
+        listener.socket.close()
+        send_datagram(old_port)
+        start = time.time()
+        while (
+            listener.port == old_port
+            or listener.port not in notifications._read_notification_ports()
+        ) and time.time() - start < 2:
+            time.sleep(0.01)
+        assert listener.is_alive()
+        assert listener.port != old_port
+        assert listener.port in notifications._read_notification_ports()
+        assert old_port not in notifications._read_notification_ports()
+        self.event.clear()
+        send_datagram(listener.port)
+        assert self.event.wait(1)
+
+    def test_remove_last_listener_stops_listener(self):
+        listener = notifications._listener
+        notifications.remove_listener(self.event)
+        listener.join(1)
+        assert not listener.is_alive()
+        assert notifications._listener is None
+        assert not os.path.exists(notifications._get_port_file_path(listener.port))
+        notifications.add_listener(self.event)
@@ -0,0 +1,50 @@
+import time
+
+from mock import Mock
+
+from kolibri.core.tasks.progress import ProgressAggregator
+
+
+class TestProgressAggregator:
+    def test_first_update_written_immediately(self):
+        write = Mock()
+        aggregator = ProgressAggregator(write, 10)
+        aggregator.update("job", 1, 10)
+        write.assert_called_once_with("job", 1, 10)
+
+    def test_updates_within_interval_coalesced(self):
+        write = Mock()
+        aggregator = ProgressAggregator(write, 0.2)
+        for i in range(1, 100):
+            aggregator.update("job", i, 100)
+        assert write.call_count == 1
+        time.sleep(0.4)
+        assert write.call_count == 2
+        write.assert_called_with("job", 99, 100)
+
+    def test_jobs_tracked_separately(self):
+        write = Mock()
+        aggregator = ProgressAggregator(write, 10)
+        aggregator.update("job1", 1, 10)
+        aggregator.update("job2", 1, 10)
+        assert write.call_count == 2
+
+    def test_finish_writes_final_progress(self):
+        write = Mock()
+        aggregator = ProgressAggregator(write, 10)
+        aggregator.update("job", 1, 10)
+        aggregator.update("job", 5, 10)
+        aggregator.update("job", 10, 10)
+        aggregator.finish("job")
+        assert write.call_count == 2
+        write.assert_called_with("job", 10, 10)
+        # the cancelled timer never writes again
+        time.sleep(0.1)
+        assert write.call_count == 2
+
+    def test_finish_without_pending_progress_does_not_write(self):
+        write = Mock()
+        aggregator = ProgressAggregator(write, 10)
+        aggregator.update("job", 1, 10)
+        aggregator.finish("job")
+        write.assert_called_once_with("job", 1, 10)
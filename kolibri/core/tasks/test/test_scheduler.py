@@ -159,3 +159,21 @@ class TestScheduler(object):
         assert scheduled_time == naive_utc_datetime(now) + datetime.timedelta(
             seconds=1000
         )
+
+    def test_check_schedule_enqueues_all_due_jobs(self, scheduler):
+        now = local_now()
+        job_ids = [scheduler.schedule(now, id) for _ in range(5)]
+        scheduler.check_schedule()
+        assert scheduler.count() == 0
+        for job_id in job_ids:
+            assert scheduler.queue.fetch_job(job_id).job_id == job_id
+
+    def test_check_schedule_returns_time_to_next_job(self, scheduler):
+        now = local_now()
+        scheduler.schedule(now, id)
+        scheduler.schedule(now + datetime.timedelta(seconds=100), id)
+        next_run = scheduler.check_schedule()
+        assert 0 < next_run <= 100
+
+    def test_check_schedule_returns_none_without_jobs(self, scheduler):
+        assert scheduler.check_schedule() is None
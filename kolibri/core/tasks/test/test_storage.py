@@ -1,10 +1,13 @@
 import tempfile
 
 import pytest
+from mock import patch
 from sqlalchemy import create_engine
 from sqlalchemy.pool import NullPool
 
 from kolibri.core.tasks.job import Job
+from kolibri.core.tasks.job import Priority
+from kolibri.core.tasks.job import Resource
 from kolibri.core.tasks.job import State
 from kolibri.core.tasks.storage import Storage
 from kolibri.core.tasks.utils import stringify_func
@@ -43,6 +46,23 @@ class TestBackend:
         # Does the job have the right state (QUEUED)?
         assert new_job.state == State.QUEUED
 
+    def test_can_enqueue_many_jobs(self, defaultbackend):
+        jobs = [Job(open) for _ in range(3)]
+        running_job = Job(open)
+        defaultbackend.enqueue_job(running_job, QUEUE)
+        defaultbackend.mark_job_as_running(running_job.job_id)
+
+        job_ids = defaultbackend.enqueue_jobs(jobs + [running_job], QUEUE)
+
+        assert job_ids == [job.job_id for job in jobs + [running_job]]
+        # are the jobs queued in the order they were given?
+        for job in jobs:
+            next_job = defaultbackend.get_next_queued_job([QUEUE])
+            assert next_job.job_id == job.job_id
+            defaultbackend.mark_job_as_running(next_job.job_id)
+        # is the job that was already running left as it was?
+        assert defaultbackend.get_job(running_job.job_id).state == State.RUNNING
+
     def test_can_cancel_nonrunning_job(self, defaultbackend, simplejob):
         job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
 
@@ -60,6 +80,37 @@ class TestBackend:
 
         assert defaultbackend.get_next_queued_job([QUEUE]).job_id == job1_id
 
+    def test_gets_highest_priority_job_queued(self, defaultbackend):
+        defaultbackend.enqueue_job(Job(open, priority=Priority.LOW), QUEUE)
+        defaultbackend.enqueue_job(Job(open), QUEUE)
+        job3_id = defaultbackend.enqueue_job(Job(open, priority=Priority.HIGH), QUEUE)
+
+        assert defaultbackend.get_next_queued_job([QUEUE]).job_id == job3_id
+
+    def test_skips_jobs_over_resource_limits(self, defaultbackend):
+        limits = {Resource.NETWORK: 1, Resource.DISK: 1}
+        job1_id = defaultbackend.enqueue_job(
+            Job(open, resources=[Resource.NETWORK]), QUEUE
+        )
+        defaultbackend.enqueue_job(Job(open, resources=[Resource.NETWORK]), QUEUE)
+        defaultbackend.enqueue_job(Job(open, resources=[Resource.disk("a")]), QUEUE)
+        job4_id = defaultbackend.enqueue_job(
+            Job(open, resources=[Resource.disk("b"), Resource.CPU]), QUEUE
+        )
+        defaultbackend.mark_job_as_running(job1_id)
+        job3 = defaultbackend.get_next_queued_job([QUEUE], resource_limits=limits)
+        assert job3.resources == [Resource.disk("a")]
+        defaultbackend.mark_job_as_running(job3.job_id)
+
+        # the CPU resource class has no limit, and no job is using disk b
+        job = defaultbackend.get_next_queued_job([QUEUE], resource_limits=limits)
+        assert job.job_id == job4_id
+        defaultbackend.mark_job_as_running(job4_id)
+
+        assert defaultbackend.get_next_queued_job([QUEUE], limits) is None
+        # without limits the remaining network job is started
+        assert defaultbackend.get_next_queued_job([QUEUE]) is not None
+
     def test_can_complete_job(self, defaultbackend, simplejob):
         """
         When we call backend.complete_job, it should mark the job as finished, and
@@ -108,3 +159,114 @@ class TestBackend:
         defaultbackend.save_job_as_cancellable(job_id)
         job = defaultbackend.get_job(job_id)
         assert job.cancellable, "Job is not cancellable default"
+
+    def test_update_progress_does_not_repickle_job(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+
+        with patch.object(
+            Job, "__getstate__", side_effect=AssertionError("Job was pickled")
+        ):
+            defaultbackend.update_job_progress(job_id, 5, 10)
+            defaultbackend.mark_job_as_running(job_id)
+
+        job = defaultbackend.get_job(job_id)
+        assert job.progress == 5
+        assert job.total_progress == 10
+        assert job.state == State.RUNNING
+
+    def test_delete_old_jobs_by_count(self, defaultbackend):
+        job_ids = [defaultbackend.enqueue_job(Job(open), QUEUE) for _ in range(4)]
+        other_job_id = defaultbackend.enqueue_job(Job(open), "other")
+        for job_id in job_ids[:3] + [other_job_id]:
+            defaultbackend.complete_job(job_id)
+
+        assert defaultbackend.delete_old_jobs(max_count=1) == 2
+
+        remaining = set(job.job_id for job in defaultbackend.get_all_jobs(QUEUE))
+        # the queued job and the most recently queued finished job are kept
+        assert remaining == set(job_ids[2:])
+        assert len(defaultbackend.get_all_jobs("other")) == 1
+
+    def test_delete_old_jobs_by_age(self, defaultbackend):
+        finished_job_id = defaultbackend.enqueue_job(Job(open), QUEUE)
+        queued_job_id = defaultbackend.enqueue_job(Job(open), QUEUE)
+        defaultbackend.mark_job_as_failed(finished_job_id, ValueError(), "")
+
+        assert defaultbackend.delete_old_jobs(max_age=60) == 0
+        assert defaultbackend.delete_old_jobs(max_age=-60) == 1
+
+        (job,) = defaultbackend.get_all_jobs(QUEUE)
+        assert job.job_id == queued_job_id
+
+    def test_vacuum_after_deleting_jobs(self, defaultbackend):
+        for _ in range(50):
+            job = Job(open, extra_metadata={"data": "x" * 10000})
+            defaultbackend.complete_job(defaultbackend.enqueue_job(job, QUEUE))
+        assert defaultbackend.vacuum(min_free_fraction=0.5) is False
+        defaultbackend.delete_old_jobs(max_count=0)
+        assert defaultbackend.vacuum(min_free_fraction=0.5) is True
+
+    def test_get_all_job_statuses(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        defaultbackend.update_job_progress(job_id, 1, 4)
+        simplejob.extra_metadata = {"type": "test"}
+        defaultbackend.save_job_meta(simplejob)
+        defaultbackend.mark_job_as_failed(job_id, ValueError("bad"), "trace")
+
+        (status,) = defaultbackend.get_all_job_statuses(QUEUE)
+        assert status.job_id == job_id
+        assert status.state == State.FAILED
+        assert status.percentage_progress == 0.25
+        assert status.extra_metadata == {"type": "test"}
+        assert status.exception == "bad"
+        assert status.traceback == "trace"
+
+    def test_save_job_checkpoint(self, defaultbackend):
+        job = Job(open, resumable=True)
+        job_id = defaultbackend.enqueue_job(job, QUEUE)
+        job.checkpoint["done"] = ["a", "b"]
+        defaultbackend.save_job_checkpoint(job)
+
+        job = defaultbackend.get_job(job_id)
+        assert job.resumable
+        assert job.checkpoint == {"done": ["a", "b"]}
+
+    def test_restart_queue_requeues_interrupted_resumable_jobs(self, defaultbackend):
+        running_id = defaultbackend.enqueue_job(Job(open, resumable=True), QUEUE)
+        queued_id = defaultbackend.enqueue_job(Job(open, resumable=True), QUEUE)
+        completed_id = defaultbackend.enqueue_job(Job(open, resumable=True), QUEUE)
+        not_resumable_id = defaultbackend.enqueue_job(Job(open), QUEUE)
+        defaultbackend.mark_job_as_running(running_id)
+        defaultbackend.mark_job_as_running(not_resumable_id)
+        defaultbackend.complete_job(completed_id)
+
+        assert defaultbackend.restart_queue(QUEUE) == 2
+
+        jobs = {job.job_id: job for job in defaultbackend.get_all_jobs(QUEUE)}
+        assert set(jobs) == {running_id, queued_id}
+        assert all(job.state == State.QUEUED for job in jobs.values())
+
+    def test_revision_created_with_tables(self, defaultbackend):
+        assert defaultbackend.get_revision() == 0
+        # a second storage on the same database does not create it again
+        Storage(defaultbackend.engine)
+        defaultbackend.enqueue_job(Job(id), QUEUE)
+        assert defaultbackend.get_revision() == 1
+
+    def test_progress_update_does_not_change_revision(self, defaultbackend):
+        job_id = defaultbackend.enqueue_job(Job(id), QUEUE)
+        defaultbackend.mark_job_as_running(job_id)
+        revision = defaultbackend.get_revision()
+        defaultbackend.update_job_progress(job_id, 5, 10)
+        assert defaultbackend.get_revision() == revision
+        assert defaultbackend.get_running_job_progress(QUEUE) == [(job_id, 5, 10)]
+        statuses = defaultbackend.get_job_statuses_since(QUEUE, revision)
+        assert [status.job_id for status in statuses] == [job_id]
+
+    def test_revision_change_notifies_workers(self, defaultbackend):
+        job_id = defaultbackend.enqueue_job(Job(id), QUEUE)
+        with patch("kolibri.core.tasks.storage.notify_workers") as notify_mock:
+            defaultbackend.mark_job_as_running(job_id)
+            assert notify_mock.call_count == 1
+            defaultbackend.update_job_progress(job_id, 5, 10)
+            assert notify_mock.call_count == 1
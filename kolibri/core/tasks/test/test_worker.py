@@ -1,3 +1,4 @@
+import os
 import tempfile
 import time
 
@@ -8,12 +9,31 @@ from sqlalchemy.pool import NullPool
 
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
+from kolibri.core.tasks.notifications import notify_workers
+from kolibri.core.tasks.utils import get_current_job
+from kolibri.core.tasks.worker import Empty
+from kolibri.core.tasks.worker import JOB_CHECK_INTERVAL
 from kolibri.core.tasks.worker import Worker
 
 
 QUEUE = "pytest"
 
 
+def report_process_job():
+    job = get_current_job()
+    job.extra_metadata["pid"] = os.getpid()
+    job.save_meta()
+    job.update_progress(1, 2)
+    return job.extra_metadata["pid"]
+
+
+def cancelable_process_job():
+    job = get_current_job()
+    for _ in range(100):
+        time.sleep(0.1)
+        job.check_for_cancel()
+
+
 @pytest.fixture
 def worker():
     with tempfile.NamedTemporaryFile() as f:
@@ -73,3 +93,87 @@ class TestWorker:
             job_id = call_args[0][0]
             # verify that we're setting the correct job_id
             assert job_id == job.job_id
+
+    def test_enqueue_job_notifies_worker(self, worker):
+        with patch.object(
+            worker.storage,
+            "get_next_queued_job",
+            wraps=worker.storage.get_next_queued_job,
+        ) as spy, patch(
+            "kolibri.core.tasks.storage.notify_workers", wraps=notify_workers
+        ) as notify_spy:
+            job = Job(id, 9)
+            start = time.time()
+            worker.storage.enqueue_job(job, QUEUE)
+            notify_spy.assert_called()
+
+            while (
+                job.state == State.QUEUED and time.time() - start < JOB_CHECK_INTERVAL
+            ):
+                job = worker.storage.get_job(job.job_id)
+                time.sleep(0.01)
+
+            # the job should be started without waiting for the fallback check
+            assert time.time() - start < JOB_CHECK_INTERVAL / 5.0
+            assert spy.call_count >= 1
+
+    def test_idle_worker_does_not_poll(self, worker):
+        time.sleep(0.5)
+        with patch.object(
+            worker.storage,
+            "get_next_queued_job",
+            wraps=worker.storage.get_next_queued_job,
+        ) as spy:
+            time.sleep(1)
+            assert spy.call_count == 0
+
+    def test_no_job_started_after_shutdown(self, worker):
+        worker.shutdown()
+        worker.storage.enqueue_job(Job(id, 9, cpu_bound=True), QUEUE)
+        with pytest.raises(Empty):
+            worker.start_next_job()
+        assert worker.process_workers is None
+
+    def _wait_for_state(self, worker, job_id, states):
+        job = worker.storage.get_job(job_id)
+        time_spent = 0
+        while job.state not in states:
+            time.sleep(0.1)
+            time_spent += 0.1
+            assert time_spent < 10
+            job = worker.storage.get_job(job_id)
+        return job
+
+    def test_cpu_bound_job_runs_in_process(self, worker):
+        job = Job(report_process_job, cpu_bound=True, track_progress=True)
+        worker.storage.enqueue_job(job, QUEUE)
+
+        job = self._wait_for_state(worker, job.job_id, (State.COMPLETED, State.FAILED))
+
+        assert job.state == State.COMPLETED
+        # the metadata and progress were sent back from the job's process
+        assert job.extra_metadata["pid"] != os.getpid()
+        assert job.progress == 1
+        assert job.total_progress == 2
+
+    def test_cpu_bound_job_can_be_cancelled(self, worker):
+        job = Job(cancelable_process_job, cpu_bound=True, cancellable=True)
+        worker.storage.enqueue_job(job, QUEUE)
+        self._wait_for_state(worker, job.job_id, (State.RUNNING,))
+
+        worker.storage.mark_job_as_canceling(job.job_id)
+        worker.wakeup_event.set()
+
+        job = self._wait_for_state(
+            worker, job.job_id, (State.CANCELED, State.COMPLETED, State.FAILED)
+        )
+        assert job.state == State.CANCELED
+
+    def test_job_message_before_future_is_tracked(self, worker):
+        job = Job(report_process_job, cpu_bound=True)
+        worker.storage.enqueue_job(job, QUEUE)
+        worker.storage.mark_job_as_running(job.job_id)
+
+        worker.handle_job_message("meta", job.job_id, {"pid": 1})
+
+        assert worker.storage.get_job(job.job_id).extra_metadata["pid"] == 1
@@ -17,3 +17,9 @@ def drop_old_iceqube_tables():
     and let iceqube reinitialize the tables from scratch.
     """
     queue.storage.recreate_tables()
+
+
+# Job progress, metadata and errors were moved into their own columns in the jobs table
+@version_upgrade(old_version="<0.14.7")
+def recreate_job_tables():
+    queue.storage.recreate_tables()
@@ -120,4 +120,55 @@ class InfiniteLoopThread(compat.Thread):
         self.stop()
 
 
+class NotifiedLoopThread(InfiniteLoopThread):
+    """
+    A class that runs a given function each time its wakeup event is set, and at the latest every
+    wait_between_runs seconds, until told to shut down. If the function returns a number, it is run
+    again after at most that many seconds.
+    """
+
+    def __init__(self, func, thread_name, wakeup_event, *args, **kwargs):
+        """
+        :param wakeup_event: an Event that is set to request that the func is run.
+        """
+        self.wakeup_event = wakeup_event
+        super(NotifiedLoopThread, self).__init__(func, thread_name, *args, **kwargs)
+
+    def run(self):
+        self.logger.debug(
+            "Started new {name} thread ID#{id}".format(
+                name=self.thread_name, id=self.thread_id
+            )
+        )
+
+        wait = self.wait
+        while True:
+            self.wakeup_event.wait(wait)
+            # Clear the event before running the func, so that any notifications
+            # received while the func is running cause it to be run again.
+            self.wakeup_event.clear()
+            if self.shutdown_event.is_set():
+                self.logger.debug(
+                    "{name} shut down event received; closing.".format(
+                        name=self.thread_name
+                    )
+                )
+                break
+            wait = self.wait
+            try:
+                next_run = self.func()
+                if next_run is not None:
+                    wait = max(min(next_run, self.wait), 0)
+            except Exception as e:
+                self.logger.warning(
+                    "Got an exception running {func}: {e}".format(
+                        func=self.func, e=str(e)
+                    )
+                )
+
+    def stop(self):
+        self.shutdown_event.set()
+        self.wakeup_event.set()
+
+
 db_task_write_lock = ProcessLock("db_task_write_lock")
@@ -1,15 +1,44 @@
 import logging
+import threading
 import traceback
+from multiprocessing import cpu_count
 
 from concurrent.futures import CancelledError
 
+from kolibri.core.tasks import process
 from kolibri.core.tasks.compat import MULTIPROCESS
+from kolibri.core.tasks.compat import PROCESS_POOL
+from kolibri.core.tasks.exceptions import JobInterruptedError
 from kolibri.core.tasks.exceptions import UserCancelledError
+from kolibri.core.tasks.job import Resource
+from kolibri.core.tasks.notifications import add_listener
+from kolibri.core.tasks.notifications import notify_workers
+from kolibri.core.tasks.notifications import remove_listener
+from kolibri.core.tasks.progress import ProgressAggregator
 from kolibri.core.tasks.storage import Storage
-from kolibri.core.tasks.utils import InfiniteLoopThread
+from kolibri.core.tasks.utils import NotifiedLoopThread
+from kolibri.utils.conf import OPTIONS
 
 logger = logging.getLogger(__name__)
 
+# How often, in seconds, to check for jobs to start or cancel if no notification is
+# received. Workers are notified whenever a job is queued or marked as canceling, so
+# this is only a fallback in case a notification is missed.
+JOB_CHECK_INTERVAL = 10
+
+# The maximum number of running jobs that can use any one resource of each resource class
+# at once. Jobs that use the same network connection, or the same drive, slow each other
+# down more than they gain from running concurrently, so only one at a time is started.
+RESOURCE_LIMITS = {
+    Resource.NETWORK: 1,
+    Resource.DISK: 1,
+    Resource.CPU: cpu_count(),
+}
+
+# Held while a job is selected and marked as running, so that workers in the
+# same process never start the same job, or exceed the resource limits, at once.
+_dispatch_lock = threading.Lock()
+
 
 class Empty(Exception):
     # An exception to raise when there are now queued jobs waiting to be started.
@@ -17,7 +46,7 @@ class Empty(Exception):
 
 
 class Worker(object):
-    def __init__(self, queues, connection=None, num_workers=3):
+    def __init__(self, queues, connection=None, num_workers=3, resource_limits=None):
         # Internally, we use concurrent.future.Future to run and track
         # job executions. We need to keep track of which future maps to which
         # job they were made from, and we use the job_future_mapping dict to do
@@ -35,17 +64,50 @@ class Worker(object):
         self.future_job_mapping = {}
         self.storage = Storage(connection)
         self.num_workers = num_workers
+        self.resource_limits = (
+            RESOURCE_LIMITS if resource_limits is None else resource_limits
+        )
+        # Progress is reported far more often than it needs to be stored,
+        # so buffer it and write it at most every PROGRESS_UPDATE_INTERVAL seconds
+        self.progress_aggregator = ProgressAggregator(
+            self.storage.update_job_progress,
+            OPTIONS["Tasks"]["PROGRESS_UPDATE_INTERVAL"],
+        )
+
+        # Set to wake the job checker, whenever there may be jobs to start or cancel
+        self.wakeup_event = threading.Event()
+        add_listener(self.wakeup_event)
 
         self.workers = self.start_workers(num_workers=self.num_workers)
+        # The pool of processes for CPU bound jobs, and the channel for those jobs to communicate
+        # with this worker, are only started once the first CPU bound job is started
+        self.process_workers = None
+        self.job_channel = None
+        # Held while a job is started, so that no job is started once shutdown has begun,
+        # which could otherwise start a new pool of processes that is never shut down
+        self._start_lock = threading.Lock()
+        self._shutting_down = False
         self.job_checker = self.start_job_checker()
 
     def shutdown_workers(self, wait=True):
-        # First cancel all running jobs
-        for job_id in self.future_job_mapping:
-            logger.info("Canceling job id {}.".format(job_id))
+        # First cancel all running jobs, resumable jobs are interrupted instead,
+        # so that they are left to be resumed when the workers are restarted
+        for job_id, future in list(self.future_job_mapping.items()):
+            job = self.job_future_mapping.get(future)
+            if job is not None and job.resumable:
+                logger.info("Interrupting job id {}.".format(job_id))
+                setattr(future, "_is_interrupted", True)
+            else:
+                logger.info("Canceling job id {}.".format(job_id))
             self.cancel(job_id)
         # Now shutdown the workers
         self.workers.shutdown(wait=wait)
+        if self.process_workers is not None:
+            # Always wait for the job processes, which have been told to cancel their jobs, to
+            # finish, as the threads of a thread pool are waited for at exit, and a process pool
+            # that is not waited for can leave its processes blocked forever at exit.
+            self.process_workers.shutdown(wait=True)
+            self.job_channel.shutdown()
 
     def start_workers(self, num_workers):
         if MULTIPROCESS:
@@ -60,27 +122,89 @@ class Worker(object):
         pool = worker_executor(max_workers=num_workers)
         return pool
 
-    def handle_finished_future(self, future):
+    def start_process_workers(self):
+        """
+        Start the pool of processes for CPU bound jobs, and the channel that they use
+        to report on, and receive cancellations for, the jobs that they run.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.job_channel = process.JobChannel(self.handle_job_message)
+        self.process_workers = ProcessPoolExecutor(
+            max_workers=min(self.num_workers, cpu_count())
+        )
+
+    def handle_job_message(self, kind, job_id, value):
+        """
+        Handle a message sent over the job channel by a job running in a worker process,
+        in place of the call it would have made to the worker if it was running in a thread.
+        """
+        if kind == process.PROGRESS:
+            self.update_progress(job_id, *value)
+        elif kind == process.CANCELLABLE:
+            self.storage.save_job_as_cancellable(job_id, cancellable=value)
+        else:
+            future = self.future_job_mapping.get(job_id)
+            if future is not None and future in self.job_future_mapping:
+                job = self.job_future_mapping[future]
+            else:
+                # The job can start and send messages before its future is tracked
+                job = self.storage.get_job(job_id)
+            if kind == process.META:
+                job.extra_metadata = value
+                self.storage.save_job_meta(job)
+            elif kind == process.CHECKPOINT:
+                job.checkpoint = value
+                self.storage.save_job_checkpoint(job)
+
+    def _handle_finished_future(self, future):
         # get back the job assigned to the future
         job = self.job_future_mapping[future]
 
+        if getattr(future, "_in_process", False):
+            # Handle any messages the job sent before it finished, while it is still tracked
+            self.job_channel.flush()
+            self.job_channel.clear_flag(job.job_id)
+
         # Clean up tracking of this job and its future
         del self.job_future_mapping[future]
         del self.future_job_mapping[job.job_id]
 
+        # Make sure the final progress of the job is stored before its state changes
+        self.progress_aggregator.finish(job.job_id)
+
+        # Check for cancellation without reraising the error, as the traceback of a reraised error
+        # would keep the process pool's management thread referenced until garbage collection
+        if future.cancelled() or isinstance(future.exception(), CancelledError):
+            if getattr(future, "_is_interrupted", False):
+                # Leave the job running in storage, so it is resumed on restart
+                logger.info("Job {} was interrupted.".format(job.job_id))
+            else:
+                self.report_cancelled(job.job_id)
+            return
+
         try:
             result = future.result()
-        except CancelledError:
-            self.report_cancelled(job.job_id)
-            return
         except Exception as e:
             self.report_error(job.job_id, e, e.traceback)
             return
 
         self.report_success(job.job_id, result)
 
+    def handle_finished_future(self, future):
+        try:
+            self._handle_finished_future(future)
+        finally:
+            # a worker, and the resources the job used, are now free, so wake
+            # this worker and any others to check whether there is a job to start
+            self.wakeup_event.set()
+            notify_workers()
+
     def shutdown(self, wait=False):
         logger.info("Asking job schedulers to shut down.")
+        remove_listener(self.wakeup_event)
+        with self._start_lock:
+            self._shutting_down = True
         self.job_checker.stop()
         self.shutdown_workers(wait=wait)
         if wait:
@@ -90,10 +214,14 @@ class Worker(object):
         """
         Starts up the job checker thread, that starts scheduled jobs when there are workers free,
         and checks for cancellation requests for jobs currently assigned to a worker.
+        It runs whenever the worker is notified of new jobs to start or cancel, or a job finishes.
         Returns: the Thread object.
         """
-        t = InfiniteLoopThread(
-            self.check_jobs, thread_name="JOBCHECKER", wait_between_runs=0.5
+        t = NotifiedLoopThread(
+            self.check_jobs,
+            thread_name="JOBCHECKER",
+            wakeup_event=self.wakeup_event,
+            wait_between_runs=JOB_CHECK_INTERVAL,
         )
         t.start()
         return t
@@ -128,7 +256,7 @@ class Worker(object):
         self.storage.mark_job_as_failed(job_id, exc, trace)
 
     def update_progress(self, job_id, progress, total_progress, stage=""):
-        self.storage.update_job_progress(job_id, progress, total_progress)
+        self.progress_aggregator.update(job_id, progress, total_progress)
 
     def start_next_job(self):
         """
@@ -136,22 +264,35 @@ class Worker(object):
 
         :return future:
         """
-        job = self.storage.get_next_queued_job(self.queues)
+        with self._start_lock:
+            if self._shutting_down:
+                raise Empty
+            return self._start_next_job()
 
-        if not job:
-            raise Empty
+    def _start_next_job(self):
+        with _dispatch_lock:
+            job = self.storage.get_next_queued_job(
+                self.queues, resource_limits=self.resource_limits
+            )
 
-        self.storage.mark_job_as_running(job.job_id)
+            if not job:
+                raise Empty
 
-        lambda_to_execute = _reraise_with_traceback(job.get_lambda_to_execute())
+            self.storage.mark_job_as_running(job.job_id)
 
-        future = self.workers.submit(
-            lambda_to_execute,
-            update_progress_func=self.update_progress,
-            cancel_job_func=self._check_for_cancel,
-            save_job_meta_func=self.storage.save_job_meta,
-            save_as_cancellable_func=self.storage.save_job_as_cancellable,
-        )
+        if job.cpu_bound and PROCESS_POOL:
+            future = self.submit_to_process_workers(job)
+        else:
+            lambda_to_execute = _reraise_with_traceback(job.get_lambda_to_execute())
+
+            future = self.workers.submit(
+                lambda_to_execute,
+                update_progress_func=self.update_progress,
+                cancel_job_func=self._check_for_cancel,
+                save_job_meta_func=self.storage.save_job_meta,
+                save_as_cancellable_func=self.storage.save_job_as_cancellable,
+                save_job_checkpoint_func=self.storage.save_job_checkpoint,
+            )
 
         # assign the futures to a dict, mapping them to a job
         self.job_future_mapping[future] = job
@@ -162,6 +303,19 @@ class Worker(object):
 
         return future
 
+    def submit_to_process_workers(self, job):
+        if self.process_workers is None:
+            self.start_process_workers()
+        future = self.process_workers.submit(
+            process.execute_job_in_process,
+            job,
+            job.checkpoint,
+            self.job_channel.get_client(),
+            _reraise_with_traceback,
+        )
+        setattr(future, "_in_process", True)
+        return future
+
     def cancel(self, job_id):
         """
         Request a cancellation from the futures executor pool.
@@ -172,7 +326,10 @@ class Worker(object):
         :param job_id:
         :return:
         """
-        future = self.future_job_mapping[job_id]
+        future = self.future_job_mapping.get(job_id)
+        if future is None:
+            # finished, and no longer tracked, since it was looked up
+            return False
         is_future_cancelled = future.cancel()
 
         if is_future_cancelled:  # success!
@@ -181,6 +338,14 @@ class Worker(object):
             if future.running():
                 # Already running, so we manually mark the future as cancelled
                 setattr(future, "_is_cancelled", True)
+                if getattr(future, "_in_process", False):
+                    # and tell the process running the job that it has been cancelled
+                    self.job_channel.set_flag(
+                        job_id,
+                        process.INTERRUPTED
+                        if getattr(future, "_is_interrupted", False)
+                        else process.CANCELLED,
+                    )
                 return False
             else:  # probably finished already, too late to cancel!
                 return False
@@ -192,11 +357,15 @@ class Worker(object):
         was before it was cancelled.
 
         :param job_id: The job_id to check
-        :return: raises a UserCancelledError if we find out that we were cancelled.
+        :return: raises a UserCancelledError if we find out that we were cancelled,
+        or a JobInterruptedError if the job was interrupted by the workers shutting down.
         """
 
         future = self.future_job_mapping[job_id]
 
+        if getattr(future, "_is_interrupted", False):
+            raise JobInterruptedError()
+
         if getattr(future, "_is_cancelled", False):
             raise UserCancelledError()
 
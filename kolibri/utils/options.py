@@ -367,6 +367,28 @@ base_option_spec = {
             "envvars": ("KOLIBRI_STATIC_USE_SYMLINKS",),
         },
     },
+    "Tasks": {
+        "PROGRESS_UPDATE_INTERVAL": {
+            "type": "float",
+            "default": 0.5,
+            "envvars": ("KOLIBRI_TASKS_PROGRESS_UPDATE_INTERVAL",),
+        },
+        "REGULAR_QUEUE_WORKERS": {
+            "type": "integer",
+            "default": 1,
+            "envvars": ("KOLIBRI_TASKS_REGULAR_QUEUE_WORKERS",),
+        },
+        "FINISHED_JOB_RETENTION_DAYS": {
+            "type": "integer",
+            "default": 30,
+            "envvars": ("KOLIBRI_TASKS_FINISHED_JOB_RETENTION_DAYS",),
+        },
+        "FINISHED_JOB_RETENTION_COUNT": {
+            "type": "integer",
+            "default": 100,
+            "envvars": ("KOLIBRI_TASKS_FINISHED_JOB_RETENTION_COUNT",),
+        },
+    },
     "Python": {
         "PICKLE_PROTOCOL": {
             "type": "integer",
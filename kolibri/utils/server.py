@@ -17,6 +17,7 @@ from kolibri.core.content.utils import paths
 from kolibri.core.deviceadmin.utils import schedule_vacuum
 from kolibri.core.tasks.main import initialize_workers
 from kolibri.core.tasks.main import queue
+from kolibri.core.tasks.main import schedule_job_storage_cleanup
 from kolibri.core.tasks.main import scheduler
 from kolibri.utils import conf
 from kolibri.utils.android import on_android
@@ -96,9 +97,20 @@ class ServicesPlugin(SimplePlugin):
         # schedule the vacuum job
         schedule_vacuum()
 
+        # schedule the job to delete old finished jobs from job storage
+        schedule_job_storage_cleanup()
+
+        # schedule the job to recalculate content popularity
+        from kolibri.core.logger.utils.popularity import (
+            schedule_content_popularity_update,
+        )
+
+        schedule_content_popularity_update()
+
         # This is run every time the server is started to clear all the tasks
-        # in the queue
-        queue.empty()
+        # in the queue, apart from resumable tasks that were interrupted
+        # by the server stopping, which are requeued to resume
+        queue.restart()
 
         # Initialize the iceqube engine to handle queued tasks
         self.workers = initialize_workers()